@@ -0,0 +1,90 @@
+"""Benchmark sending mail against a local aiosmtpd server.
+
+Compares a new SMTP connection per message (``FastMail.send_message``) with the pooled
+``MailSender.send_many`` of the workers, and prints the messages per second of both.
+
+    python scripts/benchmark_email.py --messages 500 --pool-size 4
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import time
+from typing import Any
+
+from aiosmtpd.controller import Controller
+from fastapi_mail import ConnectionConfig, FastMail, MessageSchema, MessageType
+
+from app.lib import settings
+from app.lib.email import MailSender
+
+__all__ = ["run_benchmark"]
+
+
+class _Sink:
+    def __init__(self) -> None:
+        self.received = 0
+
+    async def handle_DATA(self, server: Any, session: Any, envelope: Any) -> str:  # noqa: N802
+        self.received += 1
+        return "250 OK"
+
+
+def _messages(amount: int) -> list[MessageSchema]:
+    body = [
+        {"device_id": f"TESM{n:04}", "checks": {"HTTP": {"output": "http server enabled", "is_compliant": False}}}
+        for n in range(25)
+    ]
+    return [
+        MessageSchema(
+            subject=f"benchmark {n}",
+            recipients=["noc@test.nl"],
+            body="",
+            subtype=MessageType.html,
+            template_body=body,
+        )
+        for n in range(amount)
+    ]
+
+
+async def run_benchmark(messages: int, pool_size: int, port: int) -> dict[str, float]:
+    sink = _Sink()
+    controller = Controller(sink, hostname="127.0.0.1", port=port)
+    controller.start()
+    config = ConnectionConfig(
+        **settings.email.model_dump(exclude={"MAIL_POOL_SIZE", "MAIL_KEEPALIVE"})
+        | {"MAIL_SERVER": "127.0.0.1", "MAIL_PORT": port, "USE_CREDENTIALS": False, "SUPPRESS_SEND": 0},
+    )
+    results = {}
+    try:
+        fast_mail = FastMail(config)
+        start = time.perf_counter()
+        for message in _messages(messages):
+            await fast_mail.send_message(message, template_name="tscm_email_template.html")
+        results["connection per message"] = messages / (time.perf_counter() - start)
+
+        sender = MailSender(config, pool_size=pool_size)
+        start = time.perf_counter()
+        await sender.send_many(_messages(messages), template_name="tscm_email_template.html")
+        results[f"pool of {pool_size}"] = messages / (time.perf_counter() - start)
+        await sender.close()
+    finally:
+        controller.stop()
+    assert sink.received == 2 * messages  # noqa: S101
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--pool-size", type=int, default=settings.email.MAIL_POOL_SIZE)
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+    logging.getLogger("mail.log").setLevel(logging.WARNING)
+    for name, rate in asyncio.run(run_benchmark(args.messages, args.pool_size, args.port)).items():
+        print(f"{name:>24}: {rate:8.1f} messages/sec")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Benchmark a full ping sweep over a simulated network.
+
+Seeds the database with simulated cpe's, runs a SAQ worker for the ping jobs in this process
+and drives ``ping_cpes`` with the simulated ping backend (``app.lib.ping.SimulatedNetwork``).
+Prints the end-to-end time of every sweep and the part of it spent writing to the database.
+Needs the database (migrated) and Redis of the app, and at least one vendor, business
+product and product configuration to link the cpe's to.
+
+    python scripts/benchmark_ping.py --hosts 100000 --sweeps 3 --loss 0.01 --down 0.02
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import ipaddress
+import logging
+import time
+from multiprocessing import cpu_count
+
+from saq import Worker
+from sqlalchemy import delete, insert, select
+
+from app.domain.cpe import business_logic_ping
+from app.domain.cpe.flap_detection import FlapDetector
+from app.domain.cpe.latency import maintain_ping_samples
+from app.domain.cpe.models import CPE, PingSample
+from app.domain.cpe.ping_schedule import PingSchedule
+from app.domain.cpe_business_product.models import CPEBusinessProduct
+from app.domain.cpe_product_configuration.models import CPEProductConfiguration
+from app.domain.cpe_vendor.models import CPEVendor
+from app.domain.plugins import saq
+from app.lib import ping, settings
+from app.lib.cache import redis
+from app.lib.db.base import session
+
+__all__ = ["run_benchmark"]
+
+PREFIX = "SIM"
+FIRST_ADDRESS = ipaddress.IPv4Address("100.64.0.0")
+SECONDARY_OFFSET = 2**21
+
+
+def _device_id(n: int) -> str:
+    return f"{PREFIX}{n:07}"
+
+
+async def seed(hosts: int, chunk: int = 10_000) -> float:
+    """Insert the simulated cpe's, every tenth has a secondary management address. Returns the seconds it took."""
+    async with session() as db_session:
+        vendor_id = await db_session.scalar(select(CPEVendor.id).limit(1))
+        service_id = await db_session.scalar(select(CPEBusinessProduct.id).limit(1))
+        product_configuration_id = await db_session.scalar(select(CPEProductConfiguration.id).limit(1))
+        if None in (vendor_id, service_id, product_configuration_id):
+            msg = "Needs a vendor, business product and product configuration to link the simulated cpe's to"
+            raise SystemExit(msg)
+
+        start = time.perf_counter()
+        for offset in range(0, hosts, chunk):
+            await db_session.execute(
+                insert(CPE),
+                [
+                    {
+                        "device_id": _device_id(n),
+                        "routername": f"sim-{n}",
+                        "os": "ios",
+                        "mgmt_ip": str(FIRST_ADDRESS + n),
+                        "sec_mgmt_ip": str(FIRST_ADDRESS + SECONDARY_OFFSET + n) if n % 10 == 0 else None,
+                        "online_status": False,
+                        "vendor_id": vendor_id,
+                        "service_id": service_id,
+                        "product_configuration_id": product_configuration_id,
+                    }
+                    for n in range(offset, min(offset + chunk, hosts))
+                ],
+            )
+        await db_session.commit()
+        return time.perf_counter() - start
+
+
+async def cleanup(hosts: int) -> None:
+    """Remove the simulated cpe's, their ping samples and their state in Redis."""
+    async with session() as db_session:
+        await db_session.execute(delete(PingSample).where(PingSample.device_id.startswith(PREFIX)))
+        await db_session.execute(delete(CPE).where(CPE.device_id.startswith(PREFIX)))
+        await db_session.commit()
+    device_ids = [_device_id(n) for n in range(hosts)]
+    schedule, detector = PingSchedule(), FlapDetector()
+    for offset in range(0, hosts, 10_000):
+        chunk = device_ids[offset : offset + 10_000]
+        await redis.hdel(detector.key, *chunk)
+        await redis.hdel(schedule.state_key, *chunk)
+        await redis.zrem(schedule.queue_key, *chunk)
+
+
+async def run_benchmark(hosts: int, sweeps: int, keep: bool) -> list[dict[str, float]]:
+    queue = saq.get_queue("background-tasks")
+    worker = Worker(queue, functions=[business_logic_ping._ping], concurrency=cpu_count())
+    worker_task = asyncio.create_task(worker.start())
+    await maintain_ping_samples({})
+    seconds = await seed(hosts)
+    print(f"seeded {hosts} cpe's in {seconds:.1f}s")  # noqa: T201
+    try:
+        return [await business_logic_ping.ping_cpes({}) for _ in range(sweeps)]
+    finally:
+        await worker.stop()
+        await worker_task
+        if not keep:
+            await cleanup(hosts)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", type=int, default=100_000)
+    parser.add_argument("--sweeps", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--down", type=float, default=0.02, help="fraction of the hosts that never answer")
+    parser.add_argument("--loss", type=float, default=0.01, help="chance a probe is lost")
+    parser.add_argument("--latency", type=float, default=0.02, help="median round trip time in seconds")
+    parser.add_argument("--adaptive", action="store_true", help="use the adaptive schedule instead of pinging all")
+    parser.add_argument("--keep", action="store_true", help="keep the simulated cpe's afterwards")
+    args = parser.parse_args()
+
+    settings.ping.BACKEND = "simulated"
+    settings.ping.SIMULATED_SEED = args.seed
+    settings.ping.SIMULATED_DOWN = args.down
+    settings.ping.SIMULATED_LOSS = args.loss
+    settings.ping.SIMULATED_LATENCY = args.latency
+    settings.ping.TCP_PORTS = []
+    settings.ping.ADAPTIVE = args.adaptive
+    ping._network = None
+    logging.getLogger("saq").setLevel(logging.WARNING)
+
+    for sweep, summary in enumerate(asyncio.run(run_benchmark(args.hosts, args.sweeps, args.keep)), start=1):
+        print(  # noqa: T201
+            f"sweep {sweep}: pinged {summary['pinged']:.0f}/{summary['total']:.0f} in {summary['seconds']:.1f}s "
+            f"({summary['pinged'] / summary['seconds']:.0f} hosts/sec), {summary['changed']:.0f} changed, "
+            f"{summary['write_seconds']:.1f}s writing to the database",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -63,9 +63,13 @@ routes: list[ControllerRouterHandler] = [
     system.controllers.SystemController,
     web.controllers.WebController,
     cpe.controllers.CpeController,
+    cpe.controllers.FleetReadoutController,
     cpe_business_product.controllers.CpeBusinessProductController,
     cpe_vendor.controllers.CpeVendorController,
     tscm.controllers.TscmController,
+    tscm.controllers.ConfigSearchController,
+    tscm.controllers.TscmSweepController,
+    tscm.controllers.TscmFleetRunController,
     cpe_product_configuration.controllers.CpeProductConfigurationController,
     ssh_terminal.controllers.SshWebTerminalController,
 ]
@@ -1,3 +1,24 @@
-from . import business_logic, business_logic_ping, controllers, dependencies, dtos, models, services
+from . import (
+    business_logic,
+    business_logic_ping,
+    controllers,
+    dependencies,
+    dtos,
+    latency,
+    models,
+    reachability,
+    services,
+)
 
-__all__ = ["business_logic", "business_logic_ping", "controllers", "dependencies", "dtos", "models", "services"]
+__all__ = [
+    "business_logic",
+    "business_logic_ping",
+    "controllers",
+    "dependencies",
+    "dtos",
+    "fleet_readout",
+    "latency",
+    "models",
+    "reachability",
+    "services",
+]
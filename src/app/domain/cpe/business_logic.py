@@ -1,46 +1,204 @@
+from __future__ import annotations
+
+import time
+from contextlib import suppress
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from anyio import to_thread
 from phantom_communicator.communicators.base import Communicator
+from saq.job import TERMINAL_STATUSES, Status
+from saq.utils import now
 
-__all__ = ["communicate_with_cpe", "readout_cpe"]
+from app.domain.cpe.parsers import parse_outputs
+from app.domain.tscm.configstore import ConfigStore
+from app.lib import log, settings
+from app.lib.ssh import ssh_pool
 
+if TYPE_CHECKING:
+    from saq import Queue
+    from saq.job import Job
 
-async def communicate_with_cpe(ctx: str, *, ip: str, os: str):  # type: ignore  # noqa: ANN201
-    communicator = Communicator.factory(host=ip, os=os)
-    async with communicator as conn:
-        await conn.send_commands(
-            [
-                "copy run start\n",
-                "show run",
-                "show ip int brief",
-            ],
-        )
+__all__ = [
+    "ReadoutJob",
+    "communicate_with_cpe",
+    "readout_cpe",
+    "readout_device",
+    "readout_job",
+    "readout_job_key",
+    "store_config",
+]
+
+
+logger = log.get_logger()
+
+READOUT_COMMANDS = ["copy run start\n", "show run", "show ip int brief"]
+
+
+async def communicate_with_cpe(ctx: str, *, ip: str, os: str, device_id: str | None = None):  # type: ignore  # noqa: ANN201
+    return await readout_device(ip, os, device_id)
+
+
+async def store_config(device_id: str, config: str) -> bool:
+    """Store the running config of a readout in the config store that TSCM reads.
+
+    Returns whether the config changed. A changed config enqueues a TSCM run of just this device
+    when ``settings.readout.TSCM_ON_CONFIG_CHANGE`` is on.
+    """
+    changed = await to_thread.run_sync(ConfigStore().write, device_id, config)
+    if changed and settings.readout.TSCM_ON_CONFIG_CHANGE:
+        from app.domain.plugins import saq
+
+        queue = saq.get_queue("background-tasks")
+        # changes while a run of the device is queued (or running) coalesce into that run,
+        # the nightly fleet run catches a change that a running one read too early
+        await queue.enqueue("tscm_device_run", key=f"tscm-device-run-{device_id}", device_id=device_id)
+    await logger.ainfo("readout config stored", device_id=device_id, changed=changed)
+    return changed
+
+
+async def readout_device(ip: str, os: str, device_id: str | None = None) -> dict[str, dict[str, Any]]:
+    """Read out the config and state of a cpe, shared by the single and the fleet readouts.
+
+    The connection comes from the SSH pool of the worker, so readouts of the same cpe in a row
+    connect once. With a ``device_id`` the running config is written into the config store.
+    Returns the parsed output of the commands, by command.
+    """
+    async with ssh_pool.connection(("communicator", ip, os), lambda: Communicator.factory(host=ip, os=os)) as conn:
+        responses = await conn.send_commands(READOUT_COMMANDS)
         await conn.get_version()
         await conn.get_startup_config()
         await conn.get_boot_files()
-        await conn.genie_parse_output()  # for this one we will later make an override.
-        # because pyats is very slow upgrading to higher python versions.
-        # and i want to keep the project up to date because of the speed improvements in python itself
 
         await conn.send_interactive_command(
             [("copy run start", "Destination filename [startup-config]?", False), ("\n", "[OK]", False)],
         )
 
+    # the outputs are parsed after the connection went back to the pool, in worker processes
+    outputs = {
+        command: getattr(response, "result", response)
+        for command, response in zip(READOUT_COMMANDS, responses, strict=True)
+    }
+    if device_id is not None and settings.readout.STORE_CONFIG:
+        await store_config(device_id, outputs["show run"])
+    return await parse_outputs(os, outputs)
 
-async def readout_cpe(ip: str, os: str):  # noqa: ANN201
+
+@dataclass
+class ReadoutJob:
+    """The readout job of a device, with its result once it completed."""
+
+    key: str
+    status: str
+    coalesced: bool = False
+    """Whether the request attached to a job that was already in flight (or just completed)."""
+    queued: int | None = None
+    """Epoch milliseconds."""
+    completed: int | None = None
+    """Epoch milliseconds."""
+    result: dict[str, dict[str, Any]] | None = None
+    """The parsed output of the readout commands, by command."""
+    error: str | None = None
+
+    @classmethod
+    def from_job(cls, job: Job, coalesced: bool = False) -> ReadoutJob:
+        return cls(
+            key=job.key,
+            status=job.status.value,
+            coalesced=coalesced,
+            queued=job.queued or None,
+            completed=job.completed or None,
+            result=job.result,
+            error=job.error,
+        )
+
+
+def readout_job_key(ip: str, device_id: str | None = None) -> str:
+    """The deterministic key of the readout job of a device, repeated readouts share it."""
+    return f"readout-{device_id or ip}"
+
+
+def _coalesces(job: Job) -> bool:
+    """Whether a readout request attaches to ``job`` instead of reading out the device again."""
+    if job.status not in TERMINAL_STATUSES:
+        return True
+    window = settings.readout.COALESCE_WINDOW * 1000
+    return job.status == Status.COMPLETE and job.completed + window >= now()
+
+
+async def readout_job(ip: str, device_id: str | None = None, wait: float | None = None) -> ReadoutJob | None:
+    """The latest readout job of a device, None when there is none (anymore).
+
+    With ``wait`` it waits up to that many seconds for the job to finish, and returns the job as
+    it is then, finished or not.
+    """
     from app.domain.plugins import saq
 
     queue = saq.get_queue("background-tasks")
+    job = await queue.job(readout_job_key(ip, device_id))
+    if job is None:
+        return None
+    if wait:
+        job = await _wait_until_finished(queue, job, wait)
+    return ReadoutJob.from_job(job)
 
-    await queue.enqueue(
+
+async def _wait_until_finished(queue: Queue, job: Job, wait: float) -> Job:
+    """Wait up to ``wait`` seconds for the job to finish, return its latest state.
+
+    A job that ends between reading it and subscribing to its updates sends no update anymore,
+    so the job is read again every ``settings.readout.JOB_POLL_INTERVAL`` seconds.
+    """
+    deadline = time.monotonic() + wait
+    while job.status not in TERMINAL_STATUSES and (remaining := deadline - time.monotonic()) > 0:
+        with suppress(TimeoutError):
+            await queue.listen(
+                [job.key],
+                lambda _, status: status in TERMINAL_STATUSES,
+                timeout=min(remaining, settings.readout.JOB_POLL_INTERVAL),
+            )
+        # an expired job keeps the state it had
+        job = await queue.job(job.key) or job
+    return job
+
+
+async def readout_cpe(ip: str, os: str, device_id: str | None = None) -> ReadoutJob:
+    """Enqueue a readout of a device, or attach to the readout of it that is in flight.
+
+    Readout requests of a device within ``settings.readout.COALESCE_WINDOW`` seconds of the
+    previous completed one get that readout too, so a burst of requests reads out the device
+    and sends its email once.
+    """
+    from app.domain.plugins import saq
+
+    queue = saq.get_queue("background-tasks")
+    key = readout_job_key(ip, device_id)
+
+    job = await queue.job(key)
+    if job is not None and _coalesces(job):
+        return ReadoutJob.from_job(job, coalesced=True)
+
+    job = await queue.enqueue(
         "communicate_with_cpe",
+        key=key,
         ip=ip,
         os=os,
+        device_id=device_id,
         timeout=60,
+        # the finished job (and its result) has to outlive the coalescing window
+        ttl=max(settings.readout.COALESCE_WINDOW, 600),
     )
+    if job is None:
+        # a concurrent request enqueued it first
+        job = await queue.job(key)
+        return ReadoutJob.from_job(job, coalesced=True) if job else ReadoutJob(key=key, status=Status.QUEUED.value)
 
     await queue.enqueue(
         "send_email",
+        key=f"{key}-email",
         subject="test",
         to=["test@test.nl", "sjaakie@sjaakie.nl"],
         html="",
         timeout=60,
     )
+    return ReadoutJob.from_job(job)
@@ -1,107 +1,338 @@
+import datetime
+import math
+import time
 from multiprocessing import cpu_count
 from typing import Any
 
-from gufo.ping import Ping
+from anyio import Semaphore, connect_tcp, create_task_group, move_on_after, sleep
 
 from app.domain.cpe.dependencies import provides_cpe_service
-from app.lib import log
+from app.domain.cpe.flap_detection import FlapDetector
+from app.domain.cpe.latency import store_ping_samples
+from app.domain.cpe.ping_schedule import PingSchedule
+from app.domain.cpe.reachability import Reachability, reachability_cache
+from app.lib import log, settings
 from app.lib.db.base import session
+from app.lib.ping import create_backend
 
-__all__ = ["ping_cpes", "_ping"]
+__all__ = ["ping_cpes", "prune_ping_state", "_ping"]
 
 logger = log.get_logger()
 
 # Maximal amounts of CPU used
 MAX_CPU = 128  # refactor to settings and use core count
-# Number of worker tasks within every thread
-N_TASKS = 50  # refactor to settings
-RETRY_LIMIT = 3  # refactor to settings
 
 
-destinationss: dict[str, Any] = {
-    "10.1.1.142": {"device_id": "TESM1233", "mgmt_ip": "10.1.1.142"},
-    "10.1.1.156": {"device_id": "TESM1234", "mgmt_ip": "10.1.1.156"},
-}
+async def ping_cpes(_: dict) -> dict[str, float]:
+    """Ping every CPE and store its online status.
 
+    The CPEs are streamed from the database in batches of ``settings.ping.BATCH_SIZE``. Every
+    batch is pinged and written back before the next one is read, so memory stays constant
+    for any fleet size. The answers are debounced (see ``app.domain.cpe.flap_detection``) and
+    only the CPEs whose debounced online status changed are written. The round trip times of all
+    of them are stored as ping samples (see ``app.domain.cpe.latency``).
 
-async def ping_cpes(_: dict) -> None:
+    A CPE with a secondary management address is pinged on both, see ``_ping``. The address
+    that answered is stored as ``CPE.reachable_ip`` and is tried first the next sweep. A CPE is
+    online when it answers ICMP or has an open TCP port, its open ports are stored as
+    ``CPE.open_ports``.
+
+    The state of every pinged CPE is published to Redis for the rest of the app, see
+    ``app.domain.cpe.reachability``.
+
+    With ``settings.ping.ADAPTIVE`` only the CPEs that are due according to their schedule are
+    pinged, see ``app.domain.cpe.ping_schedule``.
+
+    Returns the amount of CPEs, pinged CPEs and changes, and the seconds the sweep took and of
+    those the seconds spent writing to the database.
+    """
     from app.domain.plugins import saq
 
     queue = saq.get_queue("background-tasks")
-    """Ping list of addresses."""
-
-    async def _ping_with_retries(
-        destinations: list[str],
-        succeeded: dict[str, Any],
-        failed: list[str],
-        retry: int = 0,
-    ) -> dict[str, Any]:
-        """This is a recursive function"""
-        if retry == RETRY_LIMIT:
-            converted_failed = {
-                dest: {
-                    "mgmt_ip": dest,
-                    "online_status": False,
-                }
-                for dest in failed
-            }
-
-            return succeeded | converted_failed
 
-        worker_ping_list = [destinations[n::n_workers] for n in range(n_workers)]
+    async def _ping_batch(destinations: dict[str, list[str]]) -> dict[str, Any]:
+        # Effective number of workers cannot be more than
+        # * amount of addresses to ping
+        # * available CPUs
+        # * Imposed CPU limit
+        n_workers = min(MAX_CPU, cpu_count(), len(destinations)) or 1
+        items = list(destinations.items())
+        worker_ping_list = [dict(items[n::n_workers]) for n in range(n_workers)]
         async with queue.batch():
             results = await queue.map(
                 _ping.__name__,
-                [{"destinations": ping_list, "ping_timeout": retry + 1} for ping_list in worker_ping_list],
+                [
+                    {"destinations": ping_list, "timeout": _job_timeout(len(ping_list))}
+                    for ping_list in worker_ping_list
+                ],
+                return_exceptions=True,
             )
 
-        failed = []
-
-        for worker_results in results:
-            for ping_results in worker_results:
-                if ping_results:
-                    if ping_results[1]:
-                        succeeded[ping_results[0]] = {"mgmt_ip": ping_results[0], "online_status": ping_results[1]}
-                    else:
-                        failed.append(ping_results[0])
-
-        new_destinations = failed
-        return await _ping_with_retries(new_destinations, succeeded, failed, retry + 1)
+        # a failed job only loses its own destinations, they get no result this sweep
+        for ping_list, worker_results in zip(worker_ping_list, results, strict=True):
+            if isinstance(worker_results, BaseException):
+                await logger.awarning("ping job failed", destinations=len(ping_list), exc_info=worker_results)
+        return {
+            device_id: {
+                "online_status": answered is not None,
+                "reachable_ip": answered,
+                "rtt": rtt,
+                "open_ports": ports,
+            }
+            for worker_results in results
+            if not isinstance(worker_results, BaseException)
+            for device_id, answered, rtt, ports in worker_results
+        }
 
     db = session()
     async with db as db_session:
         cpe_service = await anext(provides_cpe_service(db_session=db_session))
-        await cpe_service.get_cpes_to_ping()
 
-        destinations: list[str] = list(destinationss.keys())
-        n_data = len(destinations)
-        # Effective number of workers cannot be more than
-        # * amount of addresses to ping
-        # * available CPUs
-        # * Imposed CPU limit
-        n_workers = min(MAX_CPU, cpu_count(), n_data)
+        schedule = PingSchedule()
+        detector = FlapDetector()
+        now = time.time()
+        started = time.perf_counter()
+        total = pinged = changed = 0
+        write_seconds = 0.0
+        async for batch in cpe_service.iter_ping_targets(settings.ping.BATCH_SIZE):
+            total += len(batch)
+            if settings.ping.ADAPTIVE:
+                due = await schedule.due([cpe["device_id"] for cpe in batch], now)
+                batch = [cpe for cpe in batch if cpe["device_id"] in due]
+            # cpe's without a management address can not be pinged
+            targets = {cpe["device_id"]: cpe for cpe in batch if _addresses(cpe)}
+            if not targets:
+                continue
+            await logger.ainfo("creating ping jobs", destinations=len(targets))
+
+            pinged_at = datetime.datetime.now(tz=datetime.UTC)
+            results = await _ping_batch({device_id: _addresses(cpe) for device_id, cpe in targets.items()})
+            writing = time.perf_counter()
+            probes = {
+                device_id: (targets[device_id], result) for device_id, result in results.items() if device_id in targets
+            }
+            await store_ping_samples(
+                db_session,
+                pinged_at,
+                {device_id: result["rtt"] for device_id, (_, result) in probes.items()},
+            )
+
+            # only write the cpe's of which the debounced online status changed
+            transitions = await detector.observe(
+                {
+                    device_id: (cpe["online_status"], result["online_status"])
+                    for device_id, (cpe, result) in probes.items()
+                },
+                now,
+            )
+            changed += await cpe_service.update_online_status(transitions)
+            await cpe_service.update_reachable_ip(
+                {
+                    device_id: result["reachable_ip"]
+                    for device_id, (cpe, result) in probes.items()
+                    if result["reachable_ip"] is not None and result["reachable_ip"] != cpe["reachable_ip"]
+                },
+            )
+            await cpe_service.update_open_ports(
+                {
+                    device_id: result["open_ports"]
+                    for device_id, (cpe, result) in probes.items()
+                    if result["open_ports"] is not None and result["open_ports"] != cpe["open_ports"]
+                },
+            )
+            await db_session.commit()
+            write_seconds += time.perf_counter() - writing
+            await reachability_cache.publish(
+                {
+                    device_id: Reachability(
+                        online=transitions.get(device_id, cpe["online_status"]),
+                        answered=result["online_status"],
+                        checked=pinged_at.timestamp(),
+                        reachable_ip=result["reachable_ip"],
+                        rtt=None if result["rtt"] is None else result["rtt"] * 1000,
+                        last_seen=pinged_at.timestamp() if result["online_status"] else None,
+                    )
+                    for device_id, (cpe, result) in probes.items()
+                },
+            )
+            pinged += len(targets)
 
-        await logger.ainfo("creating ping jobs")
+            if settings.ping.ADAPTIVE:
+                await schedule.reschedule(
+                    {
+                        device_id: (cpe["online_status"], result["online_status"])
+                        for device_id, (cpe, result) in probes.items()
+                    },
+                    now,
+                )
 
-        results = await _ping_with_retries(destinations, succeeded={}, failed=[], retry=1)
+        summary = {
+            "total": total,
+            "pinged": pinged,
+            "changed": changed,
+            "seconds": time.perf_counter() - started,
+            "write_seconds": write_seconds,
+        }
+        await logger.ainfo(
+            "done pinging %s of %s destinations, %s changed their online status",
+            pinged,
+            total,
+            changed,
+            **summary,
+        )
+        return summary
 
-        for key, result in results.items():
-            if key in destinationss:
-                destinationss[key].update(result)
 
-        await logger.ainfo("done pinging %s destinations. committing results to db", len(destinations))
-        await cpe_service.update_many(list(destinationss.values()))
-        await logger.ainfo("Done")
+async def prune_ping_state(_: dict) -> dict[str, int]:
+    """Drop the ping state in Redis of the cpe's that were deleted.
 
+    The sweeps only write the state of the cpe's they ping, so the link states, probe
+    schedule and reachability of a deleted cpe would stay in Redis forever.
+    """
+    device_ids: set[str] = set()
+    async with session() as db_session:
+        cpe_service = await anext(provides_cpe_service(db_session=db_session))
+        async for batch in cpe_service.iter_ping_targets(settings.ping.BATCH_SIZE):
+            device_ids.update(cpe["device_id"] for cpe in batch)
+    pruned = {
+        "link_states": await FlapDetector().prune(device_ids),
+        "schedules": await PingSchedule().prune(device_ids),
+        "reachability": await reachability_cache.prune(device_ids),
+    }
+    await logger.ainfo("pruned the ping state of deleted cpe's", **pruned)
+    return pruned
+
+
+def _addresses(cpe: dict[str, Any]) -> list[str]:
+    """The management addresses of a cpe, the one that answered last time first."""
+    addresses = [address for address in (cpe["mgmt_ip"], cpe.get("sec_mgmt_ip")) if address]
+    if cpe.get("reachable_ip") in addresses:
+        addresses.remove(cpe["reachable_ip"])
+        addresses.insert(0, cpe["reachable_ip"])
+    return addresses
+
+
+def _job_timeout(destinations: int) -> int:
+    """Worst case duration of a ping job: every destination needing every attempt on its last address.
+
+    The TCP connects of two addresses per destination are added on top of that.
+    """
+    rounds = math.ceil(destinations / settings.ping.MAX_IN_FLIGHT)
+    attempts = settings.ping.TIMEOUT * (2 ** (settings.ping.RETRIES + 1) - 1)
+    connects = math.ceil(destinations * 2 * len(settings.ping.TCP_PORTS) / settings.ping.TCP_MAX_IN_FLIGHT)
+    return math.ceil(rounds * (attempts + settings.ping.RACE_DELAY) + connects * settings.ping.TCP_TIMEOUT) + 10
+
+
+async def _ping(
+    ctx: str,
+    *,
+    destinations: dict[str, list[str]],
+    ping_timeout: float | None = None,
+) -> list[tuple[str, str | None, float | None, list[int] | None]]:
+    """Ping the destinations, keeping up to ``settings.ping.MAX_IN_FLIGHT`` probes in flight.
+
+    The destinations are the management addresses of the cpe's by device_id, the preferred one
+    first. Cpe's sharing an address are each probed on their own. The
+    addresses are raced happy eyeballs style: every next address starts
+    ``settings.ping.RACE_DELAY`` seconds after the previous one, and the first answer wins. A
+    cpe that is only reachable on its backup path is detected within one round.
+
+    An address that does not answer is retried up to ``settings.ping.RETRIES`` times, doubling
+    its timeout every attempt. Retries run right away in this job, without waiting on the other
+    destinations. Every attempt number has one pinger (one ICMP socket) shared by all probes.
+    A probe task is only started when the semaphore has room, so the amount of tasks stays
+    bounded for any amount of destinations.
+
+    After the ICMP race the ``settings.ping.TCP_PORTS`` of the address that answered are probed
+    with a TCP connect, many cpe's drop ICMP but accept SSH. When no address answered ICMP the
+    addresses are tried in order until one has an open port. At most
+    ``settings.ping.TCP_MAX_IN_FLIGHT`` connects are in flight.
+
+    Returns for every destination its device_id, the address that answered, its round trip
+    time in seconds and its open ports. The address and round trip time are ``None`` when no
+    address answered, the open ports are ``None`` when no ports are probed. A destination whose
+    probe raised counts as not answering.
+    """
+    results: list[tuple[str, str | None, float | None, list[int] | None]] = []
+    prober = _Prober(ping_timeout or settings.ping.TIMEOUT)
+    in_flight = Semaphore(settings.ping.MAX_IN_FLIGHT)
 
-async def _ping(ctx: str, *, destinations: list[str], ping_timeout: int = 1) -> list[tuple[str, bool]]:
-    results = []
-    ping = Ping(size=64, timeout=ping_timeout)
-    for destination in destinations:
-        rtt = await ping.ping(destination)
-        if rtt:
-            results.append((destination, True))
-        else:
-            results.append((destination, False))
+    async def probe(device_id: str, addresses: list[str]) -> None:
+        try:
+            results.append((device_id, *await prober.probe(addresses)))
+        except Exception as exc:  # noqa: BLE001
+            # a bad address must not fail the other destinations of the job
+            await logger.awarning("ping probe failed", device_id=device_id, addresses=addresses, exc_info=exc)
+            results.append((device_id, None, None, None))
+        finally:
+            in_flight.release()
+
+    async with create_task_group() as task_group:
+        for device_id, addresses in destinations.items():
+            await in_flight.acquire()
+            task_group.start_soon(probe, device_id, addresses)
 
     return results
+
+
+class _Prober:
+    """The ICMP sockets and TCP connect budget shared by the probes of a ping job."""
+
+    def __init__(self, timeout: float) -> None:
+        self.pings = [
+            create_backend(size=settings.ping.SIZE, timeout=timeout * 2**attempt)
+            for attempt in range(settings.ping.RETRIES + 1)
+        ]
+        self.tcp_in_flight = Semaphore(settings.ping.TCP_MAX_IN_FLIGHT)
+
+    async def rtt(self, address: str) -> float | None:
+        for ping in self.pings:
+            rtt = await ping.ping(address)
+            if rtt is not None:
+                return rtt
+        return None
+
+    async def race(self, addresses: list[str]) -> tuple[str | None, float | None]:
+        answer: tuple[str | None, float | None] = (None, None)
+        async with create_task_group() as task_group:
+
+            async def attempt(address: str, delay: float) -> None:
+                nonlocal answer
+                await sleep(delay)
+                rtt = await self.rtt(address)
+                if rtt is not None and answer[0] is None:
+                    answer = (address, rtt)
+                    task_group.cancel_scope.cancel()
+
+            for position, address in enumerate(addresses):
+                task_group.start_soon(attempt, address, position * settings.ping.RACE_DELAY)
+        return answer
+
+    async def open_ports(self, address: str) -> list[int]:
+        ports: list[int] = []
+
+        async def connect(port: int) -> None:
+            async with self.tcp_in_flight:
+                with move_on_after(settings.ping.TCP_TIMEOUT):
+                    try:
+                        stream = await connect_tcp(address, port)
+                    except OSError:
+                        return
+                    await stream.aclose()
+                    ports.append(port)
+
+        async with create_task_group() as task_group:
+            for port in settings.ping.TCP_PORTS:
+                task_group.start_soon(connect, port)
+        return sorted(ports)
+
+    async def probe(self, addresses: list[str]) -> tuple[str | None, float | None, list[int] | None]:
+        answered, rtt = await self.race(addresses)
+        ports = None
+        if settings.ping.TCP_PORTS:
+            for address in [answered] if answered else addresses:
+                ports = await self.open_ports(address)
+                if ports:
+                    answered = address
+                    break
+        return answered, rtt, ports
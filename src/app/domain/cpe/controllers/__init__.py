@@ -1,3 +1,4 @@
 from .cpe import CpeController
+from .fleet_readout import FleetReadoutController
 
-__all__ = ["CpeController"]
+__all__ = ["CpeController", "FleetReadoutController"]
@@ -1,23 +1,28 @@
 """CPE Controllers."""
 from __future__ import annotations
 
+import datetime
 from typing import TYPE_CHECKING
 
 from litestar import Controller, delete, get, patch, post
 from litestar.di import Provide
+from litestar.exceptions import NotFoundException, ServiceUnavailableException, ValidationException
 from litestar.params import Dependency, Parameter
 
 from app.domain import urls
-from app.domain.cpe.business_logic import readout_cpe
+from app.domain.cpe.business_logic import ReadoutJob, readout_cpe, readout_job
 from app.domain.cpe.dependencies import provides_cpe_service
-from app.domain.cpe.dtos import CpeDTO, CPEUpdateDTO, CreateCPE, CreateCpeDTO, ReadoutCpeDTO, UpdateCPE
-from app.lib import log
+from app.domain.cpe.dtos import CpeDTO, CPEUpdateDTO, CreateCPE, CreateCpeDTO, UpdateCPE
+from app.domain.cpe.latency import LatencyHistory, latency_history
+from app.domain.cpe.reachability import Reachability, reachability_cache
+from app.lib import log, settings
 
 __all__ = ["CpeController"]
 
 if TYPE_CHECKING:
     from litestar.dto import DTOData
     from litestar.pagination import OffsetPagination
+    from sqlalchemy.ext.asyncio import AsyncSession
 
     from app.domain.cpe.models import CPE
     from app.domain.cpe.services import CPEService
@@ -127,9 +132,11 @@ class CpeController(Controller):
         name="cpes:readout",
         summary="Perform a readout of a CPE",
         cache_control=None,
-        description="readout cpe",
+        description="Enqueue a readout of a CPE and return its readout job. A request while a readout of the CPE is "
+        "in flight, or shortly after it completed, gets that readout job with `coalesced` set. The result is "
+        "retrieved with a GET on the same path.",
         path=urls.CPES_READOUT,
-        dto=ReadoutCpeDTO,
+        return_dto=None,
     )
     async def readout_cpe(
         self,
@@ -138,8 +145,113 @@ class CpeController(Controller):
             title="CPE ID",
             description="The CPE to perform a readout on.",
         ),
-    ) -> CPE:
+    ) -> ReadoutJob:
+        """Readout a CPE."""
         db_obj = await cpes_service.get(device_id)
-        await readout_cpe(db_obj.mgmt_ip, db_obj.os)
-        """Readout a CPE"""
-        return cpes_service.to_dto(db_obj)
+        if db_obj.management_port_closed:
+            raise ServiceUnavailableException(
+                detail=f"The management port of {device_id} was closed at the last ping, not reading it out",
+            )
+        state = await reachability_cache.get(device_id)
+        # the address that answered the latest ping, it can be newer than CPE.reachable_ip
+        if state is not None and state.reachable_ip and state.reachable_ip in (db_obj.mgmt_ip, db_obj.sec_mgmt_ip):
+            return await readout_cpe(state.reachable_ip, db_obj.os, device_id)
+        return await readout_cpe(db_obj.management_ip, db_obj.os, device_id)
+
+    @get(
+        operation_id="GetCPEReadout",
+        name="cpes:readout-result",
+        summary="Retrieve the latest readout of a CPE",
+        cache_control=None,
+        description="The latest readout job of a CPE and its parsed output. Readouts requested while one is in "
+        "flight, or shortly after it completed, share that readout.",
+        path=urls.CPES_READOUT,
+        return_dto=None,
+    )
+    async def get_readout(
+        self,
+        cpes_service: CPEService,
+        device_id: str = Parameter(
+            title="CPE ID",
+            description="The CPE of the readout.",
+        ),
+        wait: float = Parameter(
+            default=0,
+            ge=0,
+            le=60,
+            description="Seconds to wait for a readout in flight to finish, it is returned unfinished after them.",
+        ),
+    ) -> ReadoutJob:
+        """Get the latest readout of a CPE."""
+        db_obj = await cpes_service.get(device_id)
+        job = await readout_job(db_obj.management_ip, device_id, wait)
+        if job is None:
+            raise NotFoundException(detail=f"No recent readout of {device_id}")
+        return job
+
+    @get(
+        operation_id="GetCPELatency",
+        name="cpes:latency",
+        summary="Retrieve the latency history of a CPE",
+        cache_control=None,
+        description="The round trip times and packet loss of the pings of a CPE, downsampled to at most `points` points.",
+        path=urls.CPES_LATENCY,
+        return_dto=None,
+    )
+    async def get_cpe_latency(
+        self,
+        db_session: AsyncSession,
+        device_id: str = Parameter(title="device id", description="The device to retrieve the latency of"),
+        start: datetime.datetime | None = Parameter(default=None, description="Start, a day before end by default."),
+        end: datetime.datetime | None = Parameter(default=None, description="End, now by default."),
+        points: int = Parameter(
+            default=300,
+            ge=1,
+            le=settings.ping.HISTORY_MAX_POINTS,
+            description="Amount of points.",
+        ),
+    ) -> LatencyHistory:
+        """Get the latency history of a CPE"""
+        end = end or datetime.datetime.now(tz=datetime.UTC)
+        start = start or end - datetime.timedelta(days=1)
+        if start.tzinfo is None or end.tzinfo is None:
+            raise ValidationException(detail="start and end need a timezone")
+        if start >= end:
+            raise ValidationException(detail="start needs to be before end")
+        return await latency_history(db_session, device_id, start, end, points)
+
+    @get(
+        operation_id="GetCPEsReachability",
+        name="cpes:reachability",
+        summary="Retrieve the reachability of CPEs",
+        cache_control=None,
+        description="The state of the CPEs at their last ping, `null` for CPEs that were not pinged yet. "
+        "Served from Redis, without touching the database.",
+        path=urls.CPES_REACHABILITY,
+        return_dto=None,
+    )
+    async def get_cpes_reachability(
+        self,
+        device_ids: list[str] = Parameter(query="device_id", description="The devices to retrieve"),
+    ) -> dict[str, Reachability | None]:
+        """Get the reachability of CPEs"""
+        return await reachability_cache.get_many(device_ids)
+
+    @get(
+        operation_id="GetCPEReachability",
+        name="cpes:detail-reachability",
+        summary="Retrieve the reachability of a CPE",
+        cache_control=None,
+        description="The state of a CPE at its last ping. Served from Redis, without touching the database.",
+        path=urls.CPES_DETAIL_REACHABILITY,
+        return_dto=None,
+    )
+    async def get_cpe_reachability(
+        self,
+        device_id: str = Parameter(title="device id", description="The device to retrieve the reachability of"),
+    ) -> Reachability:
+        """Get the reachability of a CPE"""
+        state = await reachability_cache.get(device_id)
+        if state is None:
+            raise NotFoundException(detail=f"{device_id} was not pinged yet")
+        return state
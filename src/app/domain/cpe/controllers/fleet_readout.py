@@ -0,0 +1,91 @@
+"""Fleet Readout Controllers."""
+from __future__ import annotations
+
+from advanced_alchemy.exceptions import NotFoundError
+from litestar import Controller, get, post
+from litestar.params import Parameter
+
+from app.domain import urls
+from app.domain.cpe.fleet_readout import (
+    ReadoutFilter,
+    ReadoutRun,
+    get_readout_run,
+    list_readout_runs,
+    readout_failures,
+    start_fleet_readout,
+)
+from app.lib import log
+
+__all__ = ["FleetReadoutController"]
+
+
+logger = log.get_logger()
+
+
+class FleetReadoutController(Controller):
+    """Start and follow readouts of (a part of) the fleet."""
+
+    tags = ["CPES"]
+
+    @get(
+        operation_id="ListReadoutRuns",
+        name="readoutruns:list",
+        summary="List fleet readouts",
+        cache_control=None,
+        description="Retrieve the most recent fleet readouts and their progress.",
+        path=urls.READOUT_RUNS,
+    )
+    async def list_readout_runs(
+        self,
+        limit: int = Parameter(default=20, ge=1, le=100, description="Amount of runs to return."),
+    ) -> list[ReadoutRun]:
+        """List fleet readouts."""
+        return await list_readout_runs(limit)
+
+    @post(
+        operation_id="StartReadoutRun",
+        name="readoutruns:start",
+        summary="Start a fleet readout",
+        cache_control=None,
+        description="Read out the devices matching the filters, within the global and per vendor concurrency limits.",
+        path=urls.READOUT_RUNS,
+    )
+    async def start_readout_run(self, data: ReadoutFilter) -> ReadoutRun:
+        """Start a fleet readout."""
+        return await start_fleet_readout(data)
+
+    @get(
+        operation_id="GetReadoutRun",
+        name="readoutruns:get",
+        summary="Retrieve the progress of a fleet readout",
+        cache_control=None,
+        path=urls.READOUT_RUN_DETAIL,
+    )
+    async def get_readout_run(
+        self,
+        run_id: str = Parameter(title="Run ID", description="The fleet readout to retrieve."),
+    ) -> ReadoutRun:
+        """Get a fleet readout."""
+        run = await get_readout_run(run_id)
+        if run is None:
+            msg = f"No fleet readout found with id {run_id}"
+            raise NotFoundError(msg)
+        return run
+
+    @get(
+        operation_id="GetReadoutRunFailures",
+        name="readoutruns:failures",
+        summary="Retrieve the failed readouts of a fleet readout",
+        cache_control=None,
+        description="The error of every failed readout of the run, by device id.",
+        path=urls.READOUT_RUN_FAILURES,
+    )
+    async def get_readout_run_failures(
+        self,
+        run_id: str = Parameter(title="Run ID", description="The fleet readout to retrieve the failures of."),
+    ) -> dict[str, str]:
+        """Get the failures of a fleet readout."""
+        if await get_readout_run(run_id) is None:
+            msg = f"No fleet readout found with id {run_id}"
+            raise NotFoundError(msg)
+        return await readout_failures(run_id)
@@ -0,0 +1,106 @@
+"""Debouncing of the online status of the cpe's.
+
+A single unanswered sweep does not take a cpe offline. Every cpe has a small state machine:
+its debounced status, and the amount of probes in a row that disagree with it. The status
+only changes when ``settings.ping.DOWN_THRESHOLD`` probes in a row got no answer, or
+``settings.ping.UP_THRESHOLD`` probes in a row got one. Only those debounced transitions are
+written to ``CPE.online_status``, which keeps jitter from flipping TSCM compliance and from
+causing write storms.
+
+A cpe that still changes status ``settings.ping.FLAP_THRESHOLD`` times within
+``settings.ping.FLAP_WINDOW`` seconds is flapping: its thresholds are multiplied by
+``settings.ping.FLAP_DAMPING`` until it calms down.
+
+The states are kept in a Redis hash, so they survive worker restarts and are shared by the
+workers running the sweeps.
+"""
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING
+
+from app.lib import serialization, settings
+from app.lib.cache import prune_hash, redis
+
+if TYPE_CHECKING:
+    from collections.abc import Container
+
+    from redis.asyncio import Redis
+
+__all__ = ["FlapDetector", "LinkState"]
+
+
+@dataclass
+class LinkState:
+    online: bool
+    """The debounced online status."""
+    streak: int = 0
+    """Amount of probes in a row that disagree with ``online``."""
+    transitions: list[float] = field(default_factory=list)
+    """Epochs of the debounced transitions within the flap window."""
+
+    @property
+    def flapping(self) -> bool:
+        return len(self.transitions) >= settings.ping.FLAP_THRESHOLD
+
+    def threshold(self) -> int:
+        """Amount of disagreeing probes in a row needed for a transition."""
+        threshold = settings.ping.DOWN_THRESHOLD if self.online else settings.ping.UP_THRESHOLD
+        return threshold * settings.ping.FLAP_DAMPING if self.flapping else threshold
+
+    def observe(self, answered: bool, now: float) -> bool:
+        """Feed the outcome of a probe, return whether the debounced status changed."""
+        self.transitions = [epoch for epoch in self.transitions if now - epoch < settings.ping.FLAP_WINDOW]
+        if answered == self.online:
+            self.streak = 0
+            return False
+        self.streak += 1
+        if self.streak < self.threshold():
+            return False
+        self.online = answered
+        self.streak = 0
+        self.transitions.append(now)
+        return True
+
+
+class FlapDetector:
+    """The link states of the cpe's, stored in Redis."""
+
+    def __init__(self, client: Redis | None = None) -> None:
+        self.redis = client or redis
+        self.key = f"{settings.app.slug}:ping-link-state"
+
+    async def observe(self, probes: dict[str, tuple[bool, bool]], now: float) -> dict[str, bool]:
+        """Feed the outcome of the probes of a sweep.
+
+        Args:
+            probes: device_id to its stored online status and whether it answered the probe.
+            now: epoch of the sweep.
+
+        Returns:
+            The device_ids of which the debounced status changed, with their new status.
+        """
+        if not probes:
+            return {}
+        device_ids = list(probes)
+        values = await self.redis.hmget(self.key, device_ids)
+        states: dict[str, LinkState] = {}
+        transitions: dict[str, bool] = {}
+        for device_id, value in zip(device_ids, values, strict=True):
+            online, answered = probes[device_id]
+            state = LinkState(**serialization.from_json(value)) if value is not None else LinkState(online=online)
+            # the stored status is leading, it is changed by hand or by an older sweep
+            if state.online != online:
+                state = LinkState(online=online, transitions=state.transitions)
+            if state.observe(answered, now):
+                transitions[device_id] = state.online
+            states[device_id] = state
+        await self.redis.hset(
+            self.key,
+            mapping={key: serialization.to_json(asdict(state)) for key, state in states.items()},
+        )
+        return transitions
+
+    async def prune(self, device_ids: Container[str]) -> int:
+        """Drop the link states of the cpe's that are not in ``device_ids``, the ones that were deleted."""
+        return await prune_hash(self.redis, self.key, device_ids)
@@ -0,0 +1,302 @@
+"""Readouts of a whole fleet, or a filtered part of it.
+
+A readout run is coordinated by one SAQ job which selects the devices and splits them in
+chunks of ``settings.readout.CHUNK_SIZE``. Every chunk runs as its own job, so the readouts
+are spread over all workers. The readouts of a chunk run concurrently, but every readout first
+takes a slot of two Redis semaphores (see ``app.lib.semaphore``): a global one of
+``settings.readout.MAX_CONCURRENCY`` slots and one of its vendor, of
+``settings.readout.VENDOR_CONCURRENCY`` slots. However many workers pick up chunks, the SSH
+sessions to the devices of a vendor stay capped, and a nightly refresh of every config takes
+a predictable window.
+
+Devices that are offline at their last ping, or whose management port was closed, are skipped.
+The progress of a run is counted in Redis as its readouts finish, and the error of every failed
+readout is kept with the run. A chunk job that is cancelled by its SAQ timeout still counts
+as completed, with the readouts it did not finish as failed, so the run completes.
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING, Any
+from uuid import uuid4
+
+from anyio import CancelScope, create_task_group, fail_after
+
+from app.domain.cpe.business_logic import readout_device
+from app.domain.cpe.dependencies import provides_cpe_service
+from app.domain.cpe.reachability import reachability_cache
+from app.lib import log, serialization, settings
+from app.lib.cache import redis
+from app.lib.db.base import session
+from app.lib.semaphore import RedisSemaphore
+
+if TYPE_CHECKING:
+    from saq.types import Context
+
+__all__ = [
+    "ReadoutFilter",
+    "ReadoutRun",
+    "fleet_readout",
+    "fleet_readout_chunk",
+    "get_readout_run",
+    "list_readout_runs",
+    "readout_failures",
+    "readout_semaphore",
+    "start_fleet_readout",
+    "start_nightly_fleet_readout",
+]
+
+
+logger = log.get_logger()
+
+PROGRESS_KEYS = ("completed_chunks", "succeeded", "failed", "skipped")
+
+
+@dataclass
+class ReadoutFilter:
+    """The devices to read out, omitted filters match all devices."""
+
+    device_ids: list[str] | None = None
+    vendor_name: str | None = None
+    business_product_name: str | None = None
+    model_name: str | None = None
+    online_only: bool = True
+    """Skip the devices that were offline at their last ping or had their management port closed."""
+
+
+@dataclass
+class ReadoutRun:
+    run_id: str
+    filters: ReadoutFilter = field(default_factory=ReadoutFilter)
+    status: str = "pending"
+    """One of pending, running or completed."""
+    created: float = field(default_factory=time.time)
+    finished: float | None = None
+    devices: int = 0
+    chunks: int = 0
+    completed_chunks: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    skipped: int = 0
+
+
+def _run_key(run_id: str) -> str:
+    return f"{settings.app.slug}:readout-run:{run_id}"
+
+
+def _progress_key(run_id: str) -> str:
+    return f"{settings.app.slug}:readout-run:{run_id}:progress"
+
+
+def _failures_key(run_id: str) -> str:
+    return f"{settings.app.slug}:readout-run:{run_id}:failures"
+
+
+def _runs_key() -> str:
+    return f"{settings.app.slug}:readout-runs"
+
+
+def readout_semaphore(vendor_name: str) -> RedisSemaphore:
+    """The global and vendor concurrency slots a readout of a device of ``vendor_name`` takes."""
+    vendor_limit = settings.readout.VENDOR_CONCURRENCY.get(vendor_name, settings.readout.DEFAULT_VENDOR_CONCURRENCY)
+    return RedisSemaphore(
+        {
+            f"{settings.app.slug}:readout-slots": settings.readout.MAX_CONCURRENCY,
+            f"{settings.app.slug}:readout-slots:{vendor_name.lower()}": vendor_limit,
+        },
+        lease=settings.readout.DEVICE_TIMEOUT + 30,
+    )
+
+
+async def _save_run(run: ReadoutRun) -> None:
+    ttl = settings.readout.RUN_RECORD_TTL
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.set(_run_key(run.run_id), serialization.to_json(asdict(run)), ex=ttl)
+        pipe.zadd(_runs_key(), {run.run_id: run.created})
+        pipe.zremrangebyscore(_runs_key(), "-inf", time.time() - ttl)
+        await pipe.execute()
+
+
+async def get_readout_run(run_id: str) -> ReadoutRun | None:
+    """Return a run with its progress, or None when the run is unknown (or expired)."""
+    payload = await redis.get(_run_key(run_id))
+    if payload is None:
+        return None
+    data = serialization.from_json(payload)
+    run = ReadoutRun(**{**data, "filters": ReadoutFilter(**data["filters"])})
+    progress = await redis.hgetall(_progress_key(run_id))
+    for key, value in progress.items():
+        setattr(run, key.decode(), int(value))
+    return run
+
+
+async def list_readout_runs(limit: int = 20) -> list[ReadoutRun]:
+    """Return the most recent runs, newest first."""
+    run_ids = await redis.zrevrange(_runs_key(), 0, limit - 1)
+    runs = [await get_readout_run(run_id.decode()) for run_id in run_ids]
+    return [run for run in runs if run is not None]
+
+
+async def readout_failures(run_id: str) -> dict[str, str]:
+    """The error of every failed readout of a run, by device_id."""
+    return {
+        device_id.decode(): error.decode() for device_id, error in (await redis.hgetall(_failures_key(run_id))).items()
+    }
+
+
+async def start_fleet_readout(filters: ReadoutFilter | None = None) -> ReadoutRun:
+    """Create a run record and enqueue its coordinator."""
+    from app.domain.plugins import saq
+
+    run = ReadoutRun(run_id=uuid4().hex, filters=filters or ReadoutFilter())
+    await _save_run(run)
+    queue = saq.get_queue("background-tasks")
+    await queue.enqueue(
+        "fleet_readout",
+        key=f"readout-run-{run.run_id}",
+        run_id=run.run_id,
+        timeout=settings.readout.RUN_COORDINATOR_TIMEOUT,
+    )
+    return run
+
+
+async def start_nightly_fleet_readout(_: Context) -> None:
+    run = await start_fleet_readout()
+    await logger.ainfo("nightly fleet readout started", run_id=run.run_id)
+
+
+def _management_ip(target: dict[str, Any]) -> str:
+    """Like ``CPE.management_ip``, for a row of ``CPEService.get_readout_targets``."""
+    if target["reachable_ip"] in (target["mgmt_ip"], target["sec_mgmt_ip"]):
+        return target["reachable_ip"]
+    return target["mgmt_ip"]
+
+
+async def _select_targets(filters: ReadoutFilter) -> tuple[list[dict[str, Any]], int]:
+    """The devices to read out, and the amount of skipped devices."""
+    async with session() as db_session:
+        cpe_service = await anext(provides_cpe_service(db_session=db_session))
+        rows = await cpe_service.get_readout_targets(
+            filters.device_ids,
+            filters.vendor_name,
+            filters.business_product_name,
+            filters.model_name,
+        )
+    if filters.online_only:
+        states = await reachability_cache.get_many([row["device_id"] for row in rows])
+        reachable = []
+        for row in rows:
+            state = states[row["device_id"]]
+            online = row["online_status"] if state is None else state.online
+            port_closed = row["open_ports"] is not None and settings.ping.MANAGEMENT_PORT not in row["open_ports"]
+            if online and not port_closed:
+                reachable.append(row)
+        skipped, rows = len(rows) - len(reachable), reachable
+    else:
+        skipped = 0
+    targets = [
+        {"device_id": row["device_id"], "ip": _management_ip(row), "os": row["os"], "vendor": row["vendor"]}
+        for row in rows
+    ]
+    return targets, skipped
+
+
+async def fleet_readout(_: Context, *, run_id: str) -> dict[str, Any]:
+    """Coordinate a run: select the devices and enqueue a job for every chunk of them.
+
+    The coordinator does not wait for the chunks, the chunk that finishes last completes the run.
+    """
+    from app.domain.plugins import saq
+
+    queue = saq.get_queue("background-tasks")
+    run = await get_readout_run(run_id)
+    if run is None:
+        await logger.awarning("readout run not found", run_id=run_id)
+        return {}
+    if run.status != "pending":
+        return asdict(run)
+
+    targets, skipped = await _select_targets(run.filters)
+    chunk_size = settings.readout.CHUNK_SIZE
+    chunks = [targets[n : n + chunk_size] for n in range(0, len(targets), chunk_size)]
+    run.devices = len(targets) + skipped
+    run.chunks = len(chunks)
+    run.status = "running" if chunks else "completed"
+    run.finished = None if chunks else time.time()
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hset(_progress_key(run_id), mapping={"skipped": skipped})
+        pipe.expire(_progress_key(run_id), settings.readout.RUN_RECORD_TTL)
+        await pipe.execute()
+    await _save_run(run)
+
+    for n, chunk in enumerate(chunks):
+        await queue.enqueue(
+            "fleet_readout_chunk",
+            key=f"readout-run-{run_id}-{n}",
+            timeout=(
+                settings.readout.QUEUE_TIMEOUT + settings.readout.DEVICE_TIMEOUT + settings.readout.CHUNK_TIMEOUT_MARGIN
+            ),
+            run_id=run_id,
+            targets=chunk,
+        )
+    await logger.ainfo("readout run chunks enqueued", run_id=run_id, devices=len(targets), skipped=skipped)
+    return asdict(run)
+
+
+async def _record_failures(run_id: str, errors: dict[str, str]) -> None:
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hincrby(_progress_key(run_id), "failed", len(errors))
+        pipe.hset(_failures_key(run_id), mapping=errors)
+        pipe.expire(_failures_key(run_id), settings.readout.RUN_RECORD_TTL)
+        await pipe.execute()
+
+
+async def _readout(run_id: str, target: dict[str, Any]) -> None:
+    try:
+        async with readout_semaphore(target["vendor"]).hold(timeout=settings.readout.QUEUE_TIMEOUT):
+            with fail_after(settings.readout.DEVICE_TIMEOUT):
+                await readout_device(target["ip"], target["os"], target["device_id"])
+    except Exception as exc:  # noqa: BLE001
+        await logger.awarning("readout failed", run_id=run_id, device_id=target["device_id"], exc_info=exc)
+        await _record_failures(run_id, {target["device_id"]: f"{type(exc).__name__}: {exc}"})
+    else:
+        await redis.hincrby(_progress_key(run_id), "succeeded", 1)
+
+
+async def _complete_chunk(run_id: str) -> dict[str, Any]:
+    completed = await redis.hincrby(_progress_key(run_id), "completed_chunks", 1)
+    run = await get_readout_run(run_id)
+    if run is None:
+        return {}
+    if completed >= run.chunks and run.status != "completed":
+        run.status = "completed"
+        run.finished = time.time()
+        await _save_run(run)
+        await logger.ainfo(
+            "readout run finished",
+            run_id=run_id,
+            **{key: getattr(run, key) for key in PROGRESS_KEYS},
+        )
+    return asdict(run)
+
+
+async def fleet_readout_chunk(_: Context, *, run_id: str, targets: list[dict[str, Any]]) -> dict[str, Any]:
+    """Read out one chunk of devices, within the concurrency limits, and complete the run when it is the last one."""
+    pending = {target["device_id"] for target in targets}
+
+    async def readout(target: dict[str, Any]) -> None:
+        await _readout(run_id, target)
+        pending.discard(target["device_id"])
+
+    try:
+        async with create_task_group() as task_group:
+            for target in targets:
+                task_group.start_soon(readout, target)
+    finally:
+        # also when the job is cancelled by its timeout, the run would never complete otherwise
+        with CancelScope(shield=True):
+            if pending:
+                await _record_failures(run_id, dict.fromkeys(pending, "Cancelled: the chunk job timed out"))
+            run = await _complete_chunk(run_id)
+    return run
@@ -0,0 +1,313 @@
+"""Latency history of the cpe's.
+
+Every ping sweep stores one sample per cpe in ``ping_sample``: the round trip time in
+milliseconds, or ``NULL`` when the cpe did not answer. The table is partitioned by day, so
+expiring old samples is dropping a partition instead of deleting rows. The partitions are
+created ahead of time and dropped after ``settings.ping.SAMPLE_RETENTION_DAYS`` by
+``maintain_ping_samples``.
+
+``rollup_ping_samples`` aggregates the samples into ``ping_rollup``: the samples into 1m
+buckets, the 1m buckets into 1h buckets and the 1h buckets into 1d buckets. The rollups of the
+last buckets are recomputed on every run, which makes the job idempotent and lets it catch up
+after a missed run.
+
+``latency_history`` downsamples on the server: it reads the coarsest source that still has
+at least one bucket per point, and bins it into the requested amount of points.
+"""
+from __future__ import annotations
+
+import datetime
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from sqlalchemy import Interval, delete, func, insert, literal, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+
+from app.domain.cpe.models import PingRollup, PingSample
+from app.lib import log, settings
+from app.lib.db.base import session
+
+if TYPE_CHECKING:
+    from saq.types import Context
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+__all__ = [
+    "LatencyHistory",
+    "LatencyPoint",
+    "latency_history",
+    "maintain_ping_samples",
+    "rollup_ping_samples",
+    "store_ping_samples",
+]
+
+
+logger = log.get_logger()
+
+RAW = "raw"
+ROLLUPS: list[tuple[str, str, str, datetime.timedelta, datetime.timedelta]] = [
+    # resolution, date_trunc unit, source, width, lookback
+    ("1m", "minute", RAW, datetime.timedelta(minutes=1), datetime.timedelta(minutes=15)),
+    ("1h", "hour", "1m", datetime.timedelta(hours=1), datetime.timedelta(hours=2)),
+    ("1d", "day", "1h", datetime.timedelta(days=1), datetime.timedelta(days=2)),
+]
+"""The rollups in the order they are computed, every rollup is computed from the previous one."""
+
+
+@dataclass
+class LatencyPoint:
+    time: datetime.datetime
+    samples: int
+    loss: float
+    """Fraction of the samples that got no answer."""
+    rtt_min: float | None
+    rtt_avg: float | None
+    rtt_max: float | None
+
+
+@dataclass
+class LatencyHistory:
+    device_id: str
+    start: datetime.datetime
+    end: datetime.datetime
+    resolution: str
+    """The source of the points: ``raw`` samples or the ``1m``, ``1h`` or ``1d`` rollups."""
+    step_seconds: float
+    points: list[LatencyPoint] = field(default_factory=list)
+
+
+def _truncate(time: datetime.datetime, width: datetime.timedelta) -> datetime.datetime:
+    seconds = width.total_seconds()
+    return datetime.datetime.fromtimestamp(time.timestamp() // seconds * seconds, tz=datetime.UTC)
+
+
+def _retention(resolution: str) -> datetime.timedelta | None:
+    days = {
+        RAW: settings.ping.SAMPLE_RETENTION_DAYS,
+        "1m": settings.ping.MINUTE_ROLLUP_RETENTION_DAYS,
+        "1h": settings.ping.HOUR_ROLLUP_RETENTION_DAYS,
+    }.get(resolution)
+    return None if days is None else datetime.timedelta(days=days)
+
+
+async def store_ping_samples(
+    db_session: AsyncSession,
+    time: datetime.datetime,
+    rtts: dict[str, float | None],
+) -> int:
+    """Store the round trip times (in seconds, ``None`` when lost) of the cpe's pinged at ``time``.
+
+    The samples are inserted in a savepoint: when there is no partition for ``time`` only the
+    samples are lost, not the other writes of the transaction. Returns the amount of stored samples.
+    """
+    if not rtts:
+        return 0
+    try:
+        async with db_session.begin_nested():
+            await db_session.execute(
+                insert(PingSample),
+                [
+                    {"device_id": device_id, "time": time, "rtt": None if rtt is None else rtt * 1000}
+                    for device_id, rtt in rtts.items()
+                ],
+            )
+    except IntegrityError:
+        await logger.awarning("no partition to store the ping samples in", time=time.isoformat(), samples=len(rtts))
+        return 0
+    return len(rtts)
+
+
+def _partition_name(day: datetime.date) -> str:
+    return f"{PingSample.__tablename__}_{day:%Y%m%d}"
+
+
+def _partition_bounds(day: datetime.date) -> tuple[str, str]:
+    """The bounds of the partition of a UTC day, as timestamps with an explicit offset.
+
+    A bare date would be read in the time zone of the database session.
+    """
+    start = datetime.datetime.combine(day, datetime.time(), tzinfo=datetime.UTC)
+    return f"{start:%Y-%m-%d %H:%M:%S+00}", f"{start + datetime.timedelta(days=1):%Y-%m-%d %H:%M:%S+00}"
+
+
+async def _create_partitions(db_session: AsyncSession, today: datetime.date, days_ahead: int) -> list[str]:
+    created = []
+    for offset in range(days_ahead + 1):
+        day = today + datetime.timedelta(days=offset)
+        start, end = _partition_bounds(day)
+        await db_session.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {_partition_name(day)} PARTITION OF {PingSample.__tablename__} "
+                f"FOR VALUES FROM ('{start}') TO ('{end}')",
+            ),
+        )
+        created.append(_partition_name(day))
+    return created
+
+
+async def _drop_partitions(db_session: AsyncSession, before: datetime.date) -> list[str]:
+    partitions = await db_session.scalars(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+            "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+            "WHERE parent.relname = :parent",
+        ).bindparams(parent=PingSample.__tablename__),
+    )
+    dropped = []
+    for partition in partitions.all():
+        day = datetime.datetime.strptime(partition.rsplit("_", 1)[1], "%Y%m%d").replace(tzinfo=datetime.UTC).date()
+        if day < before:
+            await db_session.execute(text(f"DROP TABLE IF EXISTS {partition}"))
+            dropped.append(partition)
+    return dropped
+
+
+async def maintain_ping_samples(_: Context) -> None:
+    """Create the partitions of the coming days, drop the expired ones and delete the expired rollups."""
+    now = datetime.datetime.now(tz=datetime.UTC)
+    async with session() as db_session:
+        created = await _create_partitions(db_session, now.date(), settings.ping.SAMPLE_PARTITIONS_AHEAD)
+        dropped = await _drop_partitions(
+            db_session,
+            now.date() - datetime.timedelta(days=settings.ping.SAMPLE_RETENTION_DAYS),
+        )
+        for resolution, *_ in ROLLUPS:
+            retention = _retention(resolution)
+            if retention is not None:
+                await db_session.execute(
+                    delete(PingRollup).where(
+                        PingRollup.resolution == resolution,
+                        PingRollup.bucket < now - retention,
+                    ),
+                )
+        await db_session.commit()
+    await logger.ainfo("maintained ping sample partitions", created=created, dropped=dropped)
+
+
+async def _rollup(db_session: AsyncSession, resolution: str, unit: str, source: str, since: datetime.datetime) -> None:
+    if source == RAW:
+        bucket = func.date_trunc(unit, PingSample.time, "UTC")
+        aggregate = select(
+            PingSample.device_id,
+            literal(resolution),
+            bucket,
+            func.count(),
+            func.count() - func.count(PingSample.rtt),
+            func.min(PingSample.rtt),
+            func.max(PingSample.rtt),
+            func.coalesce(func.sum(PingSample.rtt), 0),
+        ).where(PingSample.time >= since)
+        group_by = (PingSample.device_id, bucket)
+    else:
+        rollup = aliased(PingRollup)
+        bucket = func.date_trunc(unit, rollup.bucket, "UTC")
+        aggregate = select(
+            rollup.device_id,
+            literal(resolution),
+            bucket,
+            func.sum(rollup.samples),
+            func.sum(rollup.lost),
+            func.min(rollup.rtt_min),
+            func.max(rollup.rtt_max),
+            func.sum(rollup.rtt_sum),
+        ).where(rollup.resolution == source, rollup.bucket >= since)
+        group_by = (rollup.device_id, bucket)
+
+    columns = ["device_id", "resolution", "bucket", "samples", "lost", "rtt_min", "rtt_max", "rtt_sum"]
+    statement = pg_insert(PingRollup).from_select(columns, aggregate.group_by(*group_by))
+    await db_session.execute(
+        statement.on_conflict_do_update(
+            index_elements=["device_id", "resolution", "bucket"],
+            set_={column: statement.excluded[column] for column in columns[3:]},
+        ),
+    )
+
+
+async def rollup_ping_samples(_: Context) -> None:
+    """Recompute the rollups of the last buckets of every resolution."""
+    now = datetime.datetime.now(tz=datetime.UTC)
+    async with session() as db_session:
+        for resolution, unit, source, width, lookback in ROLLUPS:
+            await _rollup(db_session, resolution, unit, source, _truncate(now - lookback, width))
+        await db_session.commit()
+
+
+def _pick_resolution(start: datetime.datetime, step: datetime.timedelta, now: datetime.datetime) -> str:
+    """The coarsest source with buckets no wider than ``step``, that still has data at ``start``."""
+    sources = [(RAW, datetime.timedelta(0))] + [(resolution, width) for resolution, _, _, width, _ in ROLLUPS]
+    candidates = [index for index, (_, width) in enumerate(sources) if width <= step]
+    index = candidates[-1]
+    while index < len(sources) - 1:
+        retention = _retention(sources[index][0])
+        if retention is None or start >= now - retention:
+            break
+        index += 1
+    return sources[index][0]
+
+
+async def latency_history(
+    db_session: AsyncSession,
+    device_id: str,
+    start: datetime.datetime,
+    end: datetime.datetime,
+    points: int,
+) -> LatencyHistory:
+    """Return the latency of a cpe between ``start`` and ``end`` in at most ``points`` evenly spaced points.
+
+    Points without samples are left out.
+    """
+    resolution = _pick_resolution(start, (end - start) / points, datetime.datetime.now(tz=datetime.UTC))
+    width = {resolution: width for resolution, _, _, width, _ in ROLLUPS}.get(resolution, datetime.timedelta(0))
+    step = max((end - start) / points, width, datetime.timedelta(seconds=1))
+
+    columns: dict[str, Any]
+    if resolution == RAW:
+        time = PingSample.time
+        columns = {
+            "samples": func.count(),
+            "lost": func.count() - func.count(PingSample.rtt),
+            "rtt_min": func.min(PingSample.rtt),
+            "rtt_max": func.max(PingSample.rtt),
+            "rtt_sum": func.coalesce(func.sum(PingSample.rtt), 0),
+        }
+        where = [PingSample.device_id == device_id]
+    else:
+        time = PingRollup.bucket
+        columns = {
+            "samples": func.sum(PingRollup.samples),
+            "lost": func.sum(PingRollup.lost),
+            "rtt_min": func.min(PingRollup.rtt_min),
+            "rtt_max": func.max(PingRollup.rtt_max),
+            "rtt_sum": func.sum(PingRollup.rtt_sum),
+        }
+        where = [PingRollup.device_id == device_id, PingRollup.resolution == resolution]
+
+    bucket = func.date_bin(literal(step, Interval()), time, literal(start)).label("bucket")
+    rows = await db_session.execute(
+        select(bucket, *(column.label(name) for name, column in columns.items()))
+        .where(*where, time >= start, time < end)
+        .group_by(bucket)
+        .order_by(bucket),
+    )
+    history = LatencyHistory(
+        device_id=device_id,
+        start=start,
+        end=end,
+        resolution=resolution,
+        step_seconds=step.total_seconds(),
+    )
+    for row in rows:
+        answered = row.samples - row.lost
+        history.points.append(
+            LatencyPoint(
+                time=row.bucket,
+                samples=row.samples,
+                loss=row.lost / row.samples if row.samples else 0.0,
+                rtt_min=row.rtt_min,
+                rtt_avg=row.rtt_sum / answered if answered else None,
+                rtt_max=row.rtt_max,
+            ),
+        )
+    return history
@@ -1,19 +1,23 @@
 from __future__ import annotations
 
+import datetime  # noqa: TCH003
 from typing import TYPE_CHECKING
 from uuid import UUID  # noqa: TCH003
 
 from litestar.contrib.sqlalchemy.base import AuditColumns, CommonTableAttributes, orm_registry
-from sqlalchemy import Boolean, ForeignKey, String
+from sqlalchemy import REAL, Boolean, DateTime, Float, ForeignKey, Integer, String
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import DeclarativeBase, Mapped, declared_attr, mapped_column, orm_insert_sentinel, relationship
 
+from app.lib import settings
+
 if TYPE_CHECKING:
     from app.domain.cpe_business_product.models import CPEBusinessProduct
     from app.domain.cpe_product_configuration.models import CPEProductConfiguration
     from app.domain.cpe_vendor.models import CPEVendor
     from app.domain.tscm.models import TSCMCheckResult
 
-__all__ = ["CPE"]
+__all__ = ["CPE", "PingRollup", "PingSample"]
 
 
 class CPEPrimaryKey:
@@ -38,6 +42,10 @@ class CPE(CPEBase):
     mgmt_ip: Mapped[str]
     sec_mgmt_ip: Mapped[str | None]
     online_status: Mapped[bool] = mapped_column(Boolean, default=False)
+    reachable_ip: Mapped[str | None] = mapped_column(String(length=255), nullable=True, default=None)
+    """The management address that answered the last ping."""
+    open_ports: Mapped[list[int] | None] = mapped_column(ARRAY(Integer), nullable=True, default=None)
+    """The ports that accepted a TCP connect in the last ping, see ``settings.ping.TCP_PORTS``."""
 
     # -----------
     # ORM Relationships
@@ -51,5 +59,61 @@ class CPE(CPEBase):
     product_configuration: Mapped[CPEProductConfiguration] = relationship(lazy="selectin")
     tscm_check_results: Mapped[list[TSCMCheckResult]] = relationship(lazy="noload")
 
+    @property
+    def management_ip(self) -> str:
+        """The address to connect to: the one that answered the last ping, otherwise the primary one."""
+        if self.reachable_ip in (self.mgmt_ip, self.sec_mgmt_ip):
+            return self.reachable_ip  # type: ignore[return-value]
+        return self.mgmt_ip
+
+    @property
+    def management_port_closed(self) -> bool:
+        """Whether the last ping found the management port closed, a cpe that was never probed counts as open."""
+        return self.open_ports is not None and settings.ping.MANAGEMENT_PORT not in self.open_ports
+
     def __repr__(self) -> str:
         return f"CPE ({self.device_id})"
+
+
+class TimeSeriesBase(CommonTableAttributes, DeclarativeBase):
+    """Base for the compact time-series tables: no surrogate keys and no audit columns."""
+
+    registry = orm_registry
+
+
+class PingSample(TimeSeriesBase):
+    """The outcome of pinging a cpe in a sweep, ``rtt`` is ``None`` when the cpe did not answer.
+
+    The table is partitioned by day on ``time``, see ``app.domain.cpe.latency`` for the
+    maintenance of the partitions.
+    """
+
+    __table_args__ = {"postgresql_partition_by": "RANGE (time)"}
+
+    device_id: Mapped[str] = mapped_column(String(length=255), primary_key=True)
+    time: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    rtt: Mapped[float | None] = mapped_column(REAL, nullable=True)
+    """Round trip time in milliseconds."""
+
+    def __repr__(self) -> str:
+        return f"PingSample ({self.device_id}, {self.time})"
+
+
+class PingRollup(TimeSeriesBase):
+    """Aggregate of the ping samples of a cpe in a bucket of one minute (``1m``), hour (``1h``) or day (``1d``).
+
+    The sum of the round trip times is stored instead of the mean, so rollups can be rolled
+    up again without losing precision.
+    """
+
+    device_id: Mapped[str] = mapped_column(String(length=255), primary_key=True)
+    resolution: Mapped[str] = mapped_column(String(length=2), primary_key=True)
+    bucket: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    samples: Mapped[int] = mapped_column(Integer)
+    lost: Mapped[int] = mapped_column(Integer)
+    rtt_min: Mapped[float | None] = mapped_column(REAL, nullable=True)
+    rtt_max: Mapped[float | None] = mapped_column(REAL, nullable=True)
+    rtt_sum: Mapped[float] = mapped_column(Float, default=0)
+
+    def __repr__(self) -> str:
+        return f"PingRollup ({self.device_id}, {self.resolution}, {self.bucket})"
@@ -0,0 +1,145 @@
+"""Parsing of the command output of readouts into structured data.
+
+Parsers are plain functions of the output of a command to a dict, registered per command and
+os with ``register_parser``. A command without a parser of its own is parsed with genie
+(pyats) when that is installed and ``settings.readout.PARSE_WITH_GENIE`` is on. genie is
+slow and CPU bound: the lightweight parsers in this module (or TextFSM templates wrapped in
+a parser) are preferred for the commands the readouts run on every device.
+
+Parsing runs in a pool of worker processes, so a bulk readout never blocks the event loop of
+a worker. The results are cached in Redis by os, command and the hash of the output: an output
+that was parsed before, on any worker, is not parsed again.
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+from functools import partial
+from typing import TYPE_CHECKING, Any
+
+from anyio import CapacityLimiter, create_task_group, to_process
+
+from app.lib import log, serialization, settings
+from app.lib.cache import redis
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    Parser = Callable[[str], dict[str, Any]]
+
+__all__ = ["get_parser", "parse_output", "parse_outputs", "register_parser"]
+
+
+logger = log.get_logger()
+
+ANY_OS = "*"
+
+_parsers: dict[tuple[str, str], Parser] = {}
+_limiter: CapacityLimiter | None = None
+
+
+def _normalize(command: str) -> str:
+    return " ".join(command.split())
+
+
+def register_parser(command: str, *oses: str) -> Callable[[Parser], Parser]:
+    """Register the decorated function as the parser of ``command`` on ``oses``, or on every os.
+
+    The parser runs in another process, so it has to be a module level function.
+    """
+
+    def decorator(parser: Parser) -> Parser:
+        for os in oses or (ANY_OS,):
+            _parsers[os, _normalize(command)] = parser
+        return parser
+
+    return decorator
+
+
+def genie_parse(os: str, command: str, output: str) -> dict[str, Any]:
+    from genie.conf.base import Device
+
+    device = Device("readout", os=os)
+    device.custom.setdefault("abstraction", {})["order"] = ["os"]
+    return device.parse(command, output=output)
+
+
+def get_parser(os: str, command: str) -> Parser | None:
+    """The parser of a command on an os, None when there is none."""
+    command = _normalize(command)
+    parser = _parsers.get((os, command)) or _parsers.get((ANY_OS, command))
+    if parser is None and settings.readout.PARSE_WITH_GENIE:
+        try:
+            import genie  # noqa: F401
+        except ImportError:
+            return None
+        return partial(genie_parse, os, command)
+    return parser
+
+
+def _cache_key(os: str, command: str, output: str) -> str:
+    digest = hashlib.sha256(output.encode()).hexdigest()
+    return f"{settings.app.slug}:parsed-output:{os}:{command.replace(' ', '_')}:{digest}"
+
+
+def _get_limiter() -> CapacityLimiter:
+    global _limiter  # noqa: PLW0603
+    if _limiter is None:
+        _limiter = CapacityLimiter(settings.readout.PARSE_PROCESSES)
+    return _limiter
+
+
+async def parse_output(os: str, command: str, output: str) -> dict[str, Any] | None:
+    """Parse the output of a command, None when the command has no parser."""
+    command = _normalize(command)
+    parser = get_parser(os, command)
+    if parser is None:
+        return None
+    key = _cache_key(os, command, output)
+    cached = await redis.get(key)
+    if cached is not None:
+        return serialization.from_json(cached)
+    parsed = await to_process.run_sync(parser, output, limiter=_get_limiter())
+    await redis.set(key, serialization.to_json(parsed), ex=settings.readout.PARSE_CACHE_TTL)
+    return parsed
+
+
+async def parse_outputs(os: str, outputs: dict[str, str]) -> dict[str, dict[str, Any]]:
+    """Parse the outputs of several commands at once, by command.
+
+    Commands without a parser, or whose output failed to parse, are left out.
+    """
+    parsed: dict[str, dict[str, Any]] = {}
+
+    async def parse(command: str, output: str) -> None:
+        try:
+            result = await parse_output(os, command, output)
+        except Exception as exc:  # noqa: BLE001
+            await logger.awarning("parsing command output failed", os=os, command=command, exc_info=exc)
+            return
+        if result is not None:
+            parsed[command] = result
+
+    async with create_task_group() as task_group:
+        for command, output in outputs.items():
+            task_group.start_soon(parse, command, output)
+    return parsed
+
+
+IP_INTERFACE_BRIEF = re.compile(
+    r"^(?P<interface>\S+)\s+(?P<ip_address>\S+)\s+(?P<interface_is_ok>YES|NO)\s+(?P<method>\S+)\s+"
+    r"(?P<status>.+?)\s+(?P<protocol>\S+)\s*$",
+)
+
+
+@register_parser("show ip interface brief", "ios", "iosxe")
+@register_parser("show ip int brief", "ios", "iosxe")
+def show_ip_interface_brief(output: str) -> dict[str, Any]:
+    """``show ip interface brief`` of Cisco, in the schema of its genie parser."""
+    interfaces = {}
+    for line in output.splitlines():
+        match = IP_INTERFACE_BRIEF.match(line.strip())
+        if match is None or match["interface"] == "Interface":
+            continue
+        interfaces[match["interface"]] = {key: value for key, value in match.groupdict().items() if key != "interface"}
+    return {"interface": interfaces}
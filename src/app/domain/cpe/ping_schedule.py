@@ -0,0 +1,117 @@
+"""Adaptive scheduling of the pings of the cpe's.
+
+Not every cpe is pinged every sweep. The time of the next probe of every cpe is kept in a
+Redis sorted set, a priority queue shared by every worker, and a sweep only pings the cpe's
+that are due. After a probe the next one is scheduled according to the state of the cpe:
+
+* a cpe whose online status changed in the last ``settings.ping.FLAP_WINDOW`` seconds is
+  probed every sweep, so it is known quickly when it comes back or drops again;
+* a stable online cpe is probed every ``settings.ping.STABLE_INTERVAL`` seconds;
+* a cpe that stays offline backs off exponentially, up to ``settings.ping.OFFLINE_MAX_INTERVAL``
+  seconds between probes.
+
+Cpe's without a schedule (new ones) are due right away.
+"""
+from __future__ import annotations
+
+import random
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING
+
+from app.lib import serialization, settings
+from app.lib.cache import prune_hash, prune_sorted_set, redis
+
+if TYPE_CHECKING:
+    from collections.abc import Container
+
+    from redis.asyncio import Redis
+
+__all__ = ["PingSchedule", "ProbeState", "next_interval"]
+
+
+@dataclass
+class ProbeState:
+    changed: float
+    """Epoch of the last change of the online status."""
+    backoff: int = 0
+    """Amount of probes without answer since the cpe is offline for longer than the flap window."""
+
+
+def next_interval(state: ProbeState, online: bool, now: float) -> float:
+    """Seconds until the next probe of a cpe in ``state``."""
+    if now - state.changed < settings.ping.FLAP_WINDOW:
+        return settings.ping.INTERVAL
+    if online:
+        return settings.ping.STABLE_INTERVAL
+    return min(settings.ping.OFFLINE_MAX_INTERVAL, settings.ping.INTERVAL * 2**state.backoff)
+
+
+class PingSchedule:
+    """The next probe times and probe states of the cpe's, stored in Redis."""
+
+    def __init__(self, client: Redis | None = None) -> None:
+        self.redis = client or redis
+        self.queue_key = f"{settings.app.slug}:ping-schedule"
+        self.state_key = f"{settings.app.slug}:ping-state"
+
+    async def due(self, device_ids: list[str], now: float) -> set[str]:
+        """Return the device_ids that are due for a probe at ``now``.
+
+        A probe scheduled less than half a sweep from now is due, so sweeps starting a bit
+        early do not skip it.
+        """
+        if not device_ids:
+            return set()
+        scores = await self.redis.zmscore(self.queue_key, device_ids)
+        horizon = now + settings.ping.INTERVAL / 2
+        return {
+            device_id for device_id, score in zip(device_ids, scores, strict=True) if score is None or score <= horizon
+        }
+
+    async def states(self, device_ids: list[str]) -> dict[str, ProbeState]:
+        if not device_ids:
+            return {}
+        values = await self.redis.hmget(self.state_key, device_ids)
+        return {
+            device_id: ProbeState(**serialization.from_json(value))
+            for device_id, value in zip(device_ids, values, strict=True)
+            if value is not None
+        }
+
+    async def reschedule(self, results: dict[str, tuple[bool, bool]], now: float) -> None:
+        """Schedule the next probe of the probed cpe's.
+
+        Args:
+            results: device_id to its online status before and after the probe.
+            now: epoch of the sweep.
+        """
+        if not results:
+            return
+        states = await self.states(list(results))
+        schedule: dict[str, float] = {}
+        for device_id, (was_online, online) in results.items():
+            state = states.get(device_id)
+            if was_online != online:
+                state = ProbeState(changed=now)
+            elif state is None:
+                # without history a cpe counts as stable
+                state = ProbeState(changed=now - settings.ping.FLAP_WINDOW)
+            if online:
+                state.backoff = 0
+            elif now - state.changed >= settings.ping.FLAP_WINDOW:
+                state.backoff += 1
+            states[device_id] = state
+            # a bit of jitter spreads cpe's that were scheduled together over the sweeps
+            schedule[device_id] = now + next_interval(state, online, now) * random.uniform(0.9, 1.1)  # noqa: S311
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(self.queue_key, schedule)
+            pipe.hset(
+                self.state_key,
+                mapping={key: serialization.to_json(asdict(state)) for key, state in states.items()},
+            )
+            await pipe.execute()
+
+    async def prune(self, device_ids: Container[str]) -> int:
+        """Drop the schedule and probe states of the cpe's that are not in ``device_ids``, the ones that were deleted."""
+        await prune_sorted_set(self.redis, self.queue_key, device_ids)
+        return await prune_hash(self.redis, self.state_key, device_ids)
@@ -0,0 +1,127 @@
+"""Reachability of the cpe's, shared through Redis.
+
+Every ping sweep publishes the state of the cpe's it probed into one Redis hash: the debounced
+online status, whether the last probe was answered and on which address, its round trip time,
+and when the cpe was last seen. TSCM, readouts and the api read the state from there instead
+of ``CPE.online_status``, so hot reads of device state do not touch the database.
+
+``ReachabilityCache`` is a read-through client with a small in-process cache on top of the
+hash: a state read from Redis is kept for ``settings.ping.REACHABILITY_CACHE_TTL`` seconds,
+including the absence of a state. A sweep runs at most once every ``settings.ping.INTERVAL``
+seconds, so a few seconds of staleness does not matter, and a burst of reads of the same cpe's
+costs one Redis round trip. Cpe's without a published state (not pinged yet) read as ``None``,
+callers fall back to the database then.
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING
+
+from app.lib import serialization, settings
+from app.lib.cache import prune_hash, redis
+
+if TYPE_CHECKING:
+    from collections.abc import Container
+
+    from redis.asyncio import Redis
+
+__all__ = ["Reachability", "ReachabilityCache", "reachability_cache"]
+
+
+@dataclass
+class Reachability:
+    online: bool
+    """The debounced online status, see ``app.domain.cpe.flap_detection``."""
+    answered: bool
+    """Whether the last probe got an answer."""
+    checked: float
+    """Epoch of the last probe."""
+    reachable_ip: str | None = None
+    """The address that answered the last probe."""
+    rtt: float | None = None
+    """Round trip time of the last probe in milliseconds."""
+    last_seen: float | None = None
+    """Epoch of the last answered probe."""
+
+
+class ReachabilityCache:
+    """The reachability of the cpe's in Redis, read through an in-process cache."""
+
+    def __init__(self, client: Redis | None = None, ttl: float | None = None) -> None:
+        self.redis = client or redis
+        self.key = f"{settings.app.slug}:ping-reachability"
+        self.ttl = settings.ping.REACHABILITY_CACHE_TTL if ttl is None else ttl
+        self._entries: dict[str, tuple[float, Reachability | None]] = {}
+
+    async def publish(self, states: dict[str, Reachability]) -> None:
+        """Publish the states of the cpe's probed by a sweep.
+
+        A cpe that did not answer keeps the ``last_seen`` of its published state.
+        """
+        if not states:
+            return
+        unseen = [device_id for device_id, state in states.items() if state.last_seen is None]
+        if unseen:
+            for device_id, value in zip(unseen, await self.redis.hmget(self.key, unseen), strict=True):
+                if value is not None:
+                    states[device_id].last_seen = serialization.from_json(value).get("last_seen")
+        await self.redis.hset(
+            self.key,
+            mapping={device_id: serialization.to_json(asdict(state)) for device_id, state in states.items()},
+        )
+        now = time.monotonic()
+        self._prune(now)
+        expires = now + self.ttl
+        for device_id, state in states.items():
+            self._entries[device_id] = (expires, state)
+
+    async def get(self, device_id: str) -> Reachability | None:
+        return (await self.get_many([device_id]))[device_id]
+
+    async def get_many(self, device_ids: list[str]) -> dict[str, Reachability | None]:
+        """The states of the cpe's, ``None`` for the cpe's without a published state."""
+        now = time.monotonic()
+        states: dict[str, Reachability | None] = {}
+        missing = []
+        for device_id in device_ids:
+            entry = self._entries.get(device_id)
+            if entry is not None and entry[0] > now:
+                states[device_id] = entry[1]
+            else:
+                missing.append(device_id)
+        if missing:
+            self._prune(now)
+            expires = now + self.ttl
+            for device_id, value in zip(missing, await self.redis.hmget(self.key, missing), strict=True):
+                state = Reachability(**serialization.from_json(value)) if value is not None else None
+                self._entries[device_id] = (expires, state)
+                states[device_id] = state
+        return states
+
+    async def online_status(self, device_id: str, default: bool) -> bool:
+        """The online status of a cpe, ``default`` (the stored status) when it has no published state."""
+        state = await self.get(device_id)
+        return default if state is None else state.online
+
+    async def prune(self, device_ids: Container[str]) -> int:
+        """Drop the states of the cpe's that are not in ``device_ids``, the ones that were deleted."""
+        self.invalidate()
+        return await prune_hash(self.redis, self.key, device_ids)
+
+    def invalidate(self, *device_ids: str) -> None:
+        """Drop cpe's from the in-process cache, all of them without arguments."""
+        if not device_ids:
+            self._entries.clear()
+        for device_id in device_ids:
+            self._entries.pop(device_id, None)
+
+    def _prune(self, now: float) -> None:
+        if len(self._entries) >= settings.ping.REACHABILITY_CACHE_SIZE:
+            self._entries = {key: entry for key, entry in self._entries.items() if entry[0] > now}
+        if len(self._entries) >= settings.ping.REACHABILITY_CACHE_SIZE:
+            self._entries.clear()
+
+
+reachability_cache = ReachabilityCache()
+"""The reachability cache of this process."""
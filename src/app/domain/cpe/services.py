@@ -2,19 +2,27 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING, Any, cast
 
-from sqlalchemy import select
+from sqlalchemy import Boolean, String, func, literal, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import load_only
 
 from app.domain.cpe_business_product.dependencies import provides_cpe_business_service
+from app.domain.cpe_business_product.models import CPEBusinessProduct
 from app.domain.cpe_product_configuration.dependencies import provides_product_config_service
+from app.domain.cpe_product_configuration.models import CPEProductConfiguration
 from app.domain.cpe_vendor.dependencies import provides_cpe_vendor_service
+from app.domain.cpe_vendor.models import CPEVendor
 from app.lib.repository import SQLAlchemyAsyncRepository
 from app.lib.service import SQLAlchemyAsyncRepositoryService
 
 from .models import CPE
 
 if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+    from sqlalchemy import Select
     from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.types import TypeEngine
 
 __all__ = ["CPEService", "CpeRepository"]
 
@@ -31,6 +39,159 @@ class CpeRepository(SQLAlchemyAsyncRepository[CPE]):
 
         return {result.mgmt_ip: {"device_id": result.device_id, "mgmt_ip": result.mgmt_ip} for result in db_data}
 
+    async def iter_ping_targets(self, batch_size: int) -> AsyncIterator[list[dict[str, Any]]]:
+        """Yield the ping targets in batches of ``batch_size``, keyset paged on device_id.
+
+        Every page is read through a server-side cursor, so no more than one batch is held in memory.
+        """
+        last_device_id: str | None = None
+        while True:
+            statement = (
+                select(
+                    CPE.device_id,
+                    CPE.mgmt_ip,
+                    CPE.sec_mgmt_ip,
+                    CPE.reachable_ip,
+                    CPE.online_status,
+                    CPE.open_ports,
+                )
+                .order_by(CPE.device_id)
+                .limit(batch_size)
+            )
+            if last_device_id is not None:
+                statement = statement.where(CPE.device_id > last_device_id)
+            result = await self.session.stream(statement.execution_options(yield_per=batch_size))
+            batch = [row._asdict() async for row in result]
+            if not batch:
+                return
+            yield batch
+            if len(batch) < batch_size:
+                return
+            last_device_id = batch[-1]["device_id"]
+
+    async def _update_column(
+        self,
+        column: str,
+        column_type: type[TypeEngine],
+        changes: dict[str, Any],
+        auto_commit: bool | None,
+    ) -> int:
+        """Set ``column`` of the given device_ids in a single ``UPDATE ... FROM unnest(...)`` statement.
+
+        Returns:
+            The amount of updated rows.
+        """
+        if not changes:
+            return 0
+        rows = (
+            func.unnest(
+                literal(list(changes), ARRAY(String)),
+                literal(list(changes.values()), ARRAY(column_type)),
+            )
+            .table_valued("device_id", column)
+            .render_derived(name="changes")
+        )
+        statement = (
+            update(CPE)
+            .where(CPE.device_id == rows.c.device_id)
+            .values({column: rows.c[column]})
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.session.execute(statement)
+        await self._flush_or_commit(auto_commit=auto_commit)
+        return result.rowcount
+
+    async def update_online_status(self, changes: dict[str, bool], auto_commit: bool | None = None) -> int:
+        """Set the online status of the given device_ids, returns the amount of updated rows."""
+        return await self._update_column("online_status", Boolean, changes, auto_commit)
+
+    async def update_reachable_ip(self, changes: dict[str, str], auto_commit: bool | None = None) -> int:
+        """Set the management address that answered the last ping of the given device_ids."""
+        return await self._update_column("reachable_ip", String, changes, auto_commit)
+
+    async def update_open_ports(self, changes: dict[str, list[int]], auto_commit: bool | None = None) -> int:
+        """Set the open ports of the given device_ids, as a bulk update by primary key.
+
+        Returns:
+            The amount of updated rows.
+        """
+        if not changes:
+            return 0
+        await self.session.execute(
+            update(CPE),
+            [{"device_id": device_id, "open_ports": open_ports} for device_id, open_ports in changes.items()],
+        )
+        await self._flush_or_commit(auto_commit=auto_commit)
+        return len(changes)
+
+    @staticmethod
+    def _where_product(
+        statement: Select,
+        vendor_name: str | None,
+        business_product_name: str | None,
+        model_name: str | None,
+    ) -> Select:
+        statement = statement.join(CPE.vendor).join(CPE.service).join(CPE.product_configuration)
+        if vendor_name:
+            statement = statement.where(CPEVendor.name == vendor_name)
+        if business_product_name:
+            statement = statement.where(CPEBusinessProduct.name == business_product_name)
+        if model_name and model_name != "All":
+            statement = statement.where(CPEProductConfiguration.cpe_model == model_name)
+        return statement.order_by(CPE.device_id)
+
+    async def get_device_ids(
+        self,
+        vendor_name: str | None = None,
+        business_product_name: str | None = None,
+        model_name: str | None = None,
+    ) -> list[str]:
+        """Device ids of the CPEs matching a vendor, business product and model. Omitted filters match all."""
+        statement = self._where_product(select(CPE.device_id), vendor_name, business_product_name, model_name)
+        return list(await self.session.scalars(statement))
+
+    async def get_device_models(
+        self,
+        vendor_name: str | None = None,
+        business_product_name: str | None = None,
+        model_name: str | None = None,
+    ) -> dict[str, str]:
+        """Same selection as `get_device_ids`, mapping every device_id to its CPE model."""
+        statement = self._where_product(
+            select(CPE.device_id, CPEProductConfiguration.cpe_model),
+            vendor_name,
+            business_product_name,
+            model_name,
+        )
+        return dict((await self.session.execute(statement)).tuples().all())
+
+    async def get_readout_targets(
+        self,
+        device_ids: list[str] | None = None,
+        vendor_name: str | None = None,
+        business_product_name: str | None = None,
+        model_name: str | None = None,
+    ) -> list[dict[str, Any]]:
+        """What a readout needs of the CPEs matching the filters: their addresses, os and vendor name."""
+        statement = self._where_product(
+            select(
+                CPE.device_id,
+                CPE.mgmt_ip,
+                CPE.sec_mgmt_ip,
+                CPE.reachable_ip,
+                CPE.online_status,
+                CPE.open_ports,
+                CPE.os,
+                CPEVendor.name.label("vendor"),
+            ),
+            vendor_name,
+            business_product_name,
+            model_name,
+        )
+        if device_ids is not None:
+            statement = statement.where(CPE.device_id.in_(device_ids))
+        return [row._asdict() for row in await self.session.execute(statement)]
+
 
 class CPEService(SQLAlchemyAsyncRepositoryService[CPE]):
     repository_type = CpeRepository
@@ -71,3 +232,40 @@ class CPEService(SQLAlchemyAsyncRepositoryService[CPE]):
 
     async def get_cpes_to_ping(self) -> dict[str, Any]:
         return await self.repository.get_cpes_to_ping()
+
+    def iter_ping_targets(self, batch_size: int) -> AsyncIterator[list[dict[str, Any]]]:
+        return self.repository.iter_ping_targets(batch_size)
+
+    async def update_online_status(self, changes: dict[str, bool], auto_commit: bool | None = None) -> int:
+        return await self.repository.update_online_status(changes, auto_commit=auto_commit)
+
+    async def update_reachable_ip(self, changes: dict[str, str], auto_commit: bool | None = None) -> int:
+        return await self.repository.update_reachable_ip(changes, auto_commit=auto_commit)
+
+    async def update_open_ports(self, changes: dict[str, list[int]], auto_commit: bool | None = None) -> int:
+        return await self.repository.update_open_ports(changes, auto_commit=auto_commit)
+
+    async def get_device_ids(
+        self,
+        vendor_name: str | None = None,
+        business_product_name: str | None = None,
+        model_name: str | None = None,
+    ) -> list[str]:
+        return await self.repository.get_device_ids(vendor_name, business_product_name, model_name)
+
+    async def get_device_models(
+        self,
+        vendor_name: str | None = None,
+        business_product_name: str | None = None,
+        model_name: str | None = None,
+    ) -> dict[str, str]:
+        return await self.repository.get_device_models(vendor_name, business_product_name, model_name)
+
+    async def get_readout_targets(
+        self,
+        device_ids: list[str] | None = None,
+        vendor_name: str | None = None,
+        business_product_name: str | None = None,
+        model_name: str | None = None,
+    ) -> list[dict[str, Any]]:
+        return await self.repository.get_readout_targets(device_ids, vendor_name, business_product_name, model_name)
@@ -3,21 +3,40 @@ from litestar_saq import CronJob
 from app.domain.system import tasks
 from app.lib import email
 
-from . import cpe
+from . import cpe, ssh_terminal, tscm
 
 # TASKS ###
 
 # All the domain tasks you want to add ##
 domain_system_tasks: list = []
-domain_cron_system_tasks: list = []
+domain_cron_system_tasks: list = [
+    CronJob(function=cpe.latency.maintain_ping_samples, unique=True, cron="0 * * * *", timeout=300),
+    CronJob(function=ssh_terminal.recording.prune_recordings, unique=True, cron="30 * * * *", timeout=300),
+    CronJob(function=cpe.business_logic_ping.prune_ping_state, unique=True, cron="15 * * * *", timeout=300),
+]
 
 
 domain_background_tasks: list = [
     cpe.business_logic.communicate_with_cpe,
     cpe.business_logic_ping._ping,
+    cpe.fleet_readout.fleet_readout,
+    cpe.fleet_readout.fleet_readout_chunk,
+    tscm.config_search.refresh_config_search_index,
+    tscm.sweep.tscm_check_sweep,
+    tscm.sweep.tscm_check_sweep_chunk,
+    tscm.fleet_run.tscm_fleet_run,
+    tscm.fleet_run.tscm_fleet_run_shard,
+    tscm.fleet_run.tscm_fleet_run_fan_in,
+    tscm.fleet_run.tscm_device_run,
+    tscm.digest.send_tscm_digest,
 ]
 domain_cron_background_tasks: list = [
     CronJob(function=cpe.business_logic_ping.ping_cpes, unique=True, cron="* * * * *", timeout=300),
+    CronJob(function=cpe.latency.rollup_ping_samples, unique=True, cron="*/5 * * * *", timeout=300),
+    CronJob(function=tscm.config_search.refresh_config_search_index, unique=True, cron="*/5 * * * *", timeout=600),
+    CronJob(function=cpe.fleet_readout.start_nightly_fleet_readout, unique=True, cron="0 0 * * *", timeout=60),
+    CronJob(function=tscm.fleet_run.start_nightly_tscm_fleet_run, unique=True, cron="0 2 * * *", timeout=60),
+    CronJob(function=tscm.fleet_run.resume_tscm_fleet_runs, unique=True, cron="*/10 * * * *", timeout=60),
 ]
 
 
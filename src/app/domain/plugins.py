@@ -1,10 +1,13 @@
+from typing import Any
+
 from litestar.contrib.pydantic import PydanticPlugin
 from litestar_aiosql import AiosqlConfig, AiosqlPlugin
 from litestar_saq import QueueConfig, SAQConfig, SAQPlugin
 from litestar_vite import ViteConfig, VitePlugin
 
+from app.domain.cpe.latency import maintain_ping_samples
 from app.domain.domain_tasks import background_tasks, cron_background_tasks, cron_system_tasks, system_tasks
-from app.lib import settings
+from app.lib import email, settings, ssh
 
 pydantic = PydanticPlugin(prefer_alias=True)
 aiosql = AiosqlPlugin(config=AiosqlConfig())
@@ -19,21 +22,29 @@ vite = VitePlugin(
 )
 
 
+async def on_background_worker_shutdown(ctx: Any) -> None:
+    """Close the pooled SMTP and SSH connections of the worker."""
+    await email.on_worker_shutdown(ctx)
+    await ssh.on_worker_shutdown(ctx)
+
+
 saq = SAQPlugin(
     config=SAQConfig(
         redis_url=settings.redis.URL,
         web_enabled=True,
-        worker_processes=1,
+        worker_processes=settings.worker.PROCESSES,
         queue_configs=[
             QueueConfig(
                 name="system-tasks",
                 tasks=system_tasks,
                 scheduled_tasks=cron_system_tasks,
+                startup=maintain_ping_samples,
             ),
             QueueConfig(
                 name="background-tasks",
                 tasks=background_tasks,
                 scheduled_tasks=cron_background_tasks,
+                shutdown=on_background_worker_shutdown,
             ),
         ],
     ),
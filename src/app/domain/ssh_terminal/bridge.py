@@ -0,0 +1,135 @@
+"""Bridge between the websocket of a browser terminal and an SSH session on a cpe.
+
+A bridge lives as long as its websocket and runs two pumps:
+
+* browser to cpe: every message of the browser is written to the session as a line of input,
+  waiting for the SSH channel to drain before the next one is read;
+* cpe to browser: the output of the session is read in blocks of up to
+  ``settings.readout.TERMINAL_READ_SIZE`` and coalesced: it is sent once
+  ``settings.readout.TERMINAL_FLUSH_SIZE`` characters are buffered, or
+  ``settings.readout.TERMINAL_FLUSH_INTERVAL`` seconds after the first unsent output. A ``show
+  run`` of a big config goes out in a few large messages instead of thousands of small ones.
+
+The output pump waits for every send to the browser before it reads on. A slow browser slows
+the reads from the session down, which fills the SSH flow control window of the channel and
+slows the cpe down, instead of buffering the output in the worker.
+
+Listeners (the recording and the broadcast to viewers of the session) get every line of input
+after it was written to the session, and every message of output after it was sent to the
+browser.
+
+When either side goes away (the browser disconnects, the session ends) the other pump is
+cancelled.
+"""
+from __future__ import annotations
+
+import time
+from typing import TYPE_CHECKING, Protocol
+
+from anyio import create_task_group, move_on_after
+from litestar.exceptions import WebSocketDisconnect
+
+from app.lib import log, settings
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable, Sequence
+
+    from anyio import CancelScope
+    from asyncssh import SSHReader, SSHWriter
+    from litestar import WebSocket
+
+__all__ = ["TerminalBridge", "TerminalListener"]
+
+
+logger = log.get_logger()
+
+
+class TerminalListener(Protocol):
+    async def input(self, data: str) -> None:
+        ...
+
+    async def output(self, data: str) -> None:
+        ...
+
+
+class TerminalBridge:
+    def __init__(
+        self,
+        socket: WebSocket,
+        stdin: SSHWriter[str],
+        stdout: SSHReader[str],
+        read_size: int | None = None,
+        flush_size: int | None = None,
+        flush_interval: float | None = None,
+        listeners: Sequence[TerminalListener] = (),
+    ) -> None:
+        self.socket = socket
+        self.stdin = stdin
+        self.stdout = stdout
+        self.read_size = read_size or settings.readout.TERMINAL_READ_SIZE
+        self.flush_size = flush_size or settings.readout.TERMINAL_FLUSH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else settings.readout.TERMINAL_FLUSH_INTERVAL
+        self.listeners = listeners
+        self.messages = 0
+        """Amount of messages sent to the browser."""
+
+    @staticmethod
+    def to_input(message: str) -> str:
+        """The input for the session of a message of the browser: a line, or a ctrl-c."""
+        return "\x03" if "x03" in message else f"{message}\r"
+
+    async def send(self, output: str) -> None:
+        await self.socket.send_text(output)
+        self.messages += 1
+        for listener in self.listeners:
+            await listener.output(output)
+
+    async def pump_input(self) -> None:
+        """Write the messages of the browser to the session, until the browser disconnects."""
+        try:
+            while True:
+                message = await self.socket.receive_text()
+                data = self.to_input(message)
+                self.stdin.write(data)
+                await self.stdin.drain()
+                for listener in self.listeners:
+                    await listener.input(data)
+        except WebSocketDisconnect:
+            return
+
+    async def pump_output(self) -> None:
+        """Send the coalesced output of the session to the browser, until the session ends."""
+        buffer: list[str] = []
+        buffered = 0
+        deadline: float | None = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            output = None
+            with move_on_after(timeout):
+                output = await self.stdout.read(self.read_size)
+            if output:
+                buffer.append(output)
+                buffered += len(output)
+                deadline = deadline or time.monotonic() + self.flush_interval
+            # a timeout (None), the end of the session ("") or a full buffer flush the buffer
+            due = deadline is not None and time.monotonic() >= deadline
+            if buffer and (not output or buffered >= self.flush_size or due):
+                try:
+                    await self.send("".join(buffer))
+                except WebSocketDisconnect:
+                    return
+                buffer, buffered, deadline = [], 0, None
+            if output == "":
+                return
+
+    @staticmethod
+    async def _run_then_cancel(pump: Callable[[], Awaitable[None]], scope: CancelScope) -> None:
+        await pump()
+        scope.cancel()
+
+    async def run(self) -> None:
+        """Run both pumps until one of the sides goes away."""
+        async with create_task_group() as task_group:
+            task_group.start_soon(self._run_then_cancel, self.pump_input, task_group.cancel_scope)
+            task_group.start_soon(self._run_then_cancel, self.pump_output, task_group.cancel_scope)
+        await logger.ainfo("terminal session ended", messages=self.messages)
@@ -1,19 +1,34 @@
-"""CPE Business Service Controllers."""
+"""SSH Web Terminal Controllers."""
 from __future__ import annotations
 
-from io import StringIO
+from contextlib import AsyncExitStack
+from typing import TYPE_CHECKING, Any
+from uuid import uuid4
 
 import asyncssh
-from litestar import Controller, WebSocket
+from advanced_alchemy.exceptions import NotFoundError
+from anyio import fail_after, to_thread
+from litestar import Controller, WebSocket, get, websocket
 from litestar.di import Provide
-from litestar.handlers.websocket_handlers import websocket_listener
+from litestar.exceptions import WebSocketDisconnect
+from litestar.params import Parameter
+from litestar.response import Stream
+from litestar.status_codes import WS_1013_TRY_AGAIN_LATER
 
 from app.domain import urls
+from app.domain.accounts.guards import requires_superuser
 from app.domain.cpe.dependencies import provides_cpe_service
-from app.lib import log
+from app.domain.ssh_terminal.bridge import TerminalBridge
+from app.domain.ssh_terminal.recording import SessionRecorder, recording_path, replay_recording
+from app.domain.ssh_terminal.sessions import SessionBroadcast, live_sessions, watch_session
+from app.lib import log, settings
+from app.lib.ssh import ssh_connection
+
+if TYPE_CHECKING:
+    from app.domain.cpe.services import CPEService
+    from app.domain.ssh_terminal.bridge import TerminalListener
 
 __all__ = ["SshWebTerminalController"]
-import asyncio
 
 logger = log.get_logger()
 
@@ -24,46 +39,102 @@ class SshWebTerminalController(Controller):
     tags = ["SSH Web Terminal Controller"]
     dependencies = {"cpe_service": Provide(provides_cpe_service)}
 
-    @websocket_listener(
+    @websocket(
         path=urls.SSH_WEB_TERMINAL,
     )
-    async def ssh_web_terminal(self, data: str, socket: WebSocket) -> str:
-        # """ this is "a testing method, not for use now. but exploring options on what i want ""
+    async def ssh_web_terminal(
+        self,
+        socket: WebSocket,
+        cpe_service: CPEService,
+        device_id: str = Parameter(title="Device ID", description="The cpe to open a terminal session on."),
+    ) -> None:
+        """Bridge the websocket to an SSH session on the cpe for as long as the websocket is open.
 
-        async with asyncssh.connect(
-            "10.1.1.142",
-            username="lagen008",
-            password="lagen008",
-            known_hosts=None,
-            connect_timeout=10,
-        ) as conn:
-            output = StringIO()
-            (sshWriter, sshReader, sshExReader) = await conn.open_session(
-                term_type="vt100",
-            )  # vt100 for cisco and huawi?
-            ssh_task = asyncio.create_task(sshReader.read(1024))
-            sshex_task = asyncio.create_task(sshExReader.read(1024))
-            ws_task = asyncio.create_task(socket.receive_data(mode="text"))
+        The session is broadcast to its viewers and, when enabled, recorded. Its id is sent in the
+        ``x-terminal-session`` header of the handshake. A session that gets no SSH connection to the
+        cpe within ``settings.readout.TERMINAL_CONNECT_TIMEOUT`` is closed with an error.
+        """
+        # the management address that answered the last ping
+        host = (await cpe_service.get(device_id)).management_ip
+        connection = ssh_connection(host)
 
-            sshWriter.writelines(["term len 0\n"])
-            while True:
-                done, pending = await asyncio.wait([ws_task, ssh_task, sshex_task], return_when=asyncio.FIRST_COMPLETED)
+        session_id = uuid4().hex
+        await socket.accept(headers={"x-terminal-session": session_id})
+        async with AsyncExitStack() as stack:
+            try:
+                with fail_after(settings.readout.TERMINAL_CONNECT_TIMEOUT):
+                    conn = await stack.enter_async_context(connection)
+            except TimeoutError:
+                await logger.awarning("no ssh connection for the web terminal", device_id=device_id, host=host)
+                reason = f"No SSH connection to {host}: all its connections are in use or it does not answer"
+                await socket.send_text(f"{reason}\r\n")
+                await socket.close(code=WS_1013_TRY_AGAIN_LATER, reason=reason)
+                return
+            listeners: list[TerminalListener] = [
+                await stack.enter_async_context(SessionBroadcast(session_id, host, device_id)),
+            ]
+            if settings.readout.TERMINAL_RECORDING:
+                listeners.append(await stack.enter_async_context(SessionRecorder(session_id, title=host)))
+            process = await stack.enter_async_context(
+                conn.create_process(
+                    term_type="vt100",  # vt100 for cisco and huawei
+                    stderr=asyncssh.STDOUT,
+                    encoding="utf-8",
+                    errors="replace",
+                ),
+            )
+            process.stdin.write("term len 0\n")
+            await TerminalBridge(socket, process.stdin, process.stdout, listeners=listeners).run()
+        if socket.connection_state != "disconnect":
+            await socket.close()
 
-                if ws_task in done:
-                    msg = ws_task.result()
-                    if "x03" in msg:
-                        msg = "\x03"
-                    else:
-                        msg += "\r"
-                    sshWriter.writelines([msg])
-                    await sshWriter.drain()
-                    ws_task = asyncio.create_task(socket.receive_data(mode="text"))
+    @get(
+        operation_id="ListTerminalSessions",
+        name="terminal:sessions",
+        summary="List live web terminal sessions",
+        cache_control=None,
+        description="The running web terminal sessions that can be watched.",
+        path=urls.SSH_WEB_TERMINAL_SESSIONS,
+        guards=[requires_superuser],
+    )
+    async def list_sessions(self) -> list[dict[str, Any]]:
+        """List live sessions."""
+        return await live_sessions()
 
-                if ssh_task in done:
-                    data = ssh_task.result()
-                    await socket.send_data(data)
-                    ssh_task = asyncio.create_task(sshReader.read(1024))
-                if sshex_task in done:
-                    data = sshex_task.result()
-                    await socket.send_data(data)
-                    ssh_task = asyncio.create_task(sshExReader.read(1024))
+    @websocket(
+        path=urls.SSH_WEB_TERMINAL_WATCH,
+        guards=[requires_superuser],
+    )
+    async def watch_terminal_session(
+        self,
+        socket: WebSocket,
+        session_id: str = Parameter(title="Session ID", description="The live session to watch."),
+    ) -> None:
+        """Stream the output of a live session to a read-only viewer, until the session ends."""
+        await socket.accept()
+        try:
+            async for output in watch_session(session_id):
+                await socket.send_text(output)
+        except WebSocketDisconnect:
+            return
+        await socket.close()
+
+    @get(
+        operation_id="ReplayTerminalSession",
+        name="terminal:recording",
+        summary="Replay a recorded web terminal session",
+        cache_control=None,
+        description="Stream the asciicast v2 recording of a web terminal session.",
+        path=urls.SSH_WEB_TERMINAL_RECORDING,
+        guards=[requires_superuser],
+    )
+    async def replay_session(
+        self,
+        session_id: str = Parameter(title="Session ID", description="The session to replay."),
+    ) -> Stream:
+        """Replay a recording."""
+        path = recording_path(session_id)
+        if path is None or not await to_thread.run_sync(path.exists):
+            msg = f"No recording found of session {session_id}"
+            raise NotFoundError(msg)
+        return Stream(replay_recording(path), media_type="application/x-asciicast")
@@ -0,0 +1,175 @@
+"""Recordings of the web terminal sessions.
+
+A session is recorded as an asciicast v2 stream (https://docs.asciinema.org/manual/asciicast/v2/):
+a JSON header line, followed by one ``[seconds, "o", output]`` line per output message of the
+session (and ``"i"`` lines for the input when ``settings.readout.TERMINAL_RECORD_INPUT`` is
+on). The stream is zstd compressed into ``{session_id}.cast.zst`` in
+``settings.readout.TERMINAL_RECORDING_DIR``.
+
+The bridge only appends events to an unbounded in-memory stream. A writer task drains it in
+batches and compresses and writes every batch in a worker thread, so a slow disk never stalls
+the terminal. Every batch is flushed as a complete zstd block: a recording can be replayed up
+to its last batch while its session is still running.
+
+Recordings older than ``settings.readout.TERMINAL_RECORDING_RETENTION_DAYS`` are deleted by the
+``prune_recordings`` cron.
+"""
+from __future__ import annotations
+
+import datetime
+import math
+import re
+import time
+from typing import TYPE_CHECKING, Any, Self
+
+import zstandard
+from anyio import CancelScope, EndOfStream, WouldBlock, create_memory_object_stream, create_task_group, to_thread
+
+from app.lib import log, serialization, settings
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+    from pathlib import Path
+    from types import TracebackType
+    from typing import BinaryIO
+
+    from anyio.abc import TaskGroup
+    from saq.types import Context
+
+__all__ = ["SessionRecorder", "prune_recordings", "recording_path", "replay_recording"]
+
+logger = log.get_logger()
+
+
+SESSION_ID = re.compile(r"[0-9a-f]{32}")
+
+
+def recording_path(session_id: str) -> Path | None:
+    """The path of the recording of a session, None for a session_id that can not be one."""
+    if not SESSION_ID.fullmatch(session_id):
+        return None
+    return settings.readout.TERMINAL_RECORDING_DIR / f"{session_id}.cast.zst"
+
+
+class SessionRecorder:
+    """Append-only, compressed recorder of one terminal session.
+
+    Use it as an async context manager: entering creates the recording and starts the writer
+    task, exiting writes the remaining events and closes the recording.
+    """
+
+    def __init__(self, session_id: str, title: str = "", width: int = 80, height: int = 24) -> None:
+        self.path = recording_path(session_id)
+        if self.path is None:
+            msg = f"Invalid session id {session_id}"
+            raise ValueError(msg)
+        self.header = {
+            "version": 2,
+            "width": width,
+            "height": height,
+            "timestamp": int(time.time()),
+            "title": title,
+            "env": {"TERM": "vt100"},
+        }
+        self._started = time.monotonic()
+        self._send, self._receive = create_memory_object_stream[tuple[float, str, str]](max_buffer_size=math.inf)
+        self._task_group: TaskGroup | None = None
+
+    def record(self, kind: str, data: str) -> None:
+        """Append an event, never blocks."""
+        self._send.send_nowait((round(time.monotonic() - self._started, 6), kind, data))
+
+    async def input(self, data: str) -> None:
+        if settings.readout.TERMINAL_RECORD_INPUT:
+            self.record("i", data)
+
+    async def output(self, data: str) -> None:
+        self.record("o", data)
+
+    def _open(self) -> tuple[BinaryIO, Any]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)  # type: ignore[union-attr]
+        file = self.path.open("wb")  # type: ignore[union-attr]
+        writer = zstandard.ZstdCompressor(level=settings.readout.TERMINAL_RECORDING_LEVEL).stream_writer(file)
+        writer.write(serialization.to_json(self.header) + b"\n")
+        return file, writer
+
+    @staticmethod
+    def _write(writer: Any, events: list[tuple[float, str, str]]) -> None:
+        writer.write(b"".join(serialization.to_json(list(event)) + b"\n" for event in events))
+        writer.flush(zstandard.FLUSH_BLOCK)
+
+    @staticmethod
+    def _close(file: BinaryIO, writer: Any) -> None:
+        writer.flush(zstandard.FLUSH_FRAME)
+        file.close()
+
+    def _queued(self) -> list[tuple[float, str, str]]:
+        events = []
+        while True:
+            try:
+                events.append(self._receive.receive_nowait())
+            except (WouldBlock, EndOfStream):
+                return events
+
+    async def _run(self, file: BinaryIO, writer: Any) -> None:
+        try:
+            async for event in self._receive:
+                await to_thread.run_sync(self._write, writer, [event, *self._queued()])
+        finally:
+            # also when the session ended with an error and the writer task is cancelled, the
+            # events still queued are written and the recording is closed as a complete frame
+            with CancelScope(shield=True):
+                if events := self._queued():
+                    await to_thread.run_sync(self._write, writer, events)
+                self._receive.close()
+                await to_thread.run_sync(self._close, file, writer)
+
+    async def __aenter__(self) -> Self:
+        file, writer = await to_thread.run_sync(self._open)
+        self._task_group = create_task_group()
+        await self._task_group.__aenter__()
+        self._task_group.start_soon(self._run, file, writer)
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> bool | None:
+        # ends the writer task after it wrote the events that are still queued, the error of the
+        # session is not passed on: it would cancel the writer and be wrapped in an exception group
+        self._send.close()
+        await self._task_group.__aexit__(None, None, None)  # type: ignore[union-attr]
+        return None
+
+
+async def replay_recording(path: Path, chunk_size: int | None = None) -> AsyncIterator[bytes]:
+    """Yield the decompressed asciicast of a recording in chunks, reading and decompressing in a worker thread."""
+    chunk_size = chunk_size or settings.readout.TERMINAL_REPLAY_CHUNK_SIZE
+    file = await to_thread.run_sync(path.open, "rb")
+    try:
+        reader = zstandard.ZstdDecompressor().stream_reader(file)
+        while chunk := await to_thread.run_sync(reader.read, chunk_size):
+            yield chunk
+    finally:
+        await to_thread.run_sync(file.close)
+
+
+def _prune(directory: Path, before: float) -> int:
+    pruned = 0
+    for path in directory.glob("*.cast.zst"):
+        if path.stat().st_mtime < before:
+            path.unlink(missing_ok=True)
+            pruned += 1
+    return pruned
+
+
+async def prune_recordings(_: Context) -> None:
+    """Delete the recordings that were last written before the retention period."""
+    directory = settings.readout.TERMINAL_RECORDING_DIR
+    if not directory.is_dir():
+        return
+    retention = datetime.timedelta(days=settings.readout.TERMINAL_RECORDING_RETENTION_DAYS)
+    pruned = await to_thread.run_sync(_prune, directory, time.time() - retention.total_seconds())
+    await logger.ainfo("pruned terminal recordings", pruned=pruned)
@@ -0,0 +1,104 @@
+"""Live web terminal sessions and their read-only viewers.
+
+The bridge of a session publishes every message it sends to the browser on a Redis channel of
+the session, and an empty message when the session ends. Viewers subscribe to that channel,
+from any web worker: a session has one SSH session to the cpe however many people watch it.
+
+Running sessions are listed in a sorted set scored by the time they expire, each with a key
+holding its description. Both are refreshed on the input and output of the session, so a
+session of a worker that died drops from the list after ``settings.readout.TERMINAL_SESSION_TTL``.
+"""
+from __future__ import annotations
+
+import time
+from typing import TYPE_CHECKING, Any, Self
+
+from app.lib import serialization, settings
+from app.lib.cache import redis
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator
+    from types import TracebackType
+
+__all__ = ["SessionBroadcast", "live_sessions", "watch_session"]
+
+
+def _channel(session_id: str) -> str:
+    return f"{settings.app.slug}:terminal-session:{session_id}"
+
+
+def _session_key(session_id: str) -> str:
+    return f"{settings.app.slug}:terminal-session:{session_id}:meta"
+
+
+def _index_key() -> str:
+    return f"{settings.app.slug}:terminal-sessions"
+
+
+class SessionBroadcast:
+    """Publisher of the output of a live session, use it as an async context manager around the session."""
+
+    def __init__(self, session_id: str, host: str, device_id: str | None = None) -> None:
+        self.session_id = session_id
+        self.meta = {"session_id": session_id, "host": host, "device_id": device_id, "started": time.time()}
+        self._payload = serialization.to_json(self.meta)
+
+    async def _touch(self, message: str | None = None) -> None:
+        ttl = settings.readout.TERMINAL_SESSION_TTL
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.set(_session_key(self.session_id), self._payload, ex=ttl)
+            pipe.zadd(_index_key(), {self.session_id: time.time() + ttl})
+            if message is not None:
+                pipe.publish(_channel(self.session_id), message)
+            await pipe.execute()
+
+    async def input(self, data: str) -> None:
+        await self._touch()
+
+    async def output(self, data: str) -> None:
+        await self._touch(data)
+
+    async def __aenter__(self) -> Self:
+        await self._touch()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.zrem(_index_key(), self.session_id)
+            pipe.delete(_session_key(self.session_id))
+            pipe.publish(_channel(self.session_id), "")
+            await pipe.execute()
+
+
+async def live_sessions() -> list[dict[str, Any]]:
+    """The descriptions of the running sessions, oldest first."""
+    await redis.zremrangebyscore(_index_key(), "-inf", time.time())
+    session_ids = await redis.zrange(_index_key(), 0, -1)
+    if not session_ids:
+        return []
+    payloads = await redis.mget([_session_key(session_id.decode()) for session_id in session_ids])
+    sessions = [serialization.from_json(payload) for payload in payloads if payload is not None]
+    return sorted(sessions, key=lambda session: session["started"])
+
+
+async def watch_session(session_id: str) -> AsyncGenerator[str, None]:
+    """Yield the output of a live session from now on, until it ends.
+
+    Ends right away for a session that is not running.
+    """
+    async with redis.pubsub() as pubsub:
+        # subscribe before checking the session so its end can not fall in between
+        await pubsub.subscribe(_channel(session_id))
+        if not await redis.exists(_session_key(session_id)):
+            return
+        async for message in pubsub.listen():
+            if message["type"] != "message":
+                continue
+            if not message["data"]:
+                return
+            yield message["data"].decode()
@@ -1,3 +1,29 @@
-from . import business_logic, controllers, dependencies, dtos, models, services
+from . import (
+    business_logic,
+    config_search,
+    configstore,
+    controllers,
+    dependencies,
+    digest,
+    dry_run,
+    dtos,
+    fleet_run,
+    models,
+    services,
+    sweep,
+)
 
-__all__ = ["controllers", "dependencies", "dtos", "models", "services", "business_logic"]
+__all__ = [
+    "controllers",
+    "dependencies",
+    "dtos",
+    "models",
+    "services",
+    "business_logic",
+    "config_search",
+    "configstore",
+    "digest",
+    "dry_run",
+    "fleet_run",
+    "sweep",
+]
@@ -3,13 +3,16 @@ from __future__ import annotations
 import time
 from dataclasses import asdict
 from typing import TYPE_CHECKING, Any
+from uuid import uuid4
 
 from anyio import Path, create_task_group
 
 from app.domain.cpe.dependencies import provides_cpe_service
+from app.domain.cpe.reachability import reachability_cache
 from app.domain.tscm.dependencies import provides_tscm_check_results_service, provides_tscm_service
+from app.domain.tscm.digest import enqueue_digest, store_email_docs
 from app.domain.tscm.tscm import CpeTscmCheck, TSCMEmailDoc, TscmExportReport
-from app.lib import log
+from app.lib import log, settings
 from app.lib.data_exporter import ElasticSearchRepository
 from app.lib.db.base import session
 
@@ -41,10 +44,6 @@ async def perform_tscm_check(
     selected_check: str | None = None,
     test_run: bool = False,
 ) -> list[TSCMCheck]:
-    from app.domain.plugins import saq
-
-    queue = saq.get_queue("background-tasks")
-
     db = session()
     async with db as db_session:
         cpe_service = await anext(provides_cpe_service(db_session=db_session))
@@ -55,6 +54,7 @@ async def perform_tscm_check(
         elasticsearch_repo = ElasticSearchRepository(test_run=test_run)
 
         cpe = await cpe_service.get(device_id)
+        online_status = await reachability_cache.online_status(device_id, cpe.online_status)
 
         tscm_checks = await tscm_service.vendor_product_checks(
             cpe.vendor.name,
@@ -68,7 +68,7 @@ async def perform_tscm_check(
 
         time.time()
         async with create_task_group() as task_group:
-            dir_path = Path("/home/donnyio/git/configstore/kpnvpn")
+            dir_path = Path(settings.tscm.CONFIG_DIR)
             async for path in dir_path.iterdir():
                 logger.info("doing work on %s", path)
                 if await path.is_file():
@@ -79,7 +79,7 @@ async def perform_tscm_check(
                         tscm_checks,
                         provided_config,
                         device_id,
-                        cpe.online_status,
+                        online_status,
                         cpe.vendor.name,
                         cpe.service.name,
                         export_report,
@@ -90,15 +90,9 @@ async def perform_tscm_check(
         tscm_export_results = export_report.results()
         await export_to_elastic(tscm_export_results, elasticsearch_repo)
 
-        await queue.enqueue(
-            "send_email",
-            subject="test",
-            to=["test@test.nl", "sjaakie@sjaakie.nl"],
-            html="",
-            timeout=60,
-            template_body=email_results,
-            template_name="tscm_email_template.html",
-        )
+        digest_id = uuid4().hex
+        await store_email_docs(digest_id, email_results)
+        await enqueue_digest(digest_id, subject=f"TSCM report {device_id}")
 
 
 async def process_file(
@@ -122,14 +116,12 @@ async def process_file(
         report=report,
     )
 
-    if not tscm_check.config_age_compliant(config_age=2):
-        # process results
-        email_results.append(tscm_check.get_email_results())
-
-    if not tscm_check.online_status:
-        tscm_check.offline_compliant_not_compliant(latest_compliancy)
-    else:
-        tscm_check.online_compliant_not_compliant()
+    if tscm_check.config_age_compliant(config_age=2):
+        if not tscm_check.online_status:
+            tscm_check.offline_compliant_not_compliant(latest_compliancy)
+        else:
+            tscm_check.online_compliant_not_compliant()
 
-    # process results
-    email_results.append(tscm_check.get_email_results())
+    # process results, once per device
+    if not tscm_check.is_compliant:
+        email_results.append(tscm_check.get_email_results())
@@ -0,0 +1,114 @@
+"""Fleet wide config search backed by a trigram index over the config store."""
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING
+
+from anyio import to_thread
+
+from app.domain.tscm.configstore import ConfigStore
+from app.lib import log, settings
+from app.lib.trigram import TrigramIndex, TrigramMatch
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from saq.types import Context
+
+__all__ = ["ConfigSearch", "refresh_config_search_index"]
+
+
+logger = log.get_logger()
+
+
+class ConfigSearch:
+    """Keeps a trigram index of the config store in sync and searches it.
+
+    The index is shared by everything in the process and persisted to disk, so a restart
+    (or another process) only has to index the configs that changed in the meantime.
+    """
+
+    _index: TrigramIndex | None = None
+    _index_mtime_ns: int = 0
+    _lock = threading.Lock()
+
+    def __init__(self, store: ConfigStore | None = None, index_path: Path | None = None) -> None:
+        self.store = store or ConfigStore()
+        self.index_path = index_path or settings.tscm.CONFIG_SEARCH_INDEX
+
+    def _load(self) -> TrigramIndex:
+        """Return the process wide index, reloading it when another process rewrote it on disk."""
+        cls = type(self)
+        try:
+            mtime_ns = self.index_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = 0
+        if cls._index is None or (mtime_ns and mtime_ns != cls._index_mtime_ns):
+            cls._index = TrigramIndex.load(self.index_path) if mtime_ns else TrigramIndex()
+            cls._index_mtime_ns = mtime_ns
+        return cls._index
+
+    def _refresh(self) -> tuple[int, int]:
+        with self._lock:
+            return self._refresh_locked()
+
+    def _refresh_locked(self) -> tuple[int, int]:
+        index = self._load()
+        current = dict(self.store.versions())
+        removed = [device_id for device_id in index.versions if device_id not in current]
+        changed = [device_id for device_id, version in current.items() if index.versions.get(device_id) != version]
+        for device_id in removed:
+            index.remove(device_id)
+        for device_id in changed:
+            config = self.store.read(device_id)
+            if config is None:
+                index.remove(device_id)
+                continue
+            index.add(device_id, config, current[device_id])
+        if changed or removed or not self.index_path.exists():
+            index.dump(self.index_path)
+            type(self)._index_mtime_ns = self.index_path.stat().st_mtime_ns
+        return len(changed), len(removed)
+
+    def _search(self, pattern: str, regex: bool, ignore_case: bool, limit: int) -> list[TrigramMatch]:
+        with self._lock:
+            index = self._load()
+            if not index and not self.index_path.exists():
+                # first search on a fresh install, build the index before searching it.
+                self._refresh_locked()
+            compiled, candidates = index.prepare(pattern, regex=regex, ignore_case=ignore_case)
+        # reading the candidate configs does not need the index, refreshes and other searches go on
+        return index.match(compiled, candidates, self.store.read, limit=limit)
+
+    async def refresh(self) -> tuple[int, int]:
+        """Index new and changed configs and drop the ones that are gone.
+
+        Returns:
+            amount of (indexed, removed) configs
+        """
+        return await to_thread.run_sync(self._refresh)
+
+    async def search(
+        self,
+        pattern: str,
+        regex: bool = False,
+        ignore_case: bool = False,
+        limit: int | None = None,
+    ) -> list[TrigramMatch]:
+        """Search the latest config of every device.
+
+        Raises:
+            re.error: ``pattern`` is not a valid regular expression.
+        """
+        return await to_thread.run_sync(
+            self._search,
+            pattern,
+            regex,
+            ignore_case,
+            limit or settings.tscm.CONFIG_SEARCH_MAX_RESULTS,
+        )
+
+
+async def refresh_config_search_index(_: Context) -> None:
+    indexed, removed = await ConfigSearch().refresh()
+    await logger.ainfo("config search index refreshed", indexed=indexed, removed=removed)
@@ -0,0 +1,91 @@
+"""Access to the directory holding the latest config of every device."""
+from __future__ import annotations
+
+import hashlib
+import time
+from contextlib import suppress
+from typing import TYPE_CHECKING
+from uuid import uuid4
+
+from app.lib import settings
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from pathlib import Path
+
+__all__ = ["ConfigStore"]
+
+
+class ConfigStore:
+    """The config store keeps one file per device, the file name is the device_id.
+
+    A readout that returns the stored config again touches a hidden ``.{device_id}.confirmed``
+    marker instead of the config, so the version of the config stays the same while its age
+    counts from that readout.
+    """
+
+    def __init__(self, config_dir: Path | None = None) -> None:
+        self.config_dir = config_dir or settings.tscm.CONFIG_DIR
+
+    def path_for(self, device_id: str) -> Path:
+        return self.config_dir / device_id
+
+    def _confirmed_path(self, device_id: str) -> Path:
+        return self.config_dir / f".{device_id}.confirmed"
+
+    def read(self, device_id: str) -> str | None:
+        """Return the latest config of a device, or None when there is no config stored."""
+        try:
+            return self.path_for(device_id).read_text(errors="replace")
+        except (FileNotFoundError, IsADirectoryError):
+            return None
+
+    def write(self, device_id: str, config: str) -> bool:
+        """Store the config of a readout, return whether it differs from the stored config.
+
+        A config with the same hash as the stored one is not rewritten, only the readout is
+        recorded: its age counts from the last readout that confirmed it. A changed config is
+        written to a hidden temporary file first and moved into place, so readers never see
+        half a config.
+        """
+        data = config.encode()
+        path = self.path_for(device_id)
+        try:
+            unchanged = hashlib.sha256(path.read_bytes()).digest() == hashlib.sha256(data).digest()
+        except FileNotFoundError:
+            unchanged = False
+        if unchanged:
+            self._confirmed_path(device_id).touch()
+            return False
+        self.config_dir.mkdir(parents=True, exist_ok=True)
+        temporary = self.config_dir / f".{device_id}.{uuid4().hex}.tmp"
+        temporary.write_bytes(data)
+        temporary.replace(path)
+        return True
+
+    def age_days(self, device_id: str) -> int | None:
+        """Return the age in whole days of the stored config of a device, or None when there is none.
+
+        The age counts from the last readout that wrote or confirmed the config.
+        """
+        try:
+            mtime = self.path_for(device_id).stat().st_mtime
+        except FileNotFoundError:
+            return None
+        with suppress(FileNotFoundError):
+            mtime = max(mtime, self._confirmed_path(device_id).stat().st_mtime)
+        return int((time.time() - mtime) // 86400)
+
+    def versions(self) -> Iterator[tuple[str, str]]:
+        """Yield ``(device_id, version)`` for every stored config.
+
+        The version is derived from the file stats and changes whenever the config is rewritten,
+        not when a readout only confirmed it.
+        """
+        if not self.config_dir.is_dir():
+            return
+        for path in self.config_dir.iterdir():
+            if path.name.startswith(".") or not path.is_file():
+                continue
+            stat = path.stat()
+            yield path.name, f"{stat.st_mtime_ns}:{stat.st_size}"
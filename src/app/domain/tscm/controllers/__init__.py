@@ -1,3 +1,6 @@
+from .config_search import ConfigSearchController
+from .fleet_run import TscmFleetRunController
+from .sweep import TscmSweepController
 from .tscm_controller import TscmController
 
-__all__ = ["TscmController"]
+__all__ = ["TscmController", "ConfigSearchController", "TscmSweepController", "TscmFleetRunController"]
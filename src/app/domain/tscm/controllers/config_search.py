@@ -0,0 +1,61 @@
+"""Config Search Controllers."""
+from __future__ import annotations
+
+import re
+
+from litestar import Controller, get
+from litestar.exceptions import ValidationException
+from litestar.pagination import OffsetPagination
+from litestar.params import Parameter
+
+from app.domain import urls
+from app.domain.tscm.config_search import ConfigSearch
+from app.domain.tscm.dtos import ConfigSearchMatch
+from app.lib import log, settings
+
+__all__ = ["ConfigSearchController"]
+
+
+logger = log.get_logger()
+
+
+class ConfigSearchController(Controller):
+    """Search the latest config of every device."""
+
+    tags = ["Tscm Security Checks"]
+
+    @get(
+        operation_id="SearchConfigs",
+        name="tscmchecks:config-search",
+        summary="Search device configs",
+        cache_control=None,
+        description="Find the devices (and line numbers) whose latest config matches a substring or regex.",
+        path=urls.TSCM_CONFIG_SEARCH,
+    )
+    async def search_configs(
+        self,
+        pattern: str = Parameter(
+            query="q",
+            title="Query",
+            description="Substring or regex to search for.",
+            min_length=1,
+            max_length=settings.tscm.CONFIG_SEARCH_MAX_PATTERN_LENGTH,
+        ),
+        regex: bool = Parameter(
+            default=False,
+            description="Treat the query as a regular expression, in RE2 syntax (no backreferences or lookarounds).",
+        ),
+        ignore_case: bool = Parameter(default=False, description="Match case insensitive."),
+    ) -> OffsetPagination[ConfigSearchMatch]:
+        """Search the config store."""
+        try:
+            matches = await ConfigSearch().search(pattern, regex=regex, ignore_case=ignore_case)
+        except re.error as exc:
+            raise ValidationException(detail=f"Invalid regular expression: {exc}") from exc
+        results = [ConfigSearchMatch(device_id=match.document_id, line_numbers=match.line_numbers) for match in matches]
+        return OffsetPagination[ConfigSearchMatch](
+            items=results,
+            total=len(results),
+            limit=len(results),
+            offset=0,
+        )
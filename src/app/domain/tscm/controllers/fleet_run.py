@@ -0,0 +1,91 @@
+"""TSCM Fleet Run Controllers."""
+from __future__ import annotations
+
+from advanced_alchemy.exceptions import NotFoundError
+from litestar import Controller, get, post
+from litestar.exceptions import ValidationException
+from litestar.params import Parameter
+
+from app.domain import urls
+from app.domain.tscm.fleet_run import FleetRun, get_fleet_run, list_fleet_runs, resume_fleet_run, start_fleet_run
+from app.lib import log
+
+__all__ = ["TscmFleetRunController"]
+
+
+logger = log.get_logger()
+
+
+class TscmFleetRunController(Controller):
+    """Start, follow and resume TSCM runs over the whole fleet."""
+
+    tags = ["Tscm Security Checks"]
+
+    @get(
+        operation_id="ListTscmFleetRuns",
+        name="tscmruns:list",
+        summary="List TSCM fleet runs",
+        cache_control=None,
+        description="Retrieve the most recent fleet runs and their progress.",
+        path=urls.TSCM_FLEET_RUNS,
+    )
+    async def list_fleet_runs(
+        self,
+        limit: int = Parameter(default=20, ge=1, le=100, description="Amount of runs to return."),
+    ) -> list[FleetRun]:
+        """List fleet runs."""
+        return await list_fleet_runs(limit)
+
+    @post(
+        operation_id="StartTscmFleetRun",
+        name="tscmruns:start",
+        summary="Start a TSCM fleet run",
+        cache_control=None,
+        description="Run the TSCM checks against every device. The devices are sharded over the workers, progress is checkpointed per shard.",
+        path=urls.TSCM_FLEET_RUNS,
+    )
+    async def start_fleet_run(
+        self,
+        test_run: bool = Parameter(default=False, description="Do not export the results."),
+    ) -> FleetRun:
+        """Start a fleet run."""
+        return await start_fleet_run(test_run=test_run)
+
+    @get(
+        operation_id="GetTscmFleetRun",
+        name="tscmruns:get",
+        summary="Retrieve the progress of a TSCM fleet run",
+        cache_control=None,
+        path=urls.TSCM_FLEET_RUN_DETAIL,
+    )
+    async def get_fleet_run(
+        self,
+        run_id: str = Parameter(title="Run ID", description="The fleet run to retrieve."),
+    ) -> FleetRun:
+        """Get a fleet run."""
+        run = await get_fleet_run(run_id)
+        if run is None:
+            msg = f"No TSCM fleet run found with id {run_id}"
+            raise NotFoundError(msg)
+        return run
+
+    @post(
+        operation_id="ResumeTscmFleetRun",
+        name="tscmruns:resume",
+        summary="Resume a TSCM fleet run",
+        cache_control=None,
+        description="Run the shards of an unfinished fleet run that have no checkpoint yet.",
+        path=urls.TSCM_FLEET_RUN_RESUME,
+    )
+    async def resume_fleet_run(
+        self,
+        run_id: str = Parameter(title="Run ID", description="The fleet run to resume."),
+    ) -> FleetRun:
+        """Resume a fleet run."""
+        run = await get_fleet_run(run_id)
+        if run is None:
+            msg = f"No TSCM fleet run found with id {run_id}"
+            raise NotFoundError(msg)
+        if not await resume_fleet_run(run_id):
+            raise ValidationException(detail=f"TSCM fleet run {run_id} is {run.status} and can not be resumed")
+        return run
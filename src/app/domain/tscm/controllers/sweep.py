@@ -0,0 +1,74 @@
+"""TSCM Check Sweep Controllers."""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from advanced_alchemy.exceptions import NotFoundError
+from litestar import Controller, WebSocket, post, websocket
+from litestar.di import Provide
+from litestar.params import Parameter
+
+from app.domain import urls
+from app.domain.tscm.dependencies import provides_tscm_service
+from app.domain.tscm.dtos import CheckSweep, CheckSweepRequest, CheckSweepRequestDTO
+from app.domain.tscm.sweep import start_check_sweep, sweep_events
+from app.lib import log
+
+__all__ = ["TscmSweepController"]
+
+
+if TYPE_CHECKING:
+    from litestar.dto import DTOData
+
+    from app.domain.tscm.services import TscmService
+
+
+logger = log.get_logger()
+
+
+class TscmSweepController(Controller):
+    """Run a single TSCM check over the whole fleet."""
+
+    tags = ["Tscm Security Checks"]
+    dependencies = {"tscm_service": Provide(provides_tscm_service)}
+
+    @post(
+        operation_id="SweepTscmCheck",
+        name="tscmchecks:sweep",
+        summary="Sweep a TSCM Check over the fleet",
+        cache_control=None,
+        description="Run one TSCM check against every eligible device. Results stream over the sweep websocket.",
+        path=urls.TSCM_CHECK_SWEEP,
+        dto=CheckSweepRequestDTO,
+        return_dto=None,
+    )
+    async def sweep_tscm_check(
+        self,
+        tscm_service: TscmService,
+        data: DTOData[CheckSweepRequest],
+    ) -> CheckSweep:
+        """Start a sweep of a TSCM check."""
+        obj = data.create_instance()
+        checks = [
+            check
+            for check in await tscm_service.list(key=obj.check_key)
+            if (not obj.vendor or check.vendor.name == obj.vendor)
+            and (not obj.business_service or check.service.name == obj.business_service)
+        ]
+        if not checks:
+            msg = f"No TSCM check found with key {obj.check_key}"
+            raise NotFoundError(msg)
+        sweep_id = await start_check_sweep(checks[0], obj.vendor, obj.business_service, obj.device_model)
+        return CheckSweep(sweep_id=sweep_id, check_key=obj.check_key)
+
+    @websocket(path=urls.TSCM_CHECK_SWEEP_STREAM)
+    async def stream_tscm_check_sweep(
+        self,
+        socket: WebSocket,
+        sweep_id: str = Parameter(title="Sweep ID", description="The sweep to stream the results of."),
+    ) -> None:
+        """Stream the partial results of a sweep as the chunks finish."""
+        await socket.accept()
+        async for event in sweep_events(sweep_id):
+            await socket.send_json(event)
+        await socket.close()
@@ -5,14 +5,19 @@ from typing import TYPE_CHECKING
 
 from litestar import Controller, delete, get, patch, post
 from litestar.di import Provide
+from litestar.exceptions import ValidationException
 from litestar.params import Dependency, Parameter
 
 from app.domain import urls
+from app.domain.cpe.dependencies import provides_cpe_service
 from app.domain.tscm.business_logic import perform_tscm_check
 from app.domain.tscm.dependencies import provides_tscm_service
+from app.domain.tscm.dry_run import DryRunReport, dry_run_check
 from app.domain.tscm.dtos import (
     CreateTscmCheck,
     CreateTscmCheckDTO,
+    DryRunTscmCheck,
+    DryRunTscmCheckDTO,
     PerformTscmCheckDTO,
     TscmDTO,
     UpdateTscmCheck,
@@ -27,6 +32,7 @@ if TYPE_CHECKING:
     from litestar.dto import DTOData
     from litestar.pagination import OffsetPagination
 
+    from app.domain.cpe.services import CPEService
     from app.domain.tscm.models import TSCMCheck
     from app.domain.tscm.services import TscmService
     from app.lib.dependencies import FilterTypes
@@ -35,11 +41,19 @@ if TYPE_CHECKING:
 logger = log.get_logger()
 
 
+def _raise_when_rejected(report: DryRunReport) -> None:
+    if not report.accepted:
+        raise ValidationException(detail=f"TSCM check {report.check_key} rejected: {report.rejection_reason}")
+
+
 class TscmController(Controller):
     """TSCM Controller."""
 
     tags = ["Tscm Security Checks"]
-    dependencies = {"tscm_service": Provide(provides_tscm_service)}
+    dependencies = {
+        "tscm_service": Provide(provides_tscm_service),
+        "cpe_service": Provide(provides_cpe_service),
+    }
     return_dto = TscmDTO
 
     @get(
@@ -86,10 +100,20 @@ class TscmController(Controller):
     async def create_cpe_business_product(
         self,
         tscm_service: TscmService,
+        cpe_service: CPEService,
         data: DTOData[CreateTscmCheck],
     ) -> TSCMCheck:
         """Create a new business product."""
         obj = data.create_instance()
+        report = await dry_run_check(
+            cpe_service,
+            obj.key,
+            obj.python_code,
+            obj.vendor,
+            obj.business_service,
+            obj.device_model,
+        )
+        _raise_when_rejected(report)
         db_obj = await tscm_service.create(obj.__dict__)
         return tscm_service.to_dto(db_obj)
 
@@ -104,10 +128,22 @@ class TscmController(Controller):
         self,
         data: DTOData[UpdateTscmCheck],
         tscm_service: TscmService,
+        cpe_service: CPEService,
         tscm_check_id: str = Parameter(title="product id", description="The business product to update"),
     ) -> TSCMCheck:
         """Update a TSCM check"""
         obj = data.create_instance()
+        if obj.python_code:
+            current = await tscm_service.get(tscm_check_id)
+            report = await dry_run_check(
+                cpe_service,
+                obj.key or current.key,
+                obj.python_code,
+                obj.vendor or current.vendor.name,
+                obj.business_service or current.service.name,
+                obj.device_model or current.device_model,
+            )
+            _raise_when_rejected(report)
         db_obj = await tscm_service.update(item_id=tscm_check_id, data=obj.__dict__)
         return tscm_service.to_dto(db_obj)
 
@@ -131,6 +167,33 @@ class TscmController(Controller):
         """Delete a tscm check from the system."""
         _ = await tscm_service.delete(tscm_check_id)
 
+    @post(
+        operation_id="DryRunTscmCheck",
+        name="tscmchecks:dry-run",
+        summary="Dry run a TSCM Check",
+        cache_control=None,
+        description="Compile a check and run it against a stratified sample of configs, "
+        "reporting pass/fail counts, exceptions, runtimes and whether it would be accepted.",
+        path=urls.TSCM_DRY_RUN,
+        dto=DryRunTscmCheckDTO,
+        return_dto=None,
+    )
+    async def dry_run_tscm_check(
+        self,
+        cpe_service: CPEService,
+        data: DTOData[DryRunTscmCheck],
+    ) -> DryRunReport:
+        """Dry run a TSCM check"""
+        obj = data.create_instance()
+        return await dry_run_check(
+            cpe_service,
+            obj.key,
+            obj.python_code,
+            obj.vendor,
+            obj.business_service,
+            obj.device_model,
+        )
+
     @post(
         operation_id="PerformTscmCheck",
         name="tscmchecks:check",
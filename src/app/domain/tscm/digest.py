@@ -0,0 +1,92 @@
+"""TSCM digest emails.
+
+The email results of a run are stored in Redis, one entry per device so a device is never
+reported twice. The job that sends the digest only gets the id of the stored results, which
+keeps the SAQ payloads small. The whole run is mailed as one digest per group of recipients,
+see ``settings.tscm.DIGEST_RECIPIENTS``.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import asdict
+from typing import TYPE_CHECKING, Any
+
+from fastapi_mail import MessageSchema, MessageType
+
+from app.lib import email, log, serialization, settings
+from app.lib.cache import redis
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from saq.types import Context
+
+    from app.domain.tscm.tscm import TSCMEmailDoc
+
+__all__ = ["build_digests", "enqueue_digest", "send_tscm_digest", "store_email_docs"]
+
+
+logger = log.get_logger()
+
+
+def _docs_key(digest_id: str) -> str:
+    return f"{settings.app.slug}:tscm-digest:{digest_id}"
+
+
+async def store_email_docs(digest_id: str, docs: Iterable[TSCMEmailDoc]) -> None:
+    """Store the email results of devices for a digest, the last result of a device wins."""
+    mapping = {doc.device_id: serialization.to_json(asdict(doc)) for doc in docs}
+    if not mapping:
+        return
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hset(_docs_key(digest_id), mapping=mapping)
+        pipe.expire(_docs_key(digest_id), settings.tscm.RUN_RECORD_TTL)
+        await pipe.execute()
+
+
+async def enqueue_digest(digest_id: str, subject: str) -> None:
+    """Enqueue the sending of a digest. A digest is only sent once."""
+    from app.domain.plugins import saq
+
+    queue = saq.get_queue("background-tasks")
+    await queue.enqueue(
+        "send_tscm_digest",
+        key=f"tscm-digest-{digest_id}",
+        digest_id=digest_id,
+        subject=subject,
+        timeout=settings.tscm.DIGEST_TIMEOUT,
+    )
+
+
+def build_digests(docs: Iterable[dict[str, Any]]) -> dict[tuple[str, ...], list[dict[str, Any]]]:
+    """Group the email results per set of recipients, sorted on device_id."""
+    digests: dict[tuple[str, ...], list[dict[str, Any]]] = defaultdict(list)
+    for doc in sorted(docs, key=lambda doc: doc["device_id"]):
+        recipients = settings.tscm.DIGEST_RECIPIENTS.get(
+            doc.get("service") or "",
+            settings.tscm.DIGEST_DEFAULT_RECIPIENTS,
+        )
+        digests[tuple(recipients)].append(doc)
+    return dict(digests)
+
+
+async def send_tscm_digest(_: Context, *, digest_id: str, subject: str) -> dict[str, int]:
+    """Send the stored email results of a digest, one email per group of recipients."""
+    docs = [serialization.from_json(doc) for doc in (await redis.hgetall(_docs_key(digest_id))).values()]
+    digests = build_digests(docs)
+    await email.mail_sender.send_many(
+        [
+            MessageSchema(
+                subject=subject,
+                recipients=list(recipients),
+                body="",
+                subtype=MessageType.html,
+                template_body=body,
+            )
+            for recipients, body in digests.items()
+        ],
+        template_name="tscm_email_template.html",
+    )
+    await redis.delete(_docs_key(digest_id))
+    await logger.ainfo("tscm digest sent", digest_id=digest_id, devices=len(docs), emails=len(digests))
+    return {"devices": len(docs), "emails": len(digests)}
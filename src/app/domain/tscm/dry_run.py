@@ -0,0 +1,168 @@
+"""Dry runs of TSCM checks before they go live.
+
+A dry run compiles the python code of a check and runs it against a sample of the configs
+in the config store. The sample is stratified on CPE model, so a check that only breaks on
+one (small) model still shows up. The measured runtime per config is extrapolated to the
+whole fleet to estimate what the check adds to the nightly run.
+
+The sample runs in a worker process with a deadline: a check that never finishes (a ``while
+True:``) is rejected once the sample took longer than the whole fleet may take, and its
+process is killed, instead of tying up the API worker.
+"""
+from __future__ import annotations
+
+import math
+import random
+import statistics
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from io import StringIO
+from typing import TYPE_CHECKING
+
+from anyio import fail_after, to_process
+
+from app.domain.tscm.configstore import ConfigStore
+from app.domain.tscm.tscm import run_check
+from app.lib import settings
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from app.domain.cpe.services import CPEService
+
+__all__ = ["DryRunReport", "dry_run_check", "stratified_sample"]
+
+
+@dataclass
+class DryRunReport:
+    check_key: str
+    compiles: bool = True
+    compile_error: str = ""
+    eligible_devices: int = 0
+    sampled: int = 0
+    passed: int = 0
+    failed: int = 0
+    missing_config: int = 0
+    exceptions: dict[str, str] = field(default_factory=dict)
+    mean_runtime_ms: float = 0.0
+    p99_runtime_ms: float = 0.0
+    estimated_fleet_runtime: float = 0.0
+    max_fleet_runtime: float = 0.0
+    accepted: bool = True
+    rejection_reason: str = ""
+
+
+def stratified_sample(device_models: dict[str, str], size: int, seed: int | None = None) -> list[str]:
+    """Pick ``size`` device ids, spread over the models in proportion to their share of the fleet.
+
+    Every model gets at least one device in the sample.
+    """
+    if len(device_models) <= size:
+        return sorted(device_models)
+    per_model: dict[str, list[str]] = defaultdict(list)
+    for device_id, model in device_models.items():
+        per_model[model].append(device_id)
+    rng = random.Random(seed)
+    sample: list[str] = []
+    for model in sorted(per_model):
+        device_ids = sorted(per_model[model])
+        quota = max(1, round(size * len(device_ids) / len(device_models)))
+        sample.extend(rng.sample(device_ids, min(quota, len(device_ids))))
+    return sample
+
+
+def _p99(runtimes: list[float]) -> float:
+    ordered = sorted(runtimes)
+    return ordered[min(len(ordered) - 1, math.ceil(len(ordered) * 0.99) - 1)]
+
+
+def _run_sample(
+    report: DryRunReport,
+    python_code: str,
+    device_ids: list[str],
+    config_dir: Path,
+) -> tuple[DryRunReport, list[float]]:
+    """Run the check against the sample, in a worker process: the report is returned with the results."""
+    store = ConfigStore(config_dir)
+    runtimes = []
+    for device_id in device_ids:
+        config = store.read(device_id)
+        if config is None:
+            report.missing_config += 1
+            continue
+        start = time.perf_counter()
+        try:
+            is_compliant, _, _ = run_check(python_code, config, report.check_key, stdout=StringIO())
+        except Exception as exc:  # noqa: BLE001
+            report.exceptions[device_id] = f"{type(exc).__name__}: {exc}"
+        else:
+            if is_compliant:
+                report.passed += 1
+            else:
+                report.failed += 1
+        runtimes.append(time.perf_counter() - start)
+    return report, runtimes
+
+
+async def dry_run_check(
+    cpe_service: CPEService,
+    check_key: str,
+    python_code: str,
+    vendor_name: str | None = None,
+    business_product_name: str | None = None,
+    model_name: str | None = None,
+    sample_size: int | None = None,
+) -> DryRunReport:
+    """Dry run a check against a stratified sample of the eligible devices.
+
+    The check is rejected when it does not compile, when its sample does not finish within
+    ``settings.tscm.MAX_CHECK_FLEET_RUNTIME``, or when its estimated runtime over all eligible
+    devices exceeds that.
+    """
+    report = DryRunReport(check_key=check_key, max_fleet_runtime=settings.tscm.MAX_CHECK_FLEET_RUNTIME)
+    try:
+        compile(python_code, check_key, "exec")
+    except SyntaxError as exc:
+        report.compiles = report.accepted = False
+        report.compile_error = report.rejection_reason = f"{type(exc).__name__}: {exc}"
+        return report
+
+    device_models = await cpe_service.get_device_models(vendor_name, business_product_name, model_name)
+    report.eligible_devices = len(device_models)
+    sample = stratified_sample(device_models, sample_size or settings.tscm.DRY_RUN_SAMPLE_SIZE)
+    report.sampled = len(sample)
+
+    # the sample may not take longer than the whole fleet may, plus the start of the worker process
+    timeout = report.max_fleet_runtime + settings.tscm.DRY_RUN_STARTUP_GRACE
+    try:
+        with fail_after(timeout):
+            report, runtimes = await to_process.run_sync(
+                _run_sample,
+                report,
+                python_code,
+                sample,
+                settings.tscm.CONFIG_DIR,
+                cancellable=True,
+            )
+    except TimeoutError:
+        report.accepted = False
+        report.rejection_reason = (
+            f"the sample of {report.sampled} devices did not finish within {timeout}s, "
+            f"the maximum over {report.eligible_devices} devices is {report.max_fleet_runtime}s"
+        )
+        return report
+    if not runtimes:
+        return report
+    mean = statistics.fmean(runtimes)
+    report.mean_runtime_ms = round(mean * 1000, 3)
+    report.p99_runtime_ms = round(_p99(runtimes) * 1000, 3)
+    report.estimated_fleet_runtime = round(mean * report.eligible_devices, 3)
+
+    if mean * report.eligible_devices > report.max_fleet_runtime:
+        report.accepted = False
+        report.rejection_reason = (
+            f"estimated runtime over {report.eligible_devices} devices is {report.estimated_fleet_runtime}s, "
+            f"the maximum is {report.max_fleet_runtime}s"
+        )
+    return report
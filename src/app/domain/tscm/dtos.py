@@ -14,6 +14,12 @@ __all__ = [
     "UpdateTscmCheckDTO",
     "PerformTscmCheck",
     "PerformTscmCheckDTO",
+    "DryRunTscmCheck",
+    "DryRunTscmCheckDTO",
+    "ConfigSearchMatch",
+    "CheckSweepRequest",
+    "CheckSweepRequestDTO",
+    "CheckSweep",
 ]
 
 
@@ -72,3 +78,44 @@ class PerformTscmCheckDTO(DataclassDTO[PerformTscmCheck]):
     """Readout CPE."""
 
     config = dto.config(rename_strategy="lower")
+
+
+@dataclass
+class DryRunTscmCheck:
+    key: str
+    python_code: str
+    vendor: str | None = None
+    business_service: str | None = None
+    device_model: str | None = None
+
+
+class DryRunTscmCheckDTO(DataclassDTO[DryRunTscmCheck]):
+    """Dry run a TSCM Check."""
+
+    config = dto.config(rename_strategy="lower")
+
+
+@dataclass
+class ConfigSearchMatch:
+    device_id: str
+    line_numbers: list[int]
+
+
+@dataclass
+class CheckSweepRequest:
+    check_key: str
+    vendor: str | None = None
+    business_service: str | None = None
+    device_model: str | None = None
+
+
+class CheckSweepRequestDTO(DataclassDTO[CheckSweepRequest]):
+    """Sweep a TSCM check over the fleet."""
+
+    config = dto.config(rename_strategy="lower")
+
+
+@dataclass
+class CheckSweep:
+    sweep_id: str
+    check_key: str
@@ -0,0 +1,462 @@
+"""Resumable fleet TSCM runs.
+
+A fleet run checks every device against its TSCM checks. When the run starts a coordinator
+job splits the devices in shards by consistent hashing of the device_id, and stores that
+plan with the run record in Redis. Every shard runs as its own SAQ job on any worker of any
+node and writes a checkpoint with its summary when it finishes. A fan-in job merges the
+shard summaries, so no report is ever shared in memory and throughput scales with the
+amount of worker containers.
+
+When a run dies halfway (a worker restart, a SAQ timeout) resuming it enqueues only the
+shards without a checkpoint, so completed work is never done twice. Unfinished runs are
+resumed automatically by a cron job, or by hand through the API. A shard that failed
+``settings.tscm.RUN_SHARD_MAX_ATTEMPTS`` times is given up: its devices count as errors.
+
+Between the fleet runs a readout that stores a changed config can check just that device, see
+``tscm_device_run``.
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING, Any
+from uuid import uuid4
+
+from advanced_alchemy.filters import CollectionFilter
+from anyio import to_thread
+from saq.job import TERMINAL_STATUSES
+
+from app.domain.cpe.dependencies import provides_cpe_service
+from app.domain.cpe.reachability import reachability_cache
+from app.domain.tscm.business_logic import export_to_elastic
+from app.domain.tscm.configstore import ConfigStore
+from app.domain.tscm.dependencies import provides_tscm_check_results_service, provides_tscm_service
+from app.domain.tscm.digest import enqueue_digest, store_email_docs
+from app.domain.tscm.tscm import CpeTscmCheck, TscmExportReport
+from app.lib import log, serialization, settings
+from app.lib.cache import redis
+from app.lib.data_exporter import ElasticSearchRepository
+from app.lib.db.base import session
+from app.lib.hashring import HashRing
+
+if TYPE_CHECKING:
+    from saq import Queue
+    from saq.types import Context
+
+    from app.domain.cpe.models import CPE
+    from app.domain.tscm.models import TSCMCheck
+    from app.domain.tscm.tscm import TSCMEmailDoc
+
+__all__ = [
+    "FleetRun",
+    "get_fleet_run",
+    "list_fleet_runs",
+    "resume_fleet_run",
+    "resume_tscm_fleet_runs",
+    "shard_devices",
+    "start_fleet_run",
+    "start_nightly_tscm_fleet_run",
+    "tscm_device_run",
+    "tscm_fleet_run",
+    "tscm_fleet_run_fan_in",
+    "tscm_fleet_run_shard",
+]
+
+
+logger = log.get_logger()
+
+SUMMARY_KEYS = ("compliant", "not_compliant", "no_config", "errors")
+
+
+@dataclass
+class FleetRun:
+    run_id: str
+    status: str = "pending"
+    """One of pending, running or completed."""
+    test_run: bool = False
+    created: float = field(default_factory=time.time)
+    finished: float | None = None
+    devices: int = 0
+    shards: int = 0
+    completed_shards: int = 0
+    resumes: int = 0
+    totals: dict[str, int] = field(default_factory=dict)
+
+
+def _run_key(run_id: str) -> str:
+    return f"{settings.app.slug}:tscm-run:{run_id}"
+
+
+def _plan_key(run_id: str) -> str:
+    return f"{settings.app.slug}:tscm-run:{run_id}:plan"
+
+
+def _checkpoints_key(run_id: str) -> str:
+    return f"{settings.app.slug}:tscm-run:{run_id}:checkpoints"
+
+
+def _attempts_key(run_id: str) -> str:
+    return f"{settings.app.slug}:tscm-run:{run_id}:attempts"
+
+
+def _runs_key() -> str:
+    return f"{settings.app.slug}:tscm-runs"
+
+
+def _coordinator_job_key(run_id: str) -> str:
+    return f"tscm-run-{run_id}"
+
+
+async def _save_run(run: FleetRun) -> None:
+    ttl = settings.tscm.RUN_RECORD_TTL
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.set(_run_key(run.run_id), serialization.to_json(asdict(run)), ex=ttl)
+        pipe.zadd(_runs_key(), {run.run_id: run.created})
+        pipe.zremrangebyscore(_runs_key(), "-inf", time.time() - ttl)
+        await pipe.execute()
+
+
+async def _checkpoints(run_id: str) -> dict[int, dict[str, int]]:
+    return {
+        int(shard): serialization.from_json(summary)
+        for shard, summary in (await redis.hgetall(_checkpoints_key(run_id))).items()
+    }
+
+
+async def get_fleet_run(run_id: str) -> FleetRun | None:
+    """Return a run with its progress, or None when the run is unknown (or expired)."""
+    payload = await redis.get(_run_key(run_id))
+    if payload is None:
+        return None
+    run = FleetRun(**serialization.from_json(payload))
+    if run.status != "completed":
+        run.completed_shards = await redis.hlen(_checkpoints_key(run_id))
+    return run
+
+
+async def list_fleet_runs(limit: int = 20) -> list[FleetRun]:
+    """Return the most recent runs, newest first."""
+    run_ids = await redis.zrevrange(_runs_key(), 0, limit - 1)
+    runs = [await get_fleet_run(run_id.decode()) for run_id in run_ids]
+    return [run for run in runs if run is not None]
+
+
+async def _enqueue_coordinator(run_id: str) -> bool:
+    from app.domain.plugins import saq
+
+    queue = saq.get_queue("background-tasks")
+    job = await queue.enqueue(
+        "tscm_fleet_run",
+        key=_coordinator_job_key(run_id),
+        run_id=run_id,
+        timeout=settings.tscm.RUN_COORDINATOR_TIMEOUT,
+    )
+    return job is not None
+
+
+async def start_fleet_run(test_run: bool = False) -> FleetRun:
+    """Create a run record and enqueue its coordinator."""
+    run = FleetRun(run_id=uuid4().hex, test_run=test_run)
+    await _save_run(run)
+    await _enqueue_coordinator(run.run_id)
+    return run
+
+
+async def resume_fleet_run(run_id: str) -> bool:
+    """Enqueue the coordinator of an unfinished run again.
+
+    Returns False when the run is unknown, already completed or its coordinator is still queued or running.
+    """
+    run = await get_fleet_run(run_id)
+    if run is None or run.status == "completed":
+        return False
+    return await _enqueue_coordinator(run_id)
+
+
+def shard_devices(device_ids: list[str], shards: int) -> dict[int, list[str]]:
+    """Split the devices in shards by consistent hashing of the device_id.
+
+    A device lands in the same shard every run, and changing the amount of shards only
+    moves the devices of the added or removed shards.
+    """
+    ring = HashRing(str(shard) for shard in range(shards))
+    plan: dict[int, list[str]] = {}
+    for device_id in device_ids:
+        plan.setdefault(int(ring.node_for(device_id)), []).append(device_id)
+    return plan
+
+
+async def _plan(run: FleetRun) -> dict[int, list[str]]:
+    """Return the shards of a run, splitting the fleet on the first start of the run."""
+    plan = await redis.hgetall(_plan_key(run.run_id))
+    if plan:
+        return {int(shard): serialization.from_json(device_ids) for shard, device_ids in plan.items()}
+
+    async with session() as db_session:
+        cpe_service = await anext(provides_cpe_service(db_session=db_session))
+        device_ids = await cpe_service.get_device_ids()
+    shards = shard_devices(device_ids, settings.tscm.RUN_SHARDS)
+    if shards:
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hset(_plan_key(run.run_id), mapping={n: serialization.to_json(ids) for n, ids in shards.items()})
+            pipe.expire(_plan_key(run.run_id), settings.tscm.RUN_RECORD_TTL)
+            await pipe.execute()
+    run.devices = len(device_ids)
+    run.shards = len(shards)
+    return shards
+
+
+async def _enqueue_fan_in(run_id: str) -> None:
+    from app.domain.plugins import saq
+
+    queue = saq.get_queue("background-tasks")
+    await queue.enqueue(
+        "tscm_fleet_run_fan_in",
+        key=f"{_coordinator_job_key(run_id)}-fan-in",
+        run_id=run_id,
+        timeout=settings.tscm.RUN_FAN_IN_TIMEOUT,
+    )
+
+
+async def _checkpoint(run_id: str, shard: int, summary: dict[str, int]) -> None:
+    """Store the summary of a shard, the last checkpoint of the run enqueues its fan-in."""
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hset(_checkpoints_key(run_id), str(shard), serialization.to_json(summary))
+        pipe.expire(_checkpoints_key(run_id), settings.tscm.RUN_RECORD_TTL)
+        pipe.hlen(_checkpoints_key(run_id))
+        pipe.hlen(_plan_key(run_id))
+        *_, completed, shards = await pipe.execute()
+    if completed >= shards:
+        await _enqueue_fan_in(run_id)
+
+
+async def _give_up_shards(queue: Queue, run_id: str, shards: dict[int, list[str]], pending: list[int]) -> list[int]:
+    """Checkpoint the pending shards that failed ``settings.tscm.RUN_SHARD_MAX_ATTEMPTS`` times.
+
+    Their devices count as errors, so the run completes instead of enqueueing them again on
+    every resume. Returns the shards that are left to enqueue.
+    """
+    attempts = {int(shard): int(count) for shard, count in (await redis.hgetall(_attempts_key(run_id))).items()}
+    left = []
+    for shard in pending:
+        if attempts.get(shard, 0) < settings.tscm.RUN_SHARD_MAX_ATTEMPTS:
+            left.append(shard)
+            continue
+        job = await queue.job(f"{_coordinator_job_key(run_id)}-{shard}")
+        if job is not None and job.status not in TERMINAL_STATUSES:
+            # the last attempt is still queued or running
+            continue
+        await logger.awarning("tscm fleet run shard given up", run_id=run_id, shard=shard, attempts=attempts[shard])
+        await _checkpoint(run_id, shard, dict.fromkeys(SUMMARY_KEYS, 0) | {"errors": len(shards[shard])})
+    return left
+
+
+async def tscm_fleet_run(_: Context, *, run_id: str) -> dict[str, Any]:
+    """Coordinate a fleet run: enqueue a job for every shard without a checkpoint.
+
+    The coordinator does not wait for the shards. The shard that finishes last enqueues the
+    fan-in, so the shards can run on any worker of any node without holding a worker slot
+    of the coordinator. Running the coordinator again (a resume) only enqueues shards that
+    have no checkpoint and are not queued or running already.
+    """
+    from app.domain.plugins import saq
+
+    queue = saq.get_queue("background-tasks")
+    run = await get_fleet_run(run_id)
+    if run is None:
+        await logger.awarning("tscm fleet run not found", run_id=run_id)
+        return {}
+    if run.status == "completed":
+        return asdict(run)
+
+    shards = await _plan(run)
+    checkpoints = await _checkpoints(run_id)
+    pending = sorted(set(shards) - set(checkpoints))
+    resumed = run.status != "pending"
+    run.status = "running"
+    await _save_run(run)
+
+    if not pending:
+        await _enqueue_fan_in(run_id)
+        return asdict(run)
+    pending = await _give_up_shards(queue, run_id, shards, pending)
+
+    jobs = [
+        await queue.enqueue(
+            "tscm_fleet_run_shard",
+            key=f"{_coordinator_job_key(run_id)}-{shard}",
+            timeout=settings.tscm.RUN_SHARD_TIMEOUT,
+            run_id=run_id,
+            shard=shard,
+            device_ids=shards[shard],
+            test_run=run.test_run,
+        )
+        for shard in pending
+    ]
+    enqueued = sum(job is not None for job in jobs)
+    async with redis.pipeline(transaction=False) as pipe:
+        for shard, job in zip(pending, jobs, strict=True):
+            if job is not None:
+                pipe.hincrby(_attempts_key(run_id), str(shard), 1)
+        pipe.expire(_attempts_key(run_id), settings.tscm.RUN_RECORD_TTL)
+        await pipe.execute()
+    if resumed and enqueued:
+        run.resumes += 1
+        await _save_run(run)
+    await logger.ainfo("tscm fleet run shards enqueued", run_id=run_id, shards=len(shards), enqueued=enqueued)
+    return asdict(run)
+
+
+async def tscm_fleet_run_fan_in(_: Context, *, run_id: str) -> dict[str, Any]:
+    """Merge the shard summaries of a run once every shard has a checkpoint."""
+    run = await get_fleet_run(run_id)
+    if run is None or run.status == "completed":
+        return asdict(run) if run else {}
+
+    checkpoints = await _checkpoints(run_id)
+    if len(checkpoints) < run.shards:
+        return asdict(run)
+    run.completed_shards = len(checkpoints)
+    run.totals = {key: sum(summary[key] for summary in checkpoints.values()) for key in SUMMARY_KEYS}
+    run.status = "completed"
+    run.finished = time.time()
+    await _save_run(run)
+    if not run.test_run:
+        await enqueue_digest(run_id, subject=f"TSCM report {time.strftime('%Y-%m-%d', time.localtime(run.created))}")
+    await logger.ainfo("tscm fleet run finished", run_id=run_id, **run.totals)
+    return asdict(run)
+
+
+def _check_devices(
+    devices: list[tuple[CPE, list[TSCMCheck], bool]],
+    report: TscmExportReport,
+    email_results: list[TSCMEmailDoc],
+    online: dict[str, bool] | None = None,
+) -> dict[str, int]:
+    """Check the devices, with their online status from ``online`` when they are in it."""
+    online = online or {}
+    store = ConfigStore()
+    summary = dict.fromkeys(SUMMARY_KEYS, 0)
+    for cpe, tscm_checks, latest_compliancy in devices:
+        config = store.read(cpe.device_id)
+        if config is None:
+            summary["no_config"] += 1
+            continue
+        try:
+            tscm_check = CpeTscmCheck(
+                device_id=cpe.device_id,
+                tscm_checks=tscm_checks,
+                provided_config=config,
+                online_status=online.get(cpe.device_id, cpe.online_status),
+                vendor=cpe.vendor.name,
+                service=cpe.service.name,
+                report=report,
+            )
+            if tscm_check.config_age_compliant(config_age=store.age_days(cpe.device_id) or 0):
+                if not tscm_check.online_status:
+                    tscm_check.offline_compliant_not_compliant(latest_compliancy)
+                else:
+                    tscm_check.online_compliant_not_compliant()
+        except Exception:
+            logger.exception("tscm fleet run failed on device", device_id=cpe.device_id)
+            summary["errors"] += 1
+            continue
+        if tscm_check.is_compliant:
+            summary["compliant"] += 1
+        else:
+            summary["not_compliant"] += 1
+            email_results.append(tscm_check.get_email_results())
+    return summary
+
+
+async def _load_devices(
+    device_ids: list[str],
+) -> tuple[list[tuple[CPE, list[TSCMCheck], bool]], dict[str, bool]]:
+    """The devices with their checks and latest compliancy, and their online status of the last ping sweep."""
+    async with session() as db_session:
+        cpe_service = await anext(provides_cpe_service(db_session=db_session))
+        tscm_service = await anext(provides_tscm_service(db_session=db_session))
+        tscm_check_result_service = await anext(provides_tscm_check_results_service(db_session=db_session))
+
+        # the status published by the last ping sweep, the stored one for devices it did not reach yet
+        online = {
+            device_id: state.online
+            for device_id, state in (await reachability_cache.get_many(device_ids)).items()
+            if state is not None
+        }
+        checks: dict[tuple[str, str, str], list[TSCMCheck]] = {}
+        cpes = await cpe_service.list(CollectionFilter("device_id", device_ids))
+        # the compliancy history only matters for the devices that are offline
+        offline = [cpe.device_id for cpe in cpes if not online.get(cpe.device_id, cpe.online_status)]
+        compliant_since = await tscm_check_result_service.compliant_since_many(offline)
+        devices = []
+        for cpe in cpes:
+            product = (cpe.vendor.name, cpe.service.name, cpe.product_configuration.cpe_model)
+            if product not in checks:
+                checks[product] = await tscm_service.vendor_product_checks(*product)
+            latest_compliancy = compliant_since.get(cpe.device_id, True)
+            devices.append((cpe, checks[product], latest_compliancy))
+    return devices, online
+
+
+async def tscm_fleet_run_shard(
+    _: Context,
+    *,
+    run_id: str,
+    shard: int,
+    device_ids: list[str],
+    test_run: bool = False,
+) -> dict[str, int]:
+    """Run the TSCM checks of one shard of devices and checkpoint the summary.
+
+    The shard that writes the last checkpoint enqueues the fan-in of the run.
+    """
+    checkpoint = await redis.hget(_checkpoints_key(run_id), str(shard))
+    if checkpoint is not None:
+        return serialization.from_json(checkpoint)
+
+    devices, online = await _load_devices(device_ids)
+    report = TscmExportReport()
+    email_results: list[TSCMEmailDoc] = []
+    summary = await to_thread.run_sync(_check_devices, devices, report, email_results, online)
+    await export_to_elastic(report.results(), ElasticSearchRepository(test_run=test_run))
+    await store_email_docs(run_id, email_results)
+    await _checkpoint(run_id, shard, summary)
+    return summary
+
+
+async def tscm_device_run(_: Context, *, device_id: str) -> dict[str, int]:
+    """Check a single device, enqueued by a readout that stored a changed config of it.
+
+    Only the changed device is checked instead of waiting for the nightly fleet run. A device
+    that is not compliant gets a digest of its own.
+    """
+    devices, online = await _load_devices([device_id])
+    report = TscmExportReport()
+    email_results: list[TSCMEmailDoc] = []
+    summary = await to_thread.run_sync(_check_devices, devices, report, email_results, online)
+    await export_to_elastic(report.results(), ElasticSearchRepository())
+    if email_results:
+        digest_id = uuid4().hex
+        await store_email_docs(digest_id, email_results)
+        await enqueue_digest(digest_id, subject=f"TSCM report {device_id}")
+    await logger.ainfo("tscm device run finished", device_id=device_id, **summary)
+    return summary
+
+
+async def start_nightly_tscm_fleet_run(_: Context) -> dict[str, Any]:
+    """Cron entry point of the nightly fleet run."""
+    run = await start_fleet_run()
+    return {"run_id": run.run_id}
+
+
+async def resume_tscm_fleet_runs(_: Context) -> dict[str, Any]:
+    """Resume the recent runs that have not completed yet."""
+    resumed = [
+        run.run_id
+        for run in await list_fleet_runs()
+        if run.status != "completed" and await resume_fleet_run(run.run_id)
+    ]
+    if resumed:
+        await logger.ainfo("resumed tscm fleet runs", run_ids=resumed)
+    return {"resumed": resumed}
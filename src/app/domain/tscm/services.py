@@ -2,7 +2,8 @@ import datetime
 from typing import TYPE_CHECKING, Any, cast
 
 from advanced_alchemy.filters import BeforeAfter, LimitOffset
-from sqlalchemy import and_, select
+from sqlalchemy import and_, func, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array_agg
 
 from app.domain.cpe.dependencies import provides_cpe_service
 from app.domain.cpe.models import CPE
@@ -176,6 +177,38 @@ class TscmCheckResultRepository(SQLAlchemyAsyncRepository[TSCMCheckResult]):
             )
         return latest[0].is_compliant
 
+    async def compliant_since_many(self, device_ids: list[str]) -> dict[str, bool]:
+        """The outcome of :meth:`compliant_since` for many devices, in one grouped query.
+
+        Devices without results are not compliant.
+        """
+        if not device_ids:
+            return {}
+        current_date = datetime.datetime.now().astimezone()
+        after = current_date - datetime.timedelta(days=settings.tscm.MAXIMUM_CONFIG_AGE)
+        latest = TSCMCheckResult.date.desc()
+        statement = (
+            select(
+                TSCMCheckResult.cpe_id,
+                array_agg(aggregate_order_by(TSCMCheckResult.is_online, latest))[1],
+                array_agg(aggregate_order_by(TSCMCheckResult.is_compliant, latest))[1],
+                func.bool_or(
+                    and_(
+                        TSCMCheckResult.is_compliant,
+                        TSCMCheckResult.is_online,
+                        TSCMCheckResult.date > after,
+                        TSCMCheckResult.date < current_date,
+                    ),
+                ),
+            )
+            .where(TSCMCheckResult.cpe_id.in_(device_ids))
+            .group_by(TSCMCheckResult.cpe_id)
+        )
+        compliancy = dict.fromkeys(device_ids, False)
+        for device_id, latest_online, latest_compliant, compliant_online in await self.session.execute(statement):
+            compliancy[device_id] = bool(latest_compliant if latest_online else compliant_online)
+        return compliancy
+
 
 class TscmCheckResultService(SQLAlchemyAsyncRepositoryService[TSCMCheckResult]):
     repository_type = TscmCheckResultRepository
@@ -200,3 +233,6 @@ class TscmCheckResultService(SQLAlchemyAsyncRepositoryService[TSCMCheckResult]):
 
     async def compliant_since(self, device_id: str) -> bool:
         return await self.repository.compliant_since(device_id)
+
+    async def compliant_since_many(self, device_ids: list[str]) -> dict[str, bool]:
+        return await self.repository.compliant_since_many(device_ids)
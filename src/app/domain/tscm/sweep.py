@@ -0,0 +1,258 @@
+"""Ad-hoc sweeps of a single TSCM check over every eligible device.
+
+A sweep is coordinated by one SAQ job which splits the eligible devices in chunks. Every
+chunk runs as its own job, so the work is spread over all worker processes. Finished
+chunks publish their results on a Redis channel (and keep them in a Redis list for late
+subscribers) which is streamed to the browser over a websocket.
+
+The coordinator does not wait for the chunks. Every chunk adds its totals to a Redis hash,
+also when it failed or was cancelled by its timeout, and the chunk that completes last
+publishes the ``done`` event.
+"""
+from __future__ import annotations
+
+import time
+from io import StringIO
+from typing import TYPE_CHECKING, Any
+from uuid import uuid4
+
+from anyio import CancelScope, to_thread
+
+from app.domain.cpe.dependencies import provides_cpe_service
+from app.domain.tscm.configstore import ConfigStore
+from app.domain.tscm.tscm import run_check
+from app.lib import log, serialization, settings
+from app.lib.cache import redis
+from app.lib.db.base import session
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator
+
+    from saq.types import Context
+
+    from app.domain.tscm.models import TSCMCheck
+
+__all__ = ["start_check_sweep", "sweep_events", "tscm_check_sweep", "tscm_check_sweep_chunk"]
+
+
+logger = log.get_logger()
+
+
+def _channel(sweep_id: str) -> str:
+    return f"{settings.app.slug}:tscm-sweep:{sweep_id}"
+
+
+def _results_key(sweep_id: str) -> str:
+    return f"{settings.app.slug}:tscm-sweep:{sweep_id}:events"
+
+
+def _record_key(sweep_id: str) -> str:
+    return f"{settings.app.slug}:tscm-sweep:{sweep_id}"
+
+
+def _progress_key(sweep_id: str) -> str:
+    return f"{settings.app.slug}:tscm-sweep:{sweep_id}:progress"
+
+
+async def publish_sweep_event(sweep_id: str, event: dict[str, Any]) -> None:
+    payload = serialization.to_json(event)
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.rpush(_results_key(sweep_id), payload)
+        pipe.expire(_results_key(sweep_id), settings.tscm.SWEEP_RESULT_TTL)
+        pipe.publish(_channel(sweep_id), payload)
+        await pipe.execute()
+
+
+def _event_id(event: dict[str, Any]) -> tuple[str, int]:
+    return event["type"], event.get("chunk", 0)
+
+
+async def sweep_events(sweep_id: str) -> AsyncGenerator[dict[str, Any], None]:
+    """Yield the events of a sweep, starting with the ones that were already published.
+
+    The generator ends after the ``done`` event. It ends with an ``error`` event for an unknown
+    (or expired) sweep, and when no event was published for ``settings.tscm.SWEEP_IDLE_TIMEOUT``
+    seconds, as happens when the coordinator of the sweep died.
+    """
+    seen: set[tuple[str, int]] = set()
+    async with redis.pubsub() as pubsub:
+        # subscribe before replaying so no event falls in between
+        await pubsub.subscribe(_channel(sweep_id))
+        if not await redis.exists(_record_key(sweep_id), _results_key(sweep_id)):
+            yield {"type": "error", "detail": f"No sweep found with id {sweep_id}"}
+            return
+        for payload in await redis.lrange(_results_key(sweep_id), 0, -1):
+            event = serialization.from_json(payload)
+            seen.add(_event_id(event))
+            yield event
+            if event["type"] == "done":
+                return
+        deadline = time.monotonic() + settings.tscm.SWEEP_IDLE_TIMEOUT
+        while time.monotonic() < deadline:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message is None or message["type"] != "message":
+                continue
+            deadline = time.monotonic() + settings.tscm.SWEEP_IDLE_TIMEOUT
+            event = serialization.from_json(message["data"])
+            if _event_id(event) in seen:
+                continue
+            seen.add(_event_id(event))
+            yield event
+            if event["type"] == "done":
+                return
+        yield {
+            "type": "error",
+            "detail": f"No events of sweep {sweep_id} for {settings.tscm.SWEEP_IDLE_TIMEOUT} seconds",
+        }
+
+
+async def start_check_sweep(
+    check: TSCMCheck,
+    vendor_name: str | None = None,
+    business_product_name: str | None = None,
+    model_name: str | None = None,
+) -> str:
+    """Enqueue a sweep of ``check`` and return the sweep id.
+
+    Devices are selected on the vendor, business product and model of the check, the
+    optional arguments narrow that selection down.
+    """
+    from app.domain.plugins import saq
+
+    queue = saq.get_queue("background-tasks")
+    sweep_id = uuid4().hex
+    await redis.set(
+        _record_key(sweep_id),
+        serialization.to_json({"sweep_id": sweep_id, "check_key": check.key, "created": time.time()}),
+        ex=settings.tscm.SWEEP_TIMEOUT + settings.tscm.SWEEP_RESULT_TTL,
+    )
+    await queue.enqueue(
+        "tscm_check_sweep",
+        key=f"tscm-sweep-{sweep_id}",
+        sweep_id=sweep_id,
+        check_key=check.key,
+        python_code=check.python_code,
+        vendor_name=vendor_name or check.vendor.name,
+        business_product_name=business_product_name or check.service.name,
+        model_name=model_name or check.device_model,
+        timeout=settings.tscm.SWEEP_TIMEOUT,
+    )
+    return sweep_id
+
+
+async def tscm_check_sweep(
+    _: Context,
+    *,
+    sweep_id: str,
+    check_key: str,
+    python_code: str,
+    vendor_name: str,
+    business_product_name: str,
+    model_name: str,
+) -> dict[str, Any]:
+    """Coordinate a sweep: split the eligible devices in chunks and enqueue a job for every chunk.
+
+    The coordinator does not wait for the chunks, the chunk that completes last ends the sweep.
+    """
+    from app.domain.plugins import saq
+
+    queue = saq.get_queue("background-tasks")
+
+    async with session() as db_session:
+        cpe_service = await anext(provides_cpe_service(db_session=db_session))
+        device_ids = await cpe_service.get_device_ids(vendor_name, business_product_name, model_name)
+
+    chunk_size = settings.tscm.SWEEP_CHUNK_SIZE
+    chunks = [device_ids[n : n + chunk_size] for n in range(0, len(device_ids), chunk_size)]
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hset(_progress_key(sweep_id), mapping={"chunks": len(chunks), "started": time.time()})
+        pipe.expire(_progress_key(sweep_id), settings.tscm.SWEEP_TIMEOUT + settings.tscm.SWEEP_RESULT_TTL)
+        await pipe.execute()
+    started = {"type": "started", "check_key": check_key, "devices": len(device_ids), "chunks": len(chunks)}
+    await publish_sweep_event(sweep_id, started)
+    if not chunks:
+        await _publish_done(sweep_id, check_key, await _progress(sweep_id))
+        return started
+
+    for n, chunk in enumerate(chunks):
+        await queue.enqueue(
+            "tscm_check_sweep_chunk",
+            key=f"tscm-sweep-{sweep_id}-{n}",
+            timeout=settings.tscm.SWEEP_TIMEOUT,
+            sweep_id=sweep_id,
+            chunk=n,
+            check_key=check_key,
+            python_code=python_code,
+            device_ids=chunk,
+        )
+    return started
+
+
+async def _progress(sweep_id: str) -> dict[str, float]:
+    return {key.decode(): float(value) for key, value in (await redis.hgetall(_progress_key(sweep_id))).items()}
+
+
+async def _publish_done(sweep_id: str, check_key: str, progress: dict[str, float]) -> None:
+    totals = {key: int(progress.get(key, 0)) for key in ("passed", "failed", "errors", "failed_chunks")}
+    duration = round(time.time() - progress.get("started", time.time()), 3)
+    await publish_sweep_event(sweep_id, {"type": "done", "check_key": check_key, **totals, "duration": duration})
+    await logger.ainfo("tscm check sweep done", sweep_id=sweep_id, **totals)
+
+
+async def _complete_chunk(sweep_id: str, check_key: str, summary: dict[str, int] | None) -> None:
+    async with redis.pipeline(transaction=True) as pipe:
+        for key, count in (summary or {"failed_chunks": 1}).items():
+            pipe.hincrby(_progress_key(sweep_id), key, count)
+        pipe.hincrby(_progress_key(sweep_id), "completed_chunks", 1)
+        pipe.hgetall(_progress_key(sweep_id))
+        *_, raw = await pipe.execute()
+    progress = {key.decode(): float(value) for key, value in raw.items()}
+    # the increments and the read are one transaction, only the last chunk sees all chunks completed
+    if progress["completed_chunks"] == progress.get("chunks"):
+        await _publish_done(sweep_id, check_key, progress)
+
+
+def _sweep_chunk(check_key: str, python_code: str, device_ids: list[str]) -> list[dict[str, Any]]:
+    store = ConfigStore()
+    results = []
+    for device_id in device_ids:
+        result: dict[str, Any] = {"device_id": device_id, "is_compliant": None, "output": "", "error": ""}
+        config = store.read(device_id)
+        if config is None:
+            result["error"] = "no config available"
+            results.append(result)
+            continue
+        output = StringIO()
+        try:
+            result["is_compliant"], _, _ = run_check(python_code, config, check_key, stdout=output)
+        except Exception as exc:  # noqa: BLE001
+            result["error"] = f"{type(exc).__name__}: {exc}"
+        result["output"] = output.getvalue()
+        results.append(result)
+    return results
+
+
+async def tscm_check_sweep_chunk(
+    _: Context,
+    *,
+    sweep_id: str,
+    chunk: int,
+    check_key: str,
+    python_code: str,
+    device_ids: list[str],
+) -> dict[str, int]:
+    """Run the check against one chunk of devices, publish the results and end the sweep when it is the last one."""
+    summary = None
+    try:
+        results = await to_thread.run_sync(_sweep_chunk, check_key, python_code, device_ids)
+        summary = {
+            "passed": sum(result["is_compliant"] is True for result in results),
+            "failed": sum(result["is_compliant"] is False for result in results),
+            "errors": sum(bool(result["error"]) for result in results),
+        }
+        await publish_sweep_event(sweep_id, {"type": "chunk", "chunk": chunk, **summary, "results": results})
+    finally:
+        # also when the job failed or is cancelled by its timeout, the sweep would never be done otherwise
+        with CancelScope(shield=True):
+            await _complete_chunk(sweep_id, check_key, summary)
+    return summary
@@ -1,24 +1,60 @@
 from __future__ import annotations
 
 import datetime
+import functools
 import re
 from dataclasses import dataclass, field
+from io import StringIO
 from typing import TYPE_CHECKING
 
-from app.domain.tscm.helpers import stdoutio
 from app.lib import settings
 
-__all__ = ["TscmExportReport", "CpeTscmCheck", "TSCMDoc", "TSCMEmailDoc", "TSCMPerCheckDetailDoc"]
+__all__ = ["TscmExportReport", "CpeTscmCheck", "TSCMDoc", "TSCMEmailDoc", "TSCMPerCheckDetailDoc", "run_check"]
 
 
 if TYPE_CHECKING:
+    from typing import TextIO
+
     from app.domain.tscm.models import TSCMCheck
 
 
+def run_check(
+    python_code: str,
+    config: str,
+    check_name: str,
+    stdout: TextIO | None = None,
+) -> tuple[bool, str, str]:
+    """Run the python code of a TSCM check against a config.
+
+    The code gets the config as ``config`` and reports back by setting ``validated``
+    and optionally ``deviation`` and ``remediation``. When ``stdout`` is given the
+    output of ``print`` in the check is written to it instead of ``sys.stdout``.
+
+    Returns:
+        tuple of (validated, deviation, remediation)
+    """
+    data = {
+        "config": config,
+        "validated": False,
+    }
+
+    code = compile(python_code, check_name, "exec")
+    check_print = functools.partial(print, file=stdout) if stdout is not None else print
+    allowed_builtins = {"__builtins__": {"re": re, "print": check_print, "len": len}}
+    exec(code, allowed_builtins, data)  # noqa: S102
+
+    is_validated = data.get("validated", False)
+    deviation = data.get("deviation", "")
+    remediation = data.get("remediation", "")
+
+    return is_validated, deviation, remediation  # type: ignore[return-value]
+
+
 @dataclass
 class TSCMEmailDoc:
     device_id: str | None = None
     is_compliant: bool | None = None
+    service: str | None = None
     checks: dict = field(default_factory=dict)
 
 
@@ -138,26 +174,17 @@ class CpeTscmCheck:
         self.is_compliant = True
 
         # email results
-        self.tscm_email_doc: TSCMEmailDoc = TSCMEmailDoc(device_id=self.device_id, is_compliant=self.is_compliant)
+        self.tscm_email_doc: TSCMEmailDoc = TSCMEmailDoc(
+            device_id=self.device_id,
+            is_compliant=self.is_compliant,
+            service=self.service,
+        )
 
     def __repr__(self) -> str:
         return f"CpeTscmCheck({self.device_id})"
 
-    def _validate(self, python_code: str, check_name: str) -> tuple[bool, str, str]:
-        data = {
-            "config": self.provided_config,
-            "validated": False,
-        }
-
-        code = compile(python_code, check_name, "exec")
-        allowed_builtins = {"__builtins__": {"re": re, "print": print, "len": len}}
-        exec(code, allowed_builtins, data)  # noqa: S102
-
-        is_validated = data.get("validated", False)
-        deviation = data.get("deviation", "")
-        remediation = data.get("remediation", "")
-
-        return is_validated, deviation, remediation  # type: ignore[return-value]
+    def _validate(self, python_code: str, check_name: str, stdout: TextIO | None = None) -> tuple[bool, str, str]:
+        return run_check(python_code, self.provided_config, check_name, stdout=stdout)
 
     def config_age_compliant(self, config_age: int) -> bool:
         """Main TSCM Rule:
@@ -221,28 +248,28 @@ class CpeTscmCheck:
         """
         for check in self.tscm_checks:
             try:
-                with stdoutio() as out:
-                    check_is_compliant, deviation, remediation = self._validate(check.python_code, self.provided_config)
-                    output = out.getvalue()
-                    self.tscm_email_doc.checks[check.key] = {
-                        "output": output,
-                        "is_compliant": check_is_compliant,
-                    }
-                    self.export_report.create_per_check_doc(
-                        vendor=self.vendor,
-                        device_id=self.device_id,
-                        service=self.service,
-                        check_is_compliant=check_is_compliant,
-                        deviation=deviation,
-                        remediation=remediation,
-                        output=output,
-                        check=check,
-                    )
-
-                    # if one check is not compliant we set the global variable is_compliant to False
-                    # hence the cpe is not compliant.
-                    if not check_is_compliant:
-                        self.is_compliant = False
+                out = StringIO()
+                check_is_compliant, deviation, remediation = self._validate(check.python_code, check.key, stdout=out)
+                output = out.getvalue()
+                self.tscm_email_doc.checks[check.key] = {
+                    "output": output,
+                    "is_compliant": check_is_compliant,
+                }
+                self.export_report.create_per_check_doc(
+                    vendor=self.vendor,
+                    device_id=self.device_id,
+                    service=self.service,
+                    check_is_compliant=check_is_compliant,
+                    deviation=deviation,
+                    remediation=remediation,
+                    output=output,
+                    check=check,
+                )
+
+                # if one check is not compliant we set the global variable is_compliant to False
+                # hence the cpe is not compliant.
+                if not check_is_compliant:
+                    self.is_compliant = False
 
             except Exception:
                 import traceback
@@ -36,7 +36,13 @@ CPES_DETAIL = "/api/cpes/{device_id:str}"
 CPES_CREATE = "/api/cpes"
 CPES_DELETE = "/api/cpes/{device_id:str}"
 CPES_READOUT = "/api/cpes/{device_id:str}/readout"
+CPES_LATENCY = "/api/cpes/{device_id:str}/latency"
+CPES_REACHABILITY = "/api/cpes/reachability"
+CPES_DETAIL_REACHABILITY = "/api/cpes/{device_id:str}/reachability"
 CPES_UPDATE = "/api/cpes/{device_id:str}"
+READOUT_RUNS = "/api/readouts"
+READOUT_RUN_DETAIL = "/api/readouts/{run_id:str}"
+READOUT_RUN_FAILURES = "/api/readouts/{run_id:str}/failures"
 
 
 ########## CPE Business Product
@@ -65,6 +71,13 @@ TSCM_LIST_CREATE = "/api/tscm"
 TSCM_LIST_DELETE = "/api/tscm/{tscm_check_id:str}"
 TSCM_LIST_UPDATE = "/api/tscm/{tscm_check_id:str}"
 TSCM_CHECK_CPE = "/api/tscm/{device_id:str}/check"
+TSCM_DRY_RUN = "/api/tscm/dry-run"
+TSCM_CONFIG_SEARCH = "/api/tscm/config-search"
+TSCM_CHECK_SWEEP = "/api/tscm/sweeps"
+TSCM_CHECK_SWEEP_STREAM = "/api/tscm/sweeps/{sweep_id:str}/stream"
+TSCM_FLEET_RUNS = "/api/tscm/runs"
+TSCM_FLEET_RUN_DETAIL = "/api/tscm/runs/{run_id:str}"
+TSCM_FLEET_RUN_RESUME = "/api/tscm/runs/{run_id:str}/resume"
 
 
 ########## CPE Product Configurations
@@ -77,3 +90,6 @@ CPE_PROD_CONFIGS_DELETE = "/api/product-configurations/{product_configuration_id
 
 ########## SSH Web Terminal
 SSH_WEB_TERMINAL = "/api/terminal"
+SSH_WEB_TERMINAL_SESSIONS = "/api/terminal/sessions"
+SSH_WEB_TERMINAL_WATCH = "/api/terminal/sessions/{session_id:str}/watch"
+SSH_WEB_TERMINAL_RECORDING = "/api/terminal/recordings/{session_id:str}"
@@ -8,12 +8,16 @@ from redis.asyncio import Redis
 
 from app.lib import constants, settings
 
-__all__ = ["cache_key_builder", "on_shutdown"]
+__all__ = ["cache_key_builder", "on_shutdown", "prune_hash", "prune_sorted_set"]
 
 
 if TYPE_CHECKING:
+    from collections.abc import Container
+
     from litestar.connection import Request
 
+PRUNE_BATCH_SIZE = 1000
+
 
 redis = Redis.from_url(  # type:ignore[call-overload]
     url=settings.redis.URL,
@@ -50,6 +54,28 @@ def cache_key_builder(request: Request) -> str:
     return f"{settings.app.slug}:{default_cache_key_builder(request)}"
 
 
+def _decode(member: bytes | str) -> str:
+    return member.decode() if isinstance(member, bytes) else member
+
+
+async def prune_hash(client: Redis, key: str, keep: Container[str]) -> int:
+    """Delete the fields of a hash that are not in ``keep``, returns the amount of deleted fields."""
+    stale = [field async for field, _ in client.hscan_iter(key, count=PRUNE_BATCH_SIZE) if _decode(field) not in keep]
+    for n in range(0, len(stale), PRUNE_BATCH_SIZE):
+        await client.hdel(key, *stale[n : n + PRUNE_BATCH_SIZE])
+    return len(stale)
+
+
+async def prune_sorted_set(client: Redis, key: str, keep: Container[str]) -> int:
+    """Delete the members of a sorted set that are not in ``keep``, returns the amount of deleted members."""
+    stale = [
+        member async for member, _ in client.zscan_iter(key, count=PRUNE_BATCH_SIZE) if _decode(member) not in keep
+    ]
+    for n in range(0, len(stale), PRUNE_BATCH_SIZE):
+        await client.zrem(key, *stale[n : n + PRUNE_BATCH_SIZE])
+    return len(stale)
+
+
 def redis_store_factory(name: str) -> RedisStore:
     return RedisStore(redis, namespace=f"{settings.app.slug}:{name}")
 
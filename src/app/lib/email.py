@@ -1,14 +1,224 @@
 from __future__ import annotations
 
-from typing import Any
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from email.encoders import encode_base64
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formatdate, make_msgid
+from typing import TYPE_CHECKING, Any
 
-from fastapi_mail import ConnectionConfig, FastMail, MessageSchema, MessageType
+import aiosmtplib
+from fastapi_mail import ConnectionConfig, FastMail, MessageSchema, MessageType, MultipartSubtypeEnum
+from fastapi_mail.fastmail import email_dispatched
 
-from app.lib import settings
+from app.lib import log, settings
 
-mail_system = FastMail(ConnectionConfig(**settings.email.model_dump()))
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Iterable
 
-__all__ = ["send_email"]
+    from jinja2 import Environment, Template
+
+mail_system = FastMail(ConnectionConfig(**settings.email.model_dump(exclude={"MAIL_POOL_SIZE", "MAIL_KEEPALIVE"})))
+
+__all__ = ["MailSender", "mail_sender", "on_worker_shutdown", "send_email"]
+
+
+logger = log.get_logger()
+
+
+class _PooledConnection:
+    def __init__(self, smtp: aiosmtplib.SMTP) -> None:
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+
+
+class MailSender:
+    """Send mails over a pool of authenticated SMTP connections.
+
+    Connections are opened on first use and kept open between messages. A connection idle
+    for longer than ``keepalive`` seconds is checked with a NOOP before it is used, and a
+    connection the server dropped is replaced by a new one. Templates are compiled once
+    per sender.
+
+    Messages are built here from the fields of the ``MessageSchema``, the same MIME layout
+    fastapi_mail builds, so nothing depends on its private message builder.
+
+    Every worker process has its own sender, see ``mail_sender``.
+    """
+
+    def __init__(
+        self,
+        config: ConnectionConfig,
+        pool_size: int | None = None,
+        keepalive: float | None = None,
+    ) -> None:
+        self.config = config
+        self.pool_size = pool_size or settings.email.MAIL_POOL_SIZE
+        self.keepalive = keepalive if keepalive is not None else settings.email.MAIL_KEEPALIVE
+        self._pool: asyncio.Queue[_PooledConnection | None] | None = None
+        self._template_env: Environment | None = None
+
+    @property
+    def pool(self) -> asyncio.Queue[_PooledConnection | None]:
+        if self._pool is None:
+            self._pool = asyncio.Queue()
+            for _ in range(self.pool_size):
+                self._pool.put_nowait(None)
+        return self._pool
+
+    def template(self, template_name: str) -> Template:
+        """Return a compiled template, jinja keeps the compiled templates of an environment cached."""
+        if self._template_env is None:
+            self._template_env = self.config.template_engine()
+        return self._template_env.get_template(template_name)
+
+    async def _connect(self) -> _PooledConnection:
+        smtp = aiosmtplib.SMTP(
+            hostname=self.config.MAIL_SERVER,
+            port=self.config.MAIL_PORT,
+            timeout=self.config.TIMEOUT,
+            use_tls=self.config.MAIL_SSL_TLS,
+            start_tls=self.config.MAIL_STARTTLS,
+            validate_certs=self.config.VALIDATE_CERTS,
+        )
+        await smtp.connect()
+        if self.config.USE_CREDENTIALS and self.config.MAIL_USERNAME:
+            await smtp.login(self.config.MAIL_USERNAME, self.config.MAIL_PASSWORD)
+        return _PooledConnection(smtp)
+
+    async def _checked(self, connection: _PooledConnection | None) -> _PooledConnection:
+        if connection is not None and connection.smtp.is_connected:
+            if time.monotonic() - connection.last_used < self.keepalive:
+                return connection
+            try:
+                await connection.smtp.noop()
+            except aiosmtplib.SMTPException:
+                connection.smtp.close()
+            else:
+                return connection
+        return await self._connect()
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[aiosmtplib.SMTP]:
+        """Borrow a connected SMTP client from the pool, waiting when all of them are in use.
+
+        A connection that raised, or whose use was cancelled, is closed instead of returned to
+        the pool: it may be dropped, or halfway a transaction the next message can not continue.
+        """
+        pooled = await self.pool.get()
+        try:
+            pooled = await self._checked(pooled)
+            yield pooled.smtp
+            pooled.last_used = time.monotonic()
+        except BaseException:
+            if pooled is not None:
+                pooled.smtp.close()
+            pooled = None
+            raise
+        finally:
+            self.pool.put_nowait(pooled)
+
+    def _render(self, message: MessageSchema, template_name: str | None) -> str | None:
+        if not (template_name and message.template_body is not None):
+            return message.body if isinstance(message.body, str) else None
+        template = self.template(template_name)
+        if isinstance(message.template_body, list):
+            return template.render({"body": message.template_body})
+        if not isinstance(message.template_body, dict):
+            msg = (
+                f"Unable to build the template data from a {type(message.template_body).__name__}, pass a dict or list"
+            )
+            raise TypeError(msg)
+        return template.render(**message.template_body)
+
+    @staticmethod
+    async def _attachment(file: Any, meta: dict[str, Any] | None) -> MIMEBase:
+        meta = meta or {}
+        if "mime_type" in meta and "mime_subtype" in meta:
+            part = MIMEBase(meta["mime_type"], meta["mime_subtype"])
+        else:
+            part = MIMEBase("application", "octet-stream")
+        part.set_payload(await file.read())
+        encode_base64(part)
+        await file.close()
+        for name, value in meta.get("headers", {}).items():
+            part.add_header(name, value)
+        if not part.get("Content-Disposition"):
+            part.add_header("Content-Disposition", "attachment", filename=("UTF8", "", file.filename))
+        return part
+
+    async def _build(self, message: MessageSchema, template_name: str | None) -> MIMEMultipart:
+        body = self._render(message, template_name)
+        msg = MIMEMultipart(message.multipart_subtype.value)
+        msg.set_charset(message.charset)
+        if body:
+            msg.attach(MIMEText(body, _subtype=message.subtype.value, _charset=message.charset))
+        if message.alternative_body is not None and message.multipart_subtype == MultipartSubtypeEnum.alternative:
+            flipped = "html" if message.subtype == MessageType.plain else "plain"
+            msg.attach(MIMEText(message.alternative_body, _subtype=flipped, _charset=message.charset))
+            related = MIMEMultipart(MultipartSubtypeEnum.related.value)
+            related.set_charset(message.charset)
+            related.attach(msg)
+            msg = related
+
+        sender = self.config.MAIL_FROM
+        if self.config.MAIL_FROM_NAME is not None:
+            sender = f"{self.config.MAIL_FROM_NAME} <{self.config.MAIL_FROM}>"
+        msg["Date"] = formatdate(time.time(), localtime=True)
+        msg["Message-ID"] = make_msgid()
+        msg["To"] = ", ".join(message.recipients)
+        msg["From"] = sender
+        if message.subject:
+            msg["Subject"] = message.subject
+        for header, addresses in (("Cc", message.cc), ("Bcc", message.bcc), ("Reply-To", message.reply_to)):
+            if addresses:
+                msg[header] = ", ".join(addresses)
+        for file, meta in message.attachments:
+            msg.attach(await self._attachment(file, meta))
+        for name, value in (message.headers or {}).items():
+            msg.add_header(name, value)
+        return msg
+
+    async def send_message(self, message: MessageSchema, template_name: str | None = None) -> None:
+        """Send one message, retrying once on a fresh connection when the server dropped the connection."""
+        msg = await self._build(message, template_name)
+        if not self.config.SUPPRESS_SEND:
+            try:
+                async with self.connection() as smtp:
+                    await smtp.send_message(msg)
+            except aiosmtplib.SMTPServerDisconnected:
+                async with self.connection() as smtp:
+                    await smtp.send_message(msg)
+        email_dispatched.send(msg)
+
+    async def send_many(self, messages: Iterable[MessageSchema], template_name: str | None = None) -> None:
+        """Send a batch of messages concurrently over the pool."""
+        await asyncio.gather(*(self.send_message(message, template_name) for message in messages))
+
+    async def close(self) -> None:
+        """Close every open connection of the pool."""
+        if self._pool is None:
+            return
+        while not self._pool.empty():
+            pooled = self._pool.get_nowait()
+            if pooled is not None and pooled.smtp.is_connected:
+                try:
+                    await pooled.smtp.quit()
+                except aiosmtplib.SMTPException:
+                    pooled.smtp.close()
+        self._pool = None
+
+
+mail_sender = MailSender(mail_system.config)
+"""The mail sender of this (worker) process."""
+
+
+async def on_worker_shutdown(_: Any) -> None:
+    """Close the SMTP connections of the worker."""
+    await mail_sender.close()
 
 
 async def send_email(
@@ -45,7 +255,5 @@ async def send_email(
         attachments=attachments,
         template_body=template_body,
     )
-    if template_body and template_name:
-        await mail_system.send_message(message, template_name=template_name)
-    await mail_system.send_message(message)
+    await mail_sender.send_message(message, template_name=template_name if template_body else None)
     return True
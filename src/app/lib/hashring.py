@@ -0,0 +1,52 @@
+"""Consistent hashing of keys over a set of nodes."""
+from __future__ import annotations
+
+import bisect
+import hashlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+__all__ = ["HashRing"]
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Map keys on nodes so that adding or removing a node only moves the keys of that node.
+
+    Every node is placed on the ring ``replicas`` times, which spreads the keys evenly.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = 100) -> None:
+        self.replicas = replicas
+        self._points: list[int] = []
+        self._nodes: list[str] = []
+        for node in nodes:
+            self.add(node)
+
+    def __len__(self) -> int:
+        return len(set(self._nodes))
+
+    def add(self, node: str) -> None:
+        for replica in range(self.replicas):
+            point = _hash(f"{node}#{replica}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._nodes.insert(index, node)
+
+    def remove(self, node: str) -> None:
+        keep = [(point, owner) for point, owner in zip(self._points, self._nodes, strict=True) if owner != node]
+        self._points = [point for point, _ in keep]
+        self._nodes = [owner for _, owner in keep]
+
+    def node_for(self, key: str) -> str:
+        """Return the node owning ``key``: the first node clockwise from the hash of the key."""
+        if not self._points:
+            msg = "The hash ring has no nodes"
+            raise LookupError(msg)
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._nodes[index]
@@ -1,9 +1,115 @@
-from collections.abc import Callable
-from typing import Any
+"""ICMP ping backends.
+
+The ping jobs get their pinger from ``create_backend``, which returns the backend of
+``settings.ping.BACKEND``:
+
+* ``gufo``: real ICMP echo requests through ``gufo.ping``;
+* ``simulated``: a seeded model of a network, to test and benchmark the ping subsystem at
+  fleet scale without real hosts, see ``SimulatedNetwork``.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import random
+from typing import TYPE_CHECKING, Any, Protocol
 
 from gufo.ping import Ping
 
-__all__ = ["ping", "retry_with_backoff"]
+from app.lib import settings
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+__all__ = ["PingBackend", "SimulatedNetwork", "SimulatedPing", "create_backend", "ping", "retry_with_backoff"]
+
+
+class PingBackend(Protocol):
+    async def ping(self, addr: str) -> float | None:
+        """Return the round trip time in seconds, or ``None`` when the address did not answer in time."""
+        ...
+
+
+class SimulatedNetwork:
+    """A seeded loss and latency model of a network of hosts.
+
+    Every address gets a fixed profile from the seed: a fraction ``down`` of the hosts never
+    answers, the others have a base latency drawn from a log-normal distribution around
+    ``latency`` seconds. Every probe of a host that is up is lost with chance ``loss``, and gets
+    normally distributed ``jitter`` on top of its base latency. The same seed gives the same
+    hosts, in every process.
+    """
+
+    def __init__(
+        self,
+        seed: int = 0,
+        down: float = 0.02,
+        loss: float = 0.01,
+        latency: float = 0.02,
+        jitter: float = 0.005,
+    ) -> None:
+        self.seed = seed
+        self.down = down
+        self.loss = loss
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._hosts: dict[str, float | None] = {}
+
+    def base_latency(self, addr: str) -> float | None:
+        """The latency of a host, ``None`` when it is down."""
+        if addr not in self._hosts:
+            digest = hashlib.blake2b(f"{self.seed}:{addr}".encode(), digest_size=8).digest()
+            host = random.Random(int.from_bytes(digest, "big"))
+            self._hosts[addr] = None if host.random() < self.down else host.lognormvariate(0, 0.5) * self.latency
+        return self._hosts[addr]
+
+    def probe(self, addr: str) -> float | None:
+        """The round trip time of one probe, ``None`` when it is lost."""
+        base = self.base_latency(addr)
+        if base is None or self._random.random() < self.loss:
+            return None
+        return max(base + self._random.gauss(0, self.jitter), base / 10)
+
+
+class SimulatedPing:
+    """A ``PingBackend`` on a ``SimulatedNetwork``, taking as long as the probe it simulates."""
+
+    def __init__(self, network: SimulatedNetwork, timeout: float = 1.0) -> None:
+        self.network = network
+        self.timeout = timeout
+
+    async def ping(self, addr: str) -> float | None:
+        rtt = self.network.probe(addr)
+        if rtt is None or rtt > self.timeout:
+            await asyncio.sleep(self.timeout)
+            return None
+        await asyncio.sleep(rtt)
+        return rtt
+
+
+_network: SimulatedNetwork | None = None
+
+
+def simulated_network() -> SimulatedNetwork:
+    """The simulated network of this process, modelled after the ``settings.ping.SIMULATED_*`` settings."""
+    global _network  # noqa: PLW0603
+    if _network is None:
+        _network = SimulatedNetwork(
+            seed=settings.ping.SIMULATED_SEED,
+            down=settings.ping.SIMULATED_DOWN,
+            loss=settings.ping.SIMULATED_LOSS,
+            latency=settings.ping.SIMULATED_LATENCY,
+            jitter=settings.ping.SIMULATED_JITTER,
+        )
+    return _network
+
+
+def create_backend(size: int = 64, timeout: float = 1.0) -> PingBackend:
+    """Create a pinger of the configured backend."""
+    if settings.ping.BACKEND == "simulated":
+        return SimulatedPing(simulated_network(), timeout=timeout)
+    return Ping(size=size, timeout=timeout)
 
 
 def retry_with_backoff(retries: int = 3, initial_timeout: int = 1) -> Any:
@@ -27,9 +133,8 @@ def retry_with_backoff(retries: int = 3, initial_timeout: int = 1) -> Any:
 
 
 @retry_with_backoff(retries=2)  # type: ignore[misc]
-async def ping(timeout: int = 1) -> bool:
-    ping = Ping(timeout=timeout)
-    r = await ping.ping("10.1.1.142")
+async def ping(address: str, timeout: int = 1) -> bool:
+    r = await create_backend(timeout=timeout).ping(address)
     if not r:
         msg = "Destination Unreachable"
         raise TimeoutError(msg)
@@ -0,0 +1,108 @@
+"""Counting semaphores shared by every worker through Redis.
+
+Every semaphore is a sorted set of the tokens holding it, scored by the moment their lease
+runs out. Acquiring removes the expired leases and adds a token when the set has room, so a
+worker that dies while holding a slot only blocks it until its lease runs out. Several
+semaphores are acquired together in one Lua script: all of them or none, so a job waiting on
+a full semaphore never sits on a slot of another one.
+"""
+from __future__ import annotations
+
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING
+from uuid import uuid4
+
+from anyio import CancelScope, sleep
+
+from app.lib.cache import redis
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+    from redis.asyncio import Redis
+
+__all__ = ["RedisSemaphore"]
+
+
+ACQUIRE = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local token, lease = ARGV[1], tonumber(ARGV[2])
+for index, key in ipairs(KEYS) do
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now)
+    if redis.call('ZCARD', key) >= tonumber(ARGV[index + 2]) then
+        return 0
+    end
+end
+for _, key in ipairs(KEYS) do
+    redis.call('ZADD', key, now + lease, token)
+    redis.call('EXPIRE', key, math.ceil(lease))
+end
+return 1
+"""
+
+
+class RedisSemaphore:
+    """Counting semaphores in Redis, acquired and released together.
+
+    Args:
+        limits: Redis key of every semaphore with the amount of slots it has.
+        lease: seconds after which a slot that was not released frees up.
+        client: Redis client, the one of the app by default.
+        poll: maximal seconds between two attempts to acquire.
+    """
+
+    def __init__(self, limits: dict[str, int], lease: float, client: Redis | None = None, poll: float = 1.0) -> None:
+        self.limits = limits
+        self.lease = lease
+        self.redis = client or redis
+        self.poll = poll
+        self._acquire = self.redis.register_script(ACQUIRE)
+
+    async def try_acquire(self) -> str | None:
+        """Take a slot of every semaphore, returns the token holding them or None when one of them is full."""
+        token = uuid4().hex
+        acquired = await self._acquire(keys=list(self.limits), args=[token, self.lease, *self.limits.values()])
+        return token if acquired else None
+
+    async def acquire(self, timeout: float | None = None) -> str:
+        """Wait for a slot of every semaphore, returns the token holding them.
+
+        Raises:
+            TimeoutError: when no slots were free within ``timeout`` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = self.poll / 16
+        while (token := await self.try_acquire()) is None:
+            if deadline is not None and time.monotonic() + delay > deadline:
+                msg = f"No free slot in {', '.join(self.limits)} within {timeout} seconds"
+                raise TimeoutError(msg)
+            # jitter keeps the waiting jobs from polling in lockstep
+            await sleep(delay * random.uniform(0.5, 1.5))  # noqa: S311
+            delay = min(delay * 2, self.poll)
+        return token
+
+    async def release(self, token: str) -> None:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in self.limits:
+                pipe.zrem(key, token)
+            await pipe.execute()
+
+    async def holders(self) -> dict[str, int]:
+        """Amount of slots in use of every semaphore, expired leases included."""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in self.limits:
+                pipe.zcard(key)
+            return dict(zip(self.limits, await pipe.execute(), strict=True))
+
+    @asynccontextmanager
+    async def hold(self, timeout: float | None = None) -> AsyncIterator[str]:
+        token = await self.acquire(timeout)
+        try:
+            yield token
+        finally:
+            # release even when the holder is cancelled, instead of blocking the slots until the lease runs out
+            with CancelScope(shield=True):
+                await self.release(token)
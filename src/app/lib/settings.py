@@ -27,6 +27,8 @@ __all__ = [
     "ServerSettings",
     "EmailSettings",
     "TscmSettings",
+    "PingSettings",
+    "ReadoutSettings",
     "app",
     "db",
     "openapi",
@@ -36,6 +38,8 @@ __all__ = [
     "worker",
     "email",
     "tscm",
+    "ping",
+    "readout",
     "elasticsearch",
     "elasticsearch_session",
 ]
@@ -259,6 +263,8 @@ class WorkerSettings(BaseSettings):
     """
     WEB_ENABLED: bool = True
     """If true, the worker admin UI is launched on worker startup.."""
+    PROCESSES: int = 1
+    """The number of worker processes to start per node."""
 
 
 class DatabaseSettings(BaseSettings):
@@ -340,6 +346,10 @@ class EmailSettings(BaseSettings):
     MAIL_FROM: EmailStr = "test@email.com"
     TEMPLATE_FOLDER: DirectoryPath | None = Path(__file__).parent / "templates"
     SUPPRESS_SEND: conint(gt=-1, lt=2) = 0  # type: ignore
+    MAIL_POOL_SIZE: int = 4
+    """Amount of SMTP connections a worker keeps open."""
+    MAIL_KEEPALIVE: float = 30.0
+    """Seconds a pooled SMTP connection may be idle before it is checked with a NOOP."""
 
 
 class TscmSettings(BaseSettings):
@@ -354,6 +364,204 @@ class TscmSettings(BaseSettings):
 
     MINIMUM_CONFIG_AGE: int = 2
     MAXIMUM_CONFIG_AGE: int = 29
+    CONFIG_DIR: Path = Path("/home/donnyio/git/configstore/kpnvpn")
+    """Directory holding the latest config of every device, one file per device_id."""
+    CONFIG_SEARCH_INDEX: Path = Path.home() / ".cache" / DEFAULT_MODULE_NAME / "config_search_index.msgpack"
+    """On-disk location of the trigram index used by the config search."""
+    CONFIG_SEARCH_MAX_RESULTS: int = 1000
+    """Maximum amount of devices returned by a single config search."""
+    CONFIG_SEARCH_MAX_PATTERN_LENGTH: int = 256
+    """Maximum length of the substring or regex of a config search."""
+    SWEEP_CHUNK_SIZE: int = 250
+    """Amount of devices handled by a single job of a check sweep."""
+    SWEEP_TIMEOUT: int = 600
+    """Seconds a chunk of a check sweep may take before it is aborted, it then counts as a failed chunk."""
+    SWEEP_RESULT_TTL: int = 3600
+    """Seconds the partial results of a check sweep are kept for late websocket subscribers."""
+    SWEEP_IDLE_TIMEOUT: int = 300
+    """Seconds the stream of a check sweep waits for its next event before it gives up."""
+    DRY_RUN_SAMPLE_SIZE: int = 200
+    """Amount of configs a new or changed check is dry run against."""
+    MAX_CHECK_FLEET_RUNTIME: float = 60.0
+    """Seconds a single check may add to the nightly run, estimated by the dry run. Slower checks are rejected."""
+    DRY_RUN_STARTUP_GRACE: float = 5.0
+    """Seconds a dry run may take on top of MAX_CHECK_FLEET_RUNTIME, for starting its worker process."""
+    RUN_SHARDS: int = 32
+    """Amount of shards (SAQ jobs, each with its own checkpoint) the devices of a fleet run are hashed over."""
+    RUN_SHARD_TIMEOUT: int = 1800
+    """Seconds a single shard of a fleet run may take. Unfinished shards are picked up by a resume."""
+    RUN_SHARD_MAX_ATTEMPTS: int = 3
+    """Times a shard of a fleet run is enqueued before it is given up and its devices count as errors."""
+    RUN_COORDINATOR_TIMEOUT: int = 300
+    """Seconds the coordinator job of a fleet run may take to plan the run and enqueue its shards."""
+    RUN_FAN_IN_TIMEOUT: int = 60
+    """Seconds the fan-in job of a fleet run may take to merge the shard summaries."""
+    RUN_RECORD_TTL: int = 604800
+    """Seconds the record and checkpoints of a fleet run are kept."""
+    DIGEST_RECIPIENTS: dict[str, list[str]] = {}
+    """Recipients of the TSCM digest per business service. Every set of recipients gets its own digest."""
+    DIGEST_DEFAULT_RECIPIENTS: list[str] = ["test@test.nl", "sjaakie@sjaakie.nl"]
+    """Recipients of the TSCM digest for the business services without recipients of their own."""
+    DIGEST_TIMEOUT: int = 300
+    """Seconds the job sending the digests of a run may take."""
+
+
+class PingSettings(BaseSettings):
+    """Settings of the ICMP sweeps that keep the online status of the cpe's up to date."""
+
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        env_file_encoding="utf-8",
+        env_prefix="PING_",
+        case_sensitive=False,
+    )
+
+    BACKEND: Literal["gufo", "simulated"] = "gufo"
+    """The ping backend, ``simulated`` pings a seeded model of a network instead of real hosts, see ``app.lib.ping``."""
+    SIMULATED_SEED: int = 0
+    """Seed of the simulated network."""
+    SIMULATED_DOWN: float = 0.02
+    """Fraction of the hosts of the simulated network that never answer."""
+    SIMULATED_LOSS: float = 0.01
+    """Chance a probe of a host of the simulated network is lost."""
+    SIMULATED_LATENCY: float = 0.02
+    """Median round trip time in seconds of the hosts of the simulated network."""
+    SIMULATED_JITTER: float = 0.005
+    """Standard deviation in seconds of the round trip times of a host of the simulated network."""
+    MAX_IN_FLIGHT: int = 1000
+    """Amount of probes a single ping job keeps in flight over its (one) ICMP socket."""
+    SIZE: int = 64
+    """Size in bytes of the ICMP echo requests."""
+    TIMEOUT: float = 1.0
+    """Seconds to wait for the first echo reply of a destination."""
+    RETRIES: int = 2
+    """Amount of times a destination that did not answer is pinged again, doubling the timeout every time."""
+    BATCH_SIZE: int = 5000
+    """Amount of cpe's read from the database (and pinged) at a time by a sweep."""
+    RACE_DELAY: float = 0.25
+    """Seconds the secondary management address of a cpe is pinged after the first one, when neither answered yet."""
+    TCP_PORTS: list[int] = [22, 830, 443]
+    """Ports probed with a TCP connect next to the ICMP ping, an empty list disables the TCP probes."""
+    TCP_TIMEOUT: float = 2.0
+    """Seconds to wait on a TCP connect."""
+    TCP_MAX_IN_FLIGHT: int = 500
+    """Amount of TCP connects a single ping job keeps in flight."""
+    MANAGEMENT_PORT: int = 22
+    """The port readouts connect to, a cpe of which the last probe found it closed is skipped."""
+    INTERVAL: int = 60
+    """Seconds between the sweeps (the ping_cpes cron), the probe interval of cpe's that are flapping."""
+    ADAPTIVE: bool = True
+    """Probe the cpe's at a rate depending on their state, see ``app.domain.cpe.ping_schedule``."""
+    FLAP_WINDOW: int = 900
+    """Seconds after a change of the online status during which a cpe is probed every sweep, and in which flaps are counted."""
+    STABLE_INTERVAL: int = 300
+    """Seconds between the probes of a stable online cpe."""
+    OFFLINE_MAX_INTERVAL: int = 3600
+    """Maximal seconds between the probes of an offline cpe, its interval doubles every probe up to this."""
+    DOWN_THRESHOLD: int = 3
+    """Amount of unanswered probes in a row before an online cpe goes offline, see ``app.domain.cpe.flap_detection``."""
+    UP_THRESHOLD: int = 2
+    """Amount of answered probes in a row before an offline cpe goes online."""
+    FLAP_THRESHOLD: int = 4
+    """Amount of status changes within the flap window from which a cpe is flapping."""
+    FLAP_DAMPING: int = 3
+    """Factor on the up and down thresholds of a flapping cpe."""
+    SAMPLE_PARTITIONS_AHEAD: int = 2
+    """Amount of days ahead for which the daily partitions of the ping samples are created."""
+    SAMPLE_RETENTION_DAYS: int = 7
+    """Days the raw ping samples are kept, older partitions are dropped."""
+    MINUTE_ROLLUP_RETENTION_DAYS: int = 30
+    """Days the 1m rollups of the ping samples are kept."""
+    HOUR_ROLLUP_RETENTION_DAYS: int = 365
+    """Days the 1h rollups of the ping samples are kept, the 1d rollups are kept forever."""
+    HISTORY_MAX_POINTS: int = 1000
+    """Maximal amount of points the latency history api returns."""
+    REACHABILITY_CACHE_TTL: float = 5.0
+    """Seconds a process keeps the reachability of a cpe read from Redis."""
+    REACHABILITY_CACHE_SIZE: int = 200_000
+    """Maximal amount of cpe's in the in-process reachability cache."""
+
+
+class ReadoutSettings(BaseSettings):
+    """Settings of the SSH connections to the cpe's: the readouts and the web terminal."""
+
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        env_file_encoding="utf-8",
+        env_prefix="READOUT_",
+        case_sensitive=False,
+    )
+
+    CHUNK_SIZE: int = 50
+    """Amount of devices handled by a single job of a fleet readout."""
+    MAX_CONCURRENCY: int = 200
+    """Maximal amount of readouts running at the same time, over all workers."""
+    VENDOR_CONCURRENCY: dict[str, int] = {}
+    """Maximal amount of readouts running at the same time per vendor, over all workers."""
+    DEFAULT_VENDOR_CONCURRENCY: int = 50
+    """Maximal amount of readouts running at the same time of a vendor without its own limit."""
+    DEVICE_TIMEOUT: int = 120
+    """Seconds a single readout may take, it also is the lease of its concurrency slots."""
+    QUEUE_TIMEOUT: int = 3600
+    """Seconds a readout may wait for a concurrency slot before it counts as failed."""
+    RUN_RECORD_TTL: int = 604800
+    """Seconds the record, progress and failures of a fleet readout are kept."""
+    RUN_COORDINATOR_TIMEOUT: int = 300
+    """Seconds the coordinator job of a fleet readout may take to select the devices and enqueue the chunks."""
+    CHUNK_TIMEOUT_MARGIN: int = 60
+    """Seconds a chunk job of a fleet readout may take on top of the queue and device timeout of its readouts."""
+    COALESCE_WINDOW: int = 60
+    """Seconds after a readout of a device completed in which a new readout request of it gets that readout."""
+    JOB_POLL_INTERVAL: float = 1.0
+    """Seconds between reads of a readout job that is waited for, in case the notification of its end was missed."""
+    STORE_CONFIG: bool = True
+    """Write the running config of a readout into the config store, ``settings.tscm.CONFIG_DIR``."""
+    TSCM_ON_CONFIG_CHANGE: bool = False
+    """Run the TSCM checks of a device when a readout stored a changed config of it."""
+    PARSE_PROCESSES: int = 4
+    """Maximal amount of worker processes of a worker parsing command output at the same time."""
+    PARSE_CACHE_TTL: int = 86400
+    """Seconds a parsed command output is cached."""
+    PARSE_WITH_GENIE: bool = True
+    """Parse the output of commands without a parser of their own with genie, when it is installed."""
+    SSH_USERNAME: str | None = None
+    """Username of the SSH connections of the web terminal, the web terminal refuses to connect without it."""
+    SSH_PASSWORD: str | None = None
+    """Password of the SSH connections of the web terminal, the web terminal refuses to connect without it."""
+    SSH_CONNECT_TIMEOUT: float = 10.0
+    """Seconds an SSH connection may take to open."""
+    SSH_POOL_MAX_PER_HOST: int = 2
+    """Maximal amount of open SSH connections of a worker to a single cpe."""
+    SSH_POOL_IDLE_TIMEOUT: float = 300.0
+    """Seconds an unused pooled SSH connection is kept open."""
+    SSH_POOL_KEEPALIVE: float = 30.0
+    """Seconds a pooled SSH connection may be idle before it is checked, also the interval of its keepalives."""
+    TERMINAL_CONNECT_TIMEOUT: float = 15.0
+    """Seconds a web terminal session waits for an SSH connection to its cpe, before it is closed with an error.
+
+    A session holds its pooled connection while it runs, so with ``SSH_POOL_MAX_PER_HOST`` sessions
+    to a cpe the next one waits for one of them to end.
+    """
+    TERMINAL_READ_SIZE: int = 65536
+    """Maximal amount of characters the web terminal reads from its SSH session at once."""
+    TERMINAL_FLUSH_SIZE: int = 32768
+    """Amount of buffered output of the web terminal that is sent to the browser right away."""
+    TERMINAL_FLUSH_INTERVAL: float = 0.02
+    """Seconds the web terminal buffers output before it is sent to the browser."""
+    TERMINAL_RECORDING: bool = True
+    """Record the sessions of the web terminal."""
+    TERMINAL_RECORD_INPUT: bool = False
+    """Also record the input of the sessions, which may contain passwords."""
+    TERMINAL_RECORDING_DIR: Path = Path.home() / ".cache" / DEFAULT_MODULE_NAME / "terminal-recordings"
+    """Directory of the compressed recordings of the web terminal sessions."""
+    TERMINAL_RECORDING_LEVEL: int = 3
+    """zstd compression level of the recordings."""
+    TERMINAL_RECORDING_RETENTION_DAYS: int = 90
+    """Days a recording is kept after its session ended, older ones are deleted by the hourly maintenance."""
+    TERMINAL_REPLAY_CHUNK_SIZE: int = 65536
+    """Amount of bytes of a recording that is sent at once by its replay."""
+    TERMINAL_SESSION_TTL: int = 600
+    """Seconds a live session stays listed for its viewers after its last input or output."""
 
 
 class ElasticSearchSettings(BaseSettings):
@@ -385,6 +593,8 @@ def load_settings() -> (
         WorkerSettings,
         EmailSettings,
         TscmSettings,
+        PingSettings,
+        ReadoutSettings,
         ElasticSearchSettings,
         AsyncElasticsearch,
     ]
@@ -437,6 +647,8 @@ def load_settings() -> (
         EmailSettings.model_rebuild()
         email: EmailSettings = EmailSettings()
         tscm: TscmSettings = TscmSettings()
+        ping: PingSettings = PingSettings()
+        readout: ReadoutSettings = ReadoutSettings()
         elasticsearch: ElasticSearchSettings = ElasticSearchSettings()
 
         elasticsearch_session: AsyncElasticsearch = AsyncElasticsearch(
@@ -448,7 +660,21 @@ def load_settings() -> (
     except ValidationError as e:
         print("Could not load settings.", e)  # noqa: T201
         raise
-    return (app, redis, db, openapi, server, log, worker, email, tscm, elasticsearch, elasticsearch_session)
+    return (
+        app,
+        redis,
+        db,
+        openapi,
+        server,
+        log,
+        worker,
+        email,
+        tscm,
+        ping,
+        readout,
+        elasticsearch,
+        elasticsearch_session,
+    )
 
 
 (
@@ -461,6 +687,8 @@ def load_settings() -> (
     worker,
     email,
     tscm,
+    ping,
+    readout,
     elasticsearch,
     elasticsearch_session,
 ) = load_settings()
@@ -0,0 +1,183 @@
+"""Pooled SSH connections to the cpe's.
+
+Opening an SSH connection to a cpe (TCP handshake, key exchange, authentication) often takes
+over a second on the slow CPU of a cpe. Every process keeps the connections it opened in a pool
+keyed by host and credentials, so the next readout or terminal session to the same cpe skips
+the handshake.
+
+A connection idle for longer than ``settings.readout.SSH_POOL_KEEPALIVE`` seconds is checked
+before it is used again, or replaced by a new one when there is no check for its kind of
+connection. Connections idle for longer than ``settings.readout.SSH_POOL_IDLE_TIMEOUT``
+seconds are closed, and every host has at most ``settings.readout.SSH_POOL_MAX_PER_HOST``
+connections open: the sessions over them take turns.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import asynccontextmanager, suppress
+from typing import TYPE_CHECKING, Any
+
+import asyncssh
+
+from app.lib import log, settings
+from app.lib.exceptions import ApplicationError
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Callable, Hashable
+    from contextlib import AbstractAsyncContextManager
+
+__all__ = ["SSHPool", "on_worker_shutdown", "ssh_connection", "ssh_pool"]
+
+
+logger = log.get_logger()
+
+
+class _PooledConnection:
+    def __init__(self, context: AbstractAsyncContextManager[Any], connection: Any) -> None:
+        self.context = context
+        self.connection = connection
+        self.last_used = time.monotonic()
+
+
+class _HostPool:
+    def __init__(self, size: int) -> None:
+        self.slots = asyncio.Semaphore(size)
+        self.idle: list[_PooledConnection] = []
+        self.users = 0
+        """Amount of tasks holding or waiting for a slot."""
+
+
+class SSHPool:
+    """A pool of open connections per key, see the module docstring.
+
+    Any connection that is opened and closed by an async context manager can be pooled: the
+    context manager is entered when the connection is opened and exited when it is closed. A
+    connection is handed out to one user at a time, and closed instead of returned to the pool
+    when its user raised.
+
+    Every worker process has its own pool, see ``ssh_pool``.
+    """
+
+    def __init__(
+        self,
+        max_per_host: int | None = None,
+        idle_timeout: float | None = None,
+        keepalive: float | None = None,
+    ) -> None:
+        self.max_per_host = max_per_host or settings.readout.SSH_POOL_MAX_PER_HOST
+        self.idle_timeout = idle_timeout if idle_timeout is not None else settings.readout.SSH_POOL_IDLE_TIMEOUT
+        self.keepalive = keepalive if keepalive is not None else settings.readout.SSH_POOL_KEEPALIVE
+        self.opened = 0
+        self.reused = 0
+        self._hosts: dict[Hashable, _HostPool] = {}
+
+    async def _close(self, pooled: _PooledConnection) -> None:
+        # a cpe that stopped answering must not keep the worker waiting on a clean close
+        with suppress(Exception):
+            await asyncio.wait_for(pooled.context.__aexit__(None, None, None), timeout=5)
+
+    async def _expire(self) -> None:
+        # collect first and close after: other tasks add hosts while the closes are awaited
+        now = time.monotonic()
+        expired: list[_PooledConnection] = []
+        for key, host_pool in list(self._hosts.items()):
+            expired.extend(pooled for pooled in host_pool.idle if now - pooled.last_used > self.idle_timeout)
+            host_pool.idle = [pooled for pooled in host_pool.idle if now - pooled.last_used <= self.idle_timeout]
+            # a host without connections or users is dropped, instead of keeping one per cpe ever contacted
+            if not host_pool.idle and not host_pool.users:
+                del self._hosts[key]
+        for pooled in expired:
+            await self._close(pooled)
+
+    async def _checked(
+        self,
+        pooled: _PooledConnection | None,
+        connect: Callable[[], AbstractAsyncContextManager[Any]],
+        alive: Callable[[Any], bool] | None,
+    ) -> _PooledConnection:
+        if pooled is not None:
+            if time.monotonic() - pooled.last_used < self.keepalive or (alive is not None and alive(pooled.connection)):
+                self.reused += 1
+                return pooled
+            await self._close(pooled)
+        context = connect()
+        connection = await context.__aenter__()
+        self.opened += 1
+        return _PooledConnection(context, connection)
+
+    @asynccontextmanager
+    async def connection(
+        self,
+        key: Hashable,
+        connect: Callable[[], AbstractAsyncContextManager[Any]],
+        alive: Callable[[Any], bool] | None = None,
+    ) -> AsyncIterator[Any]:
+        """Borrow a connection of ``key``, opening one with ``connect`` when none is idle.
+
+        Waits when ``max_per_host`` connections of ``key`` are in use. ``alive`` tells whether a
+        connection that was idle for a while can be used again.
+        """
+        await self._expire()
+        host_pool = self._hosts.setdefault(key, _HostPool(self.max_per_host))
+        host_pool.users += 1
+        try:
+            async with host_pool.slots:
+                pooled = await self._checked(host_pool.idle.pop() if host_pool.idle else None, connect, alive)
+                try:
+                    yield pooled.connection
+                except BaseException:
+                    await self._close(pooled)
+                    raise
+                pooled.last_used = time.monotonic()
+                host_pool.idle.append(pooled)
+        finally:
+            host_pool.users -= 1
+
+    async def close(self) -> None:
+        """Close every idle connection of the pool."""
+        hosts, self._hosts = self._hosts, {}
+        idle = [pooled for host_pool in hosts.values() for pooled in host_pool.idle]
+        for host_pool in hosts.values():
+            host_pool.idle = []
+        for pooled in idle:
+            await self._close(pooled)
+
+
+ssh_pool = SSHPool()
+"""The SSH connections of this (worker) process."""
+
+
+def ssh_connection(
+    host: str,
+    username: str | None = None,
+    password: str | None = None,
+) -> AbstractAsyncContextManager[asyncssh.SSHClientConnection]:
+    """Borrow an asyncssh connection to ``host`` from the pool, logging in with the configured credentials by default.
+
+    Raises:
+        ApplicationError: when no credentials are given and none are configured.
+    """
+    username = username or settings.readout.SSH_USERNAME
+    password = password or settings.readout.SSH_PASSWORD
+    if not (username and password):
+        msg = "No SSH credentials, set READOUT_SSH_USERNAME and READOUT_SSH_PASSWORD"
+        raise ApplicationError(msg)
+    return ssh_pool.connection(
+        ("asyncssh", host, username, password),
+        lambda: asyncssh.connect(
+            host,
+            username=username,
+            password=password,
+            known_hosts=None,
+            connect_timeout=settings.readout.SSH_CONNECT_TIMEOUT,
+            # a cpe that stops answering the keepalives closes the connection, which the health check sees
+            keepalive_interval=settings.readout.SSH_POOL_KEEPALIVE,
+        ),
+        alive=lambda connection: not connection.is_closed(),
+    )
+
+
+async def on_worker_shutdown(_: Any) -> None:
+    """Close the SSH connections of the worker."""
+    await ssh_pool.close()
@@ -0,0 +1,245 @@
+"""Trigram index for fast substring and regex searches over text documents.
+
+Every document is broken up in lowercase trigrams. A query is turned into the
+trigrams it *must* contain, the posting lists of those trigrams are intersected
+and only the remaining candidates are matched line by line.
+
+Patterns are matched with RE2, which runs in linear time: a user supplied regex can not
+backtrack for minutes over a large config. RE2 has no backreferences and lookarounds, such
+patterns are rejected as invalid.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from re import _constants as sre_constants  # type: ignore[attr-defined]
+from re import _parser as sre_parse  # type: ignore[attr-defined]
+from typing import TYPE_CHECKING, Any
+
+import re2
+
+from app.lib import serialization
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+    from pathlib import Path
+
+__all__ = ["TrigramIndex", "TrigramMatch", "compile_pattern", "trigrams", "required_literals"]
+
+INDEX_VERSION = 1
+
+
+def trigrams(text: str) -> set[str]:
+    """Return the set of lowercase trigrams in ``text``."""
+    text = text.lower()
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def required_literals(pattern: str, flags: int = 0) -> list[str]:
+    """Return literal strings that every match of ``pattern`` must contain.
+
+    Literals are collected from the top level sequence of the regex and from plain groups
+    in it. Anything else (classes, repeats, anchors, ...) ends the current literal run. When
+    the pattern branches at the top level nothing is required and an empty list is
+    returned, which makes every document a candidate.
+    """
+    parsed = sre_parse.parse(pattern, flags)
+    if any(op is sre_constants.BRANCH for op, _ in parsed):
+        return []
+    literals: list[str] = []
+    run = _collect_literals(parsed, literals, [])
+    literals.append("".join(run))
+    return [literal for literal in literals if len(literal) >= 3]
+
+
+def compile_pattern(pattern: str, ignore_case: bool = False) -> Any:
+    """Compile ``pattern`` with RE2.
+
+    Raises:
+        re.error: ``pattern`` is not a valid RE2 regular expression.
+    """
+    options = re2.Options()
+    options.case_sensitive = not ignore_case
+    options.log_errors = False
+    try:
+        return re2.compile(pattern, options)
+    except re2.error as exc:
+        detail = exc.args[0].decode() if exc.args and isinstance(exc.args[0], bytes) else str(exc)
+        raise re.error(detail, pattern) from exc
+
+
+def _collect_literals(parsed: Any, literals: list[str], run: list[str]) -> list[str]:
+    for op, value in parsed:
+        if op is sre_constants.LITERAL:
+            run.append(chr(value))
+        elif op is sre_constants.SUBPATTERN and not any(sub_op is sre_constants.BRANCH for sub_op, _ in value[-1]):
+            run = _collect_literals(value[-1], literals, run)
+        else:
+            literals.append("".join(run))
+            run = []
+    return run
+
+
+@dataclass
+class TrigramMatch:
+    document_id: str
+    line_numbers: list[int] = field(default_factory=list)
+
+
+class TrigramIndex:
+    """In-memory trigram index which can be persisted to and loaded from disk.
+
+    Documents are identified by a string id (the device_id for configs) and carry a
+    ``version`` token (e.g. ``mtime_ns:size`` of the file) so the index can be refreshed
+    incrementally.
+    """
+
+    def __init__(self) -> None:
+        self._postings: dict[str, set[str]] = {}
+        self._document_trigrams: dict[str, set[str]] = {}
+        self.versions: dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.versions)
+
+    def __contains__(self, document_id: object) -> bool:
+        return document_id in self.versions
+
+    def add(self, document_id: str, text: str, version: str = "") -> None:
+        """Add or replace a document in the index."""
+        if document_id in self.versions:
+            self.remove(document_id)
+        document_trigrams = trigrams(text)
+        for trigram in document_trigrams:
+            self._postings.setdefault(trigram, set()).add(document_id)
+        self._document_trigrams[document_id] = document_trigrams
+        self.versions[document_id] = version
+
+    def remove(self, document_id: str) -> None:
+        """Remove a document from the index, unknown documents are ignored."""
+        for trigram in self._document_trigrams.pop(document_id, set()):
+            postings = self._postings.get(trigram)
+            if postings is None:
+                continue
+            postings.discard(document_id)
+            if not postings:
+                del self._postings[trigram]
+        self.versions.pop(document_id, None)
+
+    def candidates(self, literals: Iterable[str]) -> set[str]:
+        """Return the documents that contain all trigrams of all ``literals``."""
+        required = set().union(*(trigrams(literal) for literal in literals))
+        if not required:
+            return set(self.versions)
+        # intersect the smallest posting lists first
+        postings = sorted((self._postings.get(trigram, set()) for trigram in required), key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            if not result:
+                break
+            result &= posting
+        return result
+
+    def search(
+        self,
+        pattern: str,
+        reader: Callable[[str], str | None],
+        regex: bool = False,
+        ignore_case: bool = False,
+        limit: int | None = None,
+    ) -> list[TrigramMatch]:
+        """Search the indexed documents.
+
+        Args:
+            pattern: substring or regular expression to search for.
+            reader: returns the current text of a document, ``None`` when it is gone.
+            regex: treat ``pattern`` as a regular expression.
+            ignore_case: match case insensitive.
+            limit: maximum amount of matching documents to return.
+
+        Returns:
+            The matching documents, sorted by id, with the (1-based) matching line numbers.
+
+        Raises:
+            re.error: ``pattern`` is not a valid regular expression.
+        """
+        compiled, candidates = self.prepare(pattern, regex=regex, ignore_case=ignore_case)
+        return self.match(compiled, candidates, reader, limit=limit)
+
+    def prepare(
+        self,
+        pattern: str,
+        regex: bool = False,
+        ignore_case: bool = False,
+    ) -> tuple[Any, list[str]]:
+        """Compile a search and select the documents that can match it, sorted by id.
+
+        Only this step needs the index, :meth:`match` reads the documents without it.
+
+        Raises:
+            re.error: ``pattern`` is not a valid regular expression.
+        """
+        flags = re.IGNORECASE if ignore_case else 0
+        if not regex:
+            pattern = re.escape(pattern)
+        compiled = compile_pattern(pattern, ignore_case=ignore_case)
+        return compiled, sorted(self.candidates(required_literals(pattern, flags)))
+
+    @staticmethod
+    def match(
+        compiled: Any,
+        candidates: Iterable[str],
+        reader: Callable[[str], str | None],
+        limit: int | None = None,
+    ) -> list[TrigramMatch]:
+        """Match the candidate documents of :meth:`prepare` line by line."""
+        matches: list[TrigramMatch] = []
+        for document_id in candidates:
+            text = reader(document_id)
+            if text is None:
+                continue
+            line_numbers = [
+                line_number for line_number, line in enumerate(text.splitlines(), 1) if compiled.search(line)
+            ]
+            if line_numbers:
+                matches.append(TrigramMatch(document_id=document_id, line_numbers=line_numbers))
+                if limit is not None and len(matches) >= limit:
+                    break
+        return matches
+
+    def dump(self, path: Path) -> None:
+        """Persist the index to ``path``.
+
+        Documents are stored once and referenced by position from the posting lists.
+        """
+        document_ids = list(self.versions)
+        positions = {document_id: position for position, document_id in enumerate(document_ids)}
+        payload = {
+            "version": INDEX_VERSION,
+            "documents": [[document_id, self.versions[document_id]] for document_id in document_ids],
+            "postings": {
+                trigram: [positions[document_id] for document_id in postings]
+                for trigram, postings in self._postings.items()
+            },
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f"{path.suffix}.tmp")
+        tmp_path.write_bytes(serialization.to_msgpack(payload))
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> TrigramIndex:
+        """Load an index written by :meth:`dump`, an outdated format results in an empty index."""
+        index = cls()
+        payload = serialization.from_msgpack(path.read_bytes())
+        if payload.get("version") != INDEX_VERSION:
+            return index
+        document_ids = [document_id for document_id, _ in payload["documents"]]
+        index.versions = dict(payload["documents"])
+        index._document_trigrams = {document_id: set() for document_id in document_ids}
+        for trigram, positions in payload["postings"].items():
+            postings = {document_ids[position] for position in positions}
+            index._postings[trigram] = postings
+            for document_id in postings:
+                index._document_trigrams[document_id].add(trigram)
+        return index
@@ -2,17 +2,21 @@ from __future__ import annotations
 
 import asyncio
 import datetime
+import os
 import re
+import sys
 from typing import TYPE_CHECKING, Any
 from unittest.mock import MagicMock
 
 import pytest
 from litestar.testing import TestClient
+from redis.asyncio import Redis
 from structlog.contextvars import clear_contextvars
 from structlog.testing import CapturingLogger
 
 from app.domain.tscm.tscm import CpeTscmCheck, TscmExportReport
 from app.lib import settings
+from tests.docker_service import DockerServiceRegistry, redis_responsive
 
 if TYPE_CHECKING:
     from collections import abc
@@ -67,6 +71,42 @@ def pytest_addoption(parser: pytest.Parser) -> None:
     )
 
 
+@pytest.fixture(scope="session")
+def docker_services() -> Generator[DockerServiceRegistry, None, None]:
+    if sys.platform not in ("linux", "darwin") or os.environ.get("SKIP_DOCKER_TESTS"):
+        pytest.skip("Docker not available on this platform")
+
+    registry = DockerServiceRegistry()
+    try:
+        yield registry
+    finally:
+        registry.down()
+
+
+@pytest.fixture(scope="session")
+def docker_ip(docker_services: DockerServiceRegistry) -> str:
+    return docker_services.docker_ip
+
+
+@pytest.fixture()
+async def redis_service(docker_services: DockerServiceRegistry) -> None:
+    await docker_services.start("redis", check=redis_responsive)
+
+
+@pytest.fixture(name="redis")
+async def fx_redis(docker_ip: str, redis_service: None) -> Redis:
+    """Redis instance for testing.
+
+    Args:
+        docker_ip: IP of docker host.
+        redis_service: docker service
+
+    Returns:
+        Redis client instance, function scoped.
+    """
+    return Redis(host=docker_ip, port=6397)
+
+
 @pytest.fixture(name="app")
 def fx_app(pytestconfig: pytest.Config, monkeypatch: MonkeyPatch) -> Litestar:
     """Returns:
@@ -1,6 +1,4 @@
-import os
-import sys
-from collections.abc import AsyncIterator, Generator
+from collections.abc import AsyncIterator
 from pathlib import Path
 from typing import Any
 
@@ -22,39 +20,17 @@ from app.domain.security import auth
 from app.domain.teams.models import Team
 from app.domain.tscm.models import TSCMCheck, TSCMCheckResult
 from app.lib import db
-from tests.docker_service import DockerServiceRegistry, postgres_responsive, redis_responsive
+from tests.docker_service import DockerServiceRegistry, postgres_responsive
 
 here = Path(__file__).parent
 pytestmark = pytest.mark.anyio
 
 
-@pytest.fixture(scope="session")
-def docker_services() -> Generator[DockerServiceRegistry, None, None]:
-    if sys.platform not in ("linux", "darwin") or os.environ.get("SKIP_DOCKER_TESTS"):
-        pytest.skip("Docker not available on this platform")
-
-    registry = DockerServiceRegistry()
-    try:
-        yield registry
-    finally:
-        registry.down()
-
-
-@pytest.fixture(scope="session")
-def docker_ip(docker_services: DockerServiceRegistry) -> str:
-    return docker_services.docker_ip
-
-
 @pytest.fixture()
 async def postgres_service(docker_services: DockerServiceRegistry) -> None:
     await docker_services.start("postgres", check=postgres_responsive)
 
 
-@pytest.fixture()
-async def redis_service(docker_services: DockerServiceRegistry) -> None:
-    await docker_services.start("redis", check=redis_responsive)
-
-
 @pytest.fixture(name="engine")
 async def fx_engine(docker_ip: str, postgres_service: None, redis_service: None) -> AsyncEngine:  # noqa: D417
     """Postgresql instance for end-to-end testing.
@@ -191,20 +167,6 @@ def _patch_db(
     )
 
 
-@pytest.fixture(name="redis")
-async def fx_redis(docker_ip: str, redis_service: None) -> Redis:
-    """Redis instance for testing.
-
-    Args:
-        docker_ip: IP of docker host.
-        redis_service: docker service
-
-    Returns:
-        Redis client instance, function scoped.
-    """
-    return Redis(host=docker_ip, port=6397)
-
-
 @pytest.fixture(autouse=True)
 def _patch_redis(app: "Litestar", redis: Redis, monkeypatch: pytest.MonkeyPatch) -> None:
     cache_config = app.response_cache_config
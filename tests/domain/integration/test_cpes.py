@@ -65,3 +65,5 @@ async def test_cpe_readout(client: "AsyncClient", superuser_token_headers: dict[
         headers=superuser_token_headers,
     )
     assert response.status_code == 201
+    # the readout job is returned, not the cpe
+    assert {"key", "status", "coalesced"} <= response.json().keys()
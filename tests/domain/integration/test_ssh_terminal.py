@@ -17,10 +17,23 @@ async def test_ssh_terminal(app, superuser_token_headers: dict[str, str]) -> Non
         base_url="http://0.0.0.0:8000",
         headers=superuser_token_headers,
     ) as client:
-        async with aconnect_ws("/api/terminal", client) as ws:
+        async with aconnect_ws("/api/terminal?device_id=TESM1233", client) as ws:
             await ws.send_text("df -h")
             # anyio.from_thread.start_blocking_portal("asyncio")  bug in lib pull request is done but not new release yet
             data = await ws.send_text("df -h")
             message = await ws.receive_text()
             print(message)
             await ws.send_text("Hello!")
+
+
+async def test_terminal_sessions_need_superuser(
+    client: "AsyncClient",
+    superuser_token_headers: dict[str, str],
+    user_token_headers: dict[str, str],
+) -> None:
+    response = await client.get("/api/terminal/sessions", headers=user_token_headers)
+    assert response.status_code == 403
+    response = await client.get(f"/api/terminal/recordings/{'0' * 32}", headers=user_token_headers)
+    assert response.status_code == 403
+    response = await client.get("/api/terminal/sessions", headers=superuser_token_headers)
+    assert response.status_code == 200
@@ -0,0 +1,70 @@
+from typing import TYPE_CHECKING, Any
+
+import pytest
+
+from app.domain.cpe.flap_detection import FlapDetector, LinkState
+from app.lib import settings
+
+if TYPE_CHECKING:
+    from pytest import MonkeyPatch
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def _thresholds(monkeypatch: "MonkeyPatch") -> None:
+    monkeypatch.setattr(settings.ping, "DOWN_THRESHOLD", 3)
+    monkeypatch.setattr(settings.ping, "UP_THRESHOLD", 2)
+    monkeypatch.setattr(settings.ping, "FLAP_THRESHOLD", 4)
+    monkeypatch.setattr(settings.ping, "FLAP_DAMPING", 3)
+    monkeypatch.setattr(settings.ping, "FLAP_WINDOW", 900)
+
+
+def test_link_state_debounces() -> None:
+    state = LinkState(online=True)
+
+    # a single answer in between resets the count
+    assert not any(state.observe(answered, now) for now, answered in enumerate([False, False, True, False, False]))
+    assert state.online
+    assert state.observe(answered=False, now=5)
+    assert not state.online
+    assert not state.observe(answered=True, now=6)
+    assert state.observe(answered=True, now=7)
+    assert state.online
+
+
+def test_link_state_dampens_flapping() -> None:
+    state = LinkState(online=True, transitions=[0, 1, 2, 3])
+    assert state.flapping
+
+    assert not any(state.observe(answered=False, now=10 + n) for n in range(8))
+    assert state.observe(answered=False, now=18)
+    assert not state.online
+
+    # after the flap window the normal thresholds apply again
+    state = LinkState(online=True, transitions=[0, 1, 2, 3])
+    assert not state.observe(answered=False, now=1000)
+    assert not state.observe(answered=False, now=1001)
+    assert state.observe(answered=False, now=1002)
+    assert state.transitions == [1002]
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.hash: dict[str, Any] = {}
+
+    async def hmget(self, key: str, fields: list[str]) -> list[Any]:
+        return [self.hash.get(field) for field in fields]
+
+    async def hset(self, key: str, mapping: dict[str, Any]) -> None:
+        self.hash.update(mapping)
+
+
+async def test_flap_detector_only_returns_debounced_transitions() -> None:
+    detector = FlapDetector(FakeRedis())  # type: ignore[arg-type]
+
+    assert await detector.observe({"up": (True, False), "down": (False, True)}, now=0) == {}
+    assert await detector.observe({"up": (True, False), "down": (False, True)}, now=60) == {"down": True}
+    assert await detector.observe({"up": (True, False), "down": (True, True)}, now=120) == {"up": False}
+    # a status changed by hand resets the state machine
+    assert await detector.observe({"up": (True, False)}, now=180) == {}
@@ -0,0 +1,143 @@
+from typing import TYPE_CHECKING, Any
+from uuid import uuid4
+
+import pytest
+from anyio import move_on_after, sleep
+
+from app.domain import plugins
+from app.domain.cpe import fleet_readout
+from app.domain.cpe.fleet_readout import (
+    ReadoutFilter,
+    _management_ip,
+    fleet_readout_chunk,
+    get_readout_run,
+    readout_failures,
+    readout_semaphore,
+    start_fleet_readout,
+)
+from app.lib import settings
+from app.lib.semaphore import RedisSemaphore
+
+if TYPE_CHECKING:
+    from pytest import MonkeyPatch
+    from redis.asyncio import Redis
+
+pytestmark = pytest.mark.anyio
+
+
+def test_management_ip() -> None:
+    target = {"mgmt_ip": "10.0.0.1", "sec_mgmt_ip": "10.0.1.1", "reachable_ip": "10.0.1.1"}
+    assert _management_ip(target) == "10.0.1.1"
+    assert _management_ip({**target, "reachable_ip": None}) == "10.0.0.1"
+    # an address that is no management address (anymore) is not used
+    assert _management_ip({**target, "reachable_ip": "10.0.2.1"}) == "10.0.0.1"
+
+
+def test_readout_semaphore_limits(monkeypatch: "MonkeyPatch") -> None:
+    monkeypatch.setattr(settings.readout, "MAX_CONCURRENCY", 100)
+    monkeypatch.setattr(settings.readout, "VENDOR_CONCURRENCY", {"CISCO": 10})
+    monkeypatch.setattr(settings.readout, "DEFAULT_VENDOR_CONCURRENCY", 5)
+
+    assert list(readout_semaphore("CISCO").limits.values()) == [100, 10]
+    assert list(readout_semaphore("JUNIPER").limits.values()) == [100, 5]
+    assert readout_semaphore("CISCO").limits.keys() != readout_semaphore("JUNIPER").limits.keys()
+
+
+class FakeQueue:
+    """Records the enqueued jobs, the test runs them."""
+
+    def __init__(self) -> None:
+        self.enqueued: list[tuple[str, dict[str, Any]]] = []
+
+    async def enqueue(self, function: str, **kwargs: Any) -> None:
+        self.enqueued.append((function, kwargs))
+
+    def chunks(self) -> list[dict[str, Any]]:
+        return [kwargs for function, kwargs in self.enqueued if function == "fleet_readout_chunk"]
+
+
+@pytest.fixture(name="queue")
+def fx_queue(redis: "Redis", monkeypatch: "MonkeyPatch") -> FakeQueue:
+    """A run of three reachable devices in chunks of two, and one skipped device."""
+    queue = FakeQueue()
+    prefix = uuid4().hex
+
+    async def select_targets(filters: ReadoutFilter) -> tuple[list[dict[str, Any]], int]:
+        targets = [
+            {"device_id": f"TESM{n:04}", "ip": f"10.0.0.{n}", "os": "cisco_ios", "vendor": "CISCO"} for n in range(3)
+        ]
+        return targets, 1
+
+    monkeypatch.setattr(fleet_readout, "redis", redis)
+    monkeypatch.setattr(plugins.saq, "get_queue", lambda _: queue)
+    monkeypatch.setattr(fleet_readout, "_select_targets", select_targets)
+    monkeypatch.setattr(
+        fleet_readout,
+        "readout_semaphore",
+        lambda _: RedisSemaphore({f"{prefix}:slots": 10}, lease=60, client=redis),
+    )
+    monkeypatch.setattr(settings.readout, "CHUNK_SIZE", 2)
+    return queue
+
+
+async def test_fleet_readout_completes(queue: FakeQueue, monkeypatch: "MonkeyPatch") -> None:
+    async def readout_device(ip: str, os: str, device_id: str | None = None) -> dict:
+        if device_id == "TESM0001":
+            msg = "refused"
+            raise ConnectionError(msg)
+        return {}
+
+    monkeypatch.setattr(fleet_readout, "readout_device", readout_device)
+    run = await start_fleet_readout()
+    assert [function for function, _ in queue.enqueued] == ["fleet_readout"]
+    await fleet_readout.fleet_readout({}, run_id=run.run_id)
+
+    chunks = queue.chunks()
+    assert [len(chunk["targets"]) for chunk in chunks] == [2, 1]
+    running = await get_readout_run(run.run_id)
+    assert running is not None
+    assert (running.status, running.devices, running.chunks, running.skipped) == ("running", 4, 2, 1)
+
+    await fleet_readout_chunk({}, run_id=run.run_id, targets=chunks[0]["targets"])
+    running = await get_readout_run(run.run_id)
+    assert running is not None
+    assert (running.status, running.completed_chunks, running.succeeded, running.failed) == ("running", 1, 1, 1)
+
+    await fleet_readout_chunk({}, run_id=run.run_id, targets=chunks[1]["targets"])
+    completed = await get_readout_run(run.run_id)
+    assert completed is not None
+    assert (completed.status, completed.completed_chunks, completed.succeeded, completed.failed) == (
+        "completed",
+        2,
+        2,
+        1,
+    )
+    assert completed.finished is not None
+    assert await readout_failures(run.run_id) == {"TESM0001": "ConnectionError: refused"}
+
+
+async def test_timed_out_chunk_completes_run(queue: FakeQueue, monkeypatch: "MonkeyPatch") -> None:
+    async def readout_device(ip: str, os: str, device_id: str | None = None) -> dict:
+        if device_id == "TESM0002":
+            await sleep(3600)
+        return {}
+
+    monkeypatch.setattr(fleet_readout, "readout_device", readout_device)
+    run = await start_fleet_readout()
+    await fleet_readout.fleet_readout({}, run_id=run.run_id)
+    chunks = queue.chunks()
+
+    await fleet_readout_chunk({}, run_id=run.run_id, targets=chunks[0]["targets"])
+    # the job of the last chunk is cancelled, as SAQ does when it runs out of time
+    with move_on_after(0.5):
+        await fleet_readout_chunk({}, run_id=run.run_id, targets=chunks[1]["targets"])
+
+    completed = await get_readout_run(run.run_id)
+    assert completed is not None
+    assert (completed.status, completed.completed_chunks, completed.succeeded, completed.failed) == (
+        "completed",
+        2,
+        2,
+        1,
+    )
+    assert list(await readout_failures(run.run_id)) == ["TESM0002"]
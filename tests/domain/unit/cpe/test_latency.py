@@ -0,0 +1,56 @@
+import datetime
+from typing import TYPE_CHECKING
+
+import pytest
+
+from app.domain.cpe import latency
+from app.lib import settings
+
+if TYPE_CHECKING:
+    from pytest import MonkeyPatch
+
+NOW = datetime.datetime(2023, 10, 19, 12, 34, 56, tzinfo=datetime.UTC)
+
+
+@pytest.fixture(autouse=True)
+def _retention(monkeypatch: "MonkeyPatch") -> None:
+    monkeypatch.setattr(settings.ping, "SAMPLE_RETENTION_DAYS", 7)
+    monkeypatch.setattr(settings.ping, "MINUTE_ROLLUP_RETENTION_DAYS", 30)
+    monkeypatch.setattr(settings.ping, "HOUR_ROLLUP_RETENTION_DAYS", 365)
+
+
+def test_truncate() -> None:
+    assert latency._truncate(NOW, datetime.timedelta(minutes=1)) == NOW.replace(second=0)
+    assert latency._truncate(NOW, datetime.timedelta(hours=1)) == NOW.replace(minute=0, second=0)
+    assert latency._truncate(NOW, datetime.timedelta(days=1)) == NOW.replace(hour=0, minute=0, second=0)
+
+
+def test_partition_bounds() -> None:
+    assert latency._partition_bounds(NOW.date()) == ("2023-10-19 00:00:00+00", "2023-10-20 00:00:00+00")
+    assert latency._partition_bounds(datetime.date(2023, 12, 31)) == (
+        "2023-12-31 00:00:00+00",
+        "2024-01-01 00:00:00+00",
+    )
+
+
+@pytest.mark.parametrize(
+    ("days", "points", "resolution"),
+    [
+        (0.1, 300, "raw"),
+        (1, 300, "1m"),
+        (0.5, 1000, "raw"),
+        (20, 300, "1h"),
+        (400, 300, "1d"),
+    ],
+)
+def test_pick_resolution_by_step(days: float, points: int, resolution: str) -> None:
+    span = datetime.timedelta(days=days)
+    assert latency._pick_resolution(NOW - span, span / points, NOW) == resolution
+
+
+def test_pick_resolution_skips_expired_sources() -> None:
+    start = NOW - datetime.timedelta(days=40)
+    # a day 40 days ago would be read from the 1m rollups, which are only kept for 30 days
+    assert latency._pick_resolution(start, datetime.timedelta(days=1) / 300, NOW) == "1h"
+    start = NOW - datetime.timedelta(days=400)
+    assert latency._pick_resolution(start, datetime.timedelta(seconds=1), NOW) == "1d"
@@ -0,0 +1,64 @@
+from typing import TYPE_CHECKING, Any
+
+import pytest
+
+from app.domain.cpe import parsers
+from app.domain.cpe.parsers import get_parser, parse_outputs, register_parser, show_ip_interface_brief
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+
+pytestmark = pytest.mark.anyio
+
+SHOW_IP_INT_BRIEF = """Interface              IP-Address      OK? Method Status                Protocol
+GigabitEthernet0/0     10.1.1.142      YES NVRAM  up                    up
+GigabitEthernet0/1     unassigned      YES unset  administratively down down
+"""
+
+
+@register_parser("show clock")
+def show_clock(output: str) -> dict[str, Any]:
+    return {"clock": output.strip()}
+
+
+def test_show_ip_interface_brief() -> None:
+    assert show_ip_interface_brief(SHOW_IP_INT_BRIEF) == {
+        "interface": {
+            "GigabitEthernet0/0": {
+                "ip_address": "10.1.1.142",
+                "interface_is_ok": "YES",
+                "method": "NVRAM",
+                "status": "up",
+                "protocol": "up",
+            },
+            "GigabitEthernet0/1": {
+                "ip_address": "unassigned",
+                "interface_is_ok": "YES",
+                "method": "unset",
+                "status": "administratively down",
+                "protocol": "down",
+            },
+        },
+    }
+
+
+def test_get_parser(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(parsers.settings.readout, "PARSE_WITH_GENIE", False)
+
+    assert get_parser("iosxe", "show  ip int brief") is show_ip_interface_brief
+    assert get_parser("hvrp", "show ip int brief") is None
+    # a parser registered without an os parses the command on every os
+    assert get_parser("hvrp", "show clock") is show_clock
+
+
+async def test_parse_outputs_cached(redis: "Redis", monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(parsers, "redis", redis)
+    monkeypatch.setattr(parsers.settings.readout, "PARSE_WITH_GENIE", False)
+    outputs = {"copy run start\n": "[OK]", "show ip int brief": SHOW_IP_INT_BRIEF, "show clock": "12:00:00"}
+
+    parsed = await parse_outputs("iosxe", outputs)
+
+    assert parsed.keys() == {"show ip int brief", "show clock"}
+    assert parsed["show clock"] == {"clock": "12:00:00"}
+    assert len(await redis.keys(f"{parsers.settings.app.slug}:parsed-output:*")) == 2
+    assert await parse_outputs("iosxe", outputs) == parsed
@@ -0,0 +1,160 @@
+import asyncio
+from typing import TYPE_CHECKING, Any
+
+import anyio
+import anyio.abc
+import pytest
+
+from app.domain.cpe import business_logic_ping
+from app.lib import settings
+
+if TYPE_CHECKING:
+    from pytest import MonkeyPatch
+
+pytestmark = pytest.mark.anyio
+
+
+class FakePing:
+    """Answers addresses ending in an even number, and those ending in 1 only with a timeout of 4s or more.
+
+    Addresses that are no IPv4 address raise, like a real socket does.
+    """
+
+    instances: list["FakePing"] = []
+
+    def __init__(self, timeout: float = 1.0, **kwargs: Any) -> None:
+        self.timeout = timeout
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.probes: list[str] = []
+        FakePing.instances.append(self)
+
+    async def ping(self, addr: str) -> float | None:
+        self.probes.append(addr)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if not addr.replace(".", "").isdigit():
+            msg = f"invalid address {addr}"
+            raise OSError(msg)
+        last = int(addr.rsplit(".", 1)[1])
+        return 0.01 if last % 2 == 0 or (last % 10 == 1 and self.timeout >= 4) else None
+
+
+@pytest.fixture(autouse=True)
+def _fake_ping(monkeypatch: "MonkeyPatch") -> None:
+    monkeypatch.setattr(business_logic_ping, "create_backend", FakePing)
+    monkeypatch.setattr(settings.ping, "TIMEOUT", 1.0)
+    monkeypatch.setattr(settings.ping, "RETRIES", 2)
+    monkeypatch.setattr(settings.ping, "RACE_DELAY", 0.05)
+    monkeypatch.setattr(settings.ping, "TCP_PORTS", [])
+    FakePing.instances = []
+
+
+async def test_ping_keeps_probes_in_flight(monkeypatch: "MonkeyPatch") -> None:
+    monkeypatch.setattr(settings.ping, "MAX_IN_FLIGHT", 50)
+    destinations = {f"TESM{n:04}": [f"10.1.{n // 250}.{n % 250}"] for n in range(500)}
+
+    await business_logic_ping._ping("ctx", destinations=destinations)
+
+    assert max(ping.max_in_flight for ping in FakePing.instances) <= 50
+    assert FakePing.instances[0].max_in_flight == 50
+
+
+async def test_ping_retries_with_exponential_timeouts() -> None:
+    destinations = {"10.1.1.2": ["10.1.1.2"], "10.1.1.11": ["10.1.1.11"], "10.1.1.13": ["10.1.1.13"]}
+
+    results = await business_logic_ping._ping("ctx", destinations=destinations)
+
+    assert sorted(results) == [
+        ("10.1.1.11", "10.1.1.11", 0.01, None),
+        ("10.1.1.13", None, None, None),
+        ("10.1.1.2", "10.1.1.2", 0.01, None),
+    ]
+    assert [ping.timeout for ping in FakePing.instances] == [1.0, 2.0, 4.0]
+    assert [sorted(ping.probes) for ping in FakePing.instances] == [
+        ["10.1.1.11", "10.1.1.13", "10.1.1.2"],
+        ["10.1.1.11", "10.1.1.13"],
+        ["10.1.1.11", "10.1.1.13"],
+    ]
+
+
+async def test_ping_races_the_management_addresses() -> None:
+    destinations = {
+        "10.1.1.3": ["10.1.1.3", "10.1.2.4"],
+        "10.1.1.6": ["10.1.1.6", "10.1.2.8"],
+        "10.1.1.5": ["10.1.1.5", "10.1.2.7"],
+    }
+
+    results = await business_logic_ping._ping("ctx", destinations=destinations)
+
+    assert sorted(results) == [
+        ("10.1.1.3", "10.1.2.4", 0.01, None),
+        ("10.1.1.5", None, None, None),
+        ("10.1.1.6", "10.1.1.6", 0.01, None),
+    ]
+    # the secondary address of a cpe answering on its first one is never pinged
+    assert "10.1.2.8" not in FakePing.instances[0].probes
+
+
+async def test_ping_survives_a_failing_probe() -> None:
+    destinations = {"TESM1233": ["10.1.1.2"], "TESM1234": ["not-an-address"], "TESM1235": ["10.1.1.13"]}
+
+    results = await business_logic_ping._ping("ctx", destinations=destinations)
+
+    assert sorted(results) == [
+        ("TESM1233", "10.1.1.2", 0.01, None),
+        ("TESM1234", None, None, None),
+        ("TESM1235", None, None, None),
+    ]
+
+
+async def test_ping_cpes_sharing_an_address() -> None:
+    destinations = {"TESM1233": ["10.1.1.2"], "TESM1234": ["10.1.1.2"]}
+
+    results = await business_logic_ping._ping("ctx", destinations=destinations)
+
+    assert sorted(results) == [("TESM1233", "10.1.1.2", 0.01, None), ("TESM1234", "10.1.1.2", 0.01, None)]
+
+
+async def test_ping_probes_tcp_ports(monkeypatch: "MonkeyPatch") -> None:
+    # 127.0.0.3 never answers ICMP, but accepts connects on one port
+    listener = await anyio.create_tcp_listener(local_host="127.0.0.3")
+    closed = await anyio.create_tcp_listener(local_host="127.0.0.3")
+    open_port = listener.extra(anyio.abc.SocketAttribute.local_port)
+    closed_port = closed.extra(anyio.abc.SocketAttribute.local_port)
+    await closed.aclose()
+    monkeypatch.setattr(settings.ping, "TCP_PORTS", [closed_port, open_port])
+    monkeypatch.setattr(settings.ping, "TCP_TIMEOUT", 1.0)
+
+    async with listener:
+        results = await business_logic_ping._ping(
+            "ctx",
+            destinations={"127.0.0.3": ["127.0.0.3"], "127.0.0.2": ["127.0.0.2"]},
+        )
+
+    assert sorted(results) == [
+        ("127.0.0.2", "127.0.0.2", 0.01, []),
+        ("127.0.0.3", "127.0.0.3", None, [open_port]),
+    ]
+
+
+def test_addresses_prefer_the_reachable_ip() -> None:
+    cpe = {"mgmt_ip": "10.1.1.1", "sec_mgmt_ip": "10.1.2.1", "reachable_ip": None}
+
+    assert business_logic_ping._addresses(cpe) == ["10.1.1.1", "10.1.2.1"]
+    assert business_logic_ping._addresses(cpe | {"reachable_ip": "10.1.2.1"}) == ["10.1.2.1", "10.1.1.1"]
+    assert business_logic_ping._addresses(cpe | {"sec_mgmt_ip": None}) == ["10.1.1.1"]
+    assert business_logic_ping._addresses(cpe | {"mgmt_ip": "", "sec_mgmt_ip": None}) == []
+
+
+def test_job_timeout(monkeypatch: "MonkeyPatch") -> None:
+    monkeypatch.setattr(settings.ping, "MAX_IN_FLIGHT", 1000)
+    monkeypatch.setattr(settings.ping, "RACE_DELAY", 0.5)
+    monkeypatch.setattr(settings.ping, "TCP_PORTS", [22, 830])
+    monkeypatch.setattr(settings.ping, "TCP_MAX_IN_FLIGHT", 4000)
+    monkeypatch.setattr(settings.ping, "TCP_TIMEOUT", 2.0)
+
+    assert business_logic_ping._job_timeout(1000) == 8 + 2 + 10
+    assert business_logic_ping._job_timeout(1001) == 15 + 4 + 10
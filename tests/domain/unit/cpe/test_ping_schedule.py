@@ -0,0 +1,113 @@
+from typing import TYPE_CHECKING, Any
+
+import pytest
+
+from app.domain.cpe.ping_schedule import PingSchedule, ProbeState, next_interval
+from app.lib import settings
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+    from pytest import MonkeyPatch
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeRedis:
+    """The sorted set and hash commands used by the schedule, kept in dicts."""
+
+    def __init__(self) -> None:
+        self.zsets: dict[str, dict[str, float]] = {}
+        self.hashes: dict[str, dict[str, Any]] = {}
+
+    async def zmscore(self, key: str, members: list[str]) -> list[float | None]:
+        return [self.zsets.get(key, {}).get(member) for member in members]
+
+    async def hmget(self, key: str, fields: list[str]) -> list[Any]:
+        return [self.hashes.get(key, {}).get(field) for field in fields]
+
+    def pipeline(self, transaction: bool = True) -> "FakeRedis":
+        return self
+
+    async def __aenter__(self) -> "FakeRedis":
+        return self
+
+    async def __aexit__(self, *args: object) -> None:
+        return None
+
+    def zadd(self, key: str, mapping: dict[str, float]) -> None:
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    def hset(self, key: str, mapping: dict[str, Any]) -> None:
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    async def execute(self) -> None:
+        return None
+
+    async def zscan_iter(self, key: str, count: int | None = None) -> "AsyncIterator[tuple[str, float]]":
+        for item in list(self.zsets.get(key, {}).items()):
+            yield item
+
+    async def hscan_iter(self, key: str, count: int | None = None) -> "AsyncIterator[tuple[str, Any]]":
+        for item in list(self.hashes.get(key, {}).items()):
+            yield item
+
+    async def zrem(self, key: str, *members: str) -> None:
+        for member in members:
+            self.zsets[key].pop(member)
+
+    async def hdel(self, key: str, *fields: str) -> None:
+        for field in fields:
+            self.hashes[key].pop(field)
+
+
+@pytest.fixture(autouse=True)
+def _intervals(monkeypatch: "MonkeyPatch") -> None:
+    monkeypatch.setattr(settings.ping, "INTERVAL", 60)
+    monkeypatch.setattr(settings.ping, "FLAP_WINDOW", 900)
+    monkeypatch.setattr(settings.ping, "STABLE_INTERVAL", 300)
+    monkeypatch.setattr(settings.ping, "OFFLINE_MAX_INTERVAL", 3600)
+
+
+def test_next_interval() -> None:
+    assert next_interval(ProbeState(changed=1000), online=True, now=1000 + 60) == 60
+    assert next_interval(ProbeState(changed=1000), online=False, now=1000 + 60) == 60
+    assert next_interval(ProbeState(changed=0), online=True, now=10_000) == 300
+    assert next_interval(ProbeState(changed=0, backoff=1), online=False, now=10_000) == 120
+    assert next_interval(ProbeState(changed=0, backoff=3), online=False, now=10_000) == 480
+    assert next_interval(ProbeState(changed=0, backoff=10), online=False, now=10_000) == 3600
+
+
+async def test_schedule_probes_by_state() -> None:
+    schedule = PingSchedule(FakeRedis())  # type: ignore[arg-type]
+    devices = ["stable", "flapping", "offline"]
+    now = 0.0
+
+    assert await schedule.due(devices, now) == set(devices)
+    await schedule.reschedule({"stable": (True, True), "flapping": (False, True), "offline": (True, False)}, now)
+
+    probes = {device: 0 for device in devices}
+    for sweep in range(1, 60):
+        now = sweep * 60.0
+        due = await schedule.due(devices, now)
+        for device in due:
+            probes[device] += 1
+        online = {"stable": True, "flapping": sweep % 2 == 0, "offline": False}
+        previous = {"stable": True, "flapping": sweep % 2 == 1, "offline": False}
+        await schedule.reschedule({device: (previous[device], online[device]) for device in due}, now)
+
+    # an hour of sweeps: the flapping cpe every sweep, the stable one every 5 minutes and
+    # the offline one every sweep during the flap window, then backing off
+    assert probes["flapping"] == 59
+    assert 9 <= probes["stable"] <= 15
+    assert 15 <= probes["offline"] <= 21
+
+
+async def test_prune_deleted_cpes() -> None:
+    client = FakeRedis()
+    schedule = PingSchedule(client)  # type: ignore[arg-type]
+    await schedule.reschedule({"TESM1233": (True, True), "TESM1234": (True, False)}, 0.0)
+
+    assert await schedule.prune({"TESM1233"}) == 1
+    assert list(client.zsets[schedule.queue_key]) == ["TESM1233"]
+    assert list(client.hashes[schedule.state_key]) == ["TESM1233"]
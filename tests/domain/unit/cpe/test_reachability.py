@@ -0,0 +1,117 @@
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any
+
+import pytest
+
+from app.domain.cpe import reachability
+from app.domain.cpe.reachability import Reachability, ReachabilityCache
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+    from pytest import MonkeyPatch
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.hash: dict[str, Any] = {}
+        self.reads = 0
+
+    async def hmget(self, key: str, fields: list[str]) -> list[Any]:
+        self.reads += 1
+        return [self.hash.get(field) for field in fields]
+
+    async def hset(self, key: str, mapping: dict[str, Any]) -> None:
+        self.hash.update(mapping)
+
+    async def hscan_iter(self, key: str, count: int | None = None) -> "AsyncIterator[tuple[bytes, Any]]":
+        for field, value in list(self.hash.items()):
+            yield field.encode(), value
+
+    async def hdel(self, key: str, *fields: bytes) -> None:
+        for field in fields:
+            del self.hash[field.decode()]
+
+
+async def test_publish_keeps_last_seen() -> None:
+    client = FakeRedis()
+    publisher = ReachabilityCache(client, ttl=0)  # type: ignore[arg-type]
+    reader = ReachabilityCache(client, ttl=0)  # type: ignore[arg-type]
+
+    await publisher.publish(
+        {
+            "TESM1233": Reachability(
+                online=True,
+                answered=True,
+                checked=60,
+                reachable_ip="10.0.0.1",
+                rtt=12.5,
+                last_seen=60,
+            ),
+        },
+    )
+    await publisher.publish({"TESM1233": Reachability(online=True, answered=False, checked=120)})
+
+    assert await reader.get_many(["TESM1233", "TESM1234"]) == {
+        "TESM1233": Reachability(online=True, answered=False, checked=120, last_seen=60),
+        "TESM1234": None,
+    }
+
+
+async def test_reads_through_in_process_cache(monkeypatch: "MonkeyPatch") -> None:
+    clock = [0.0]
+    monkeypatch.setattr(reachability, "time", SimpleNamespace(monotonic=lambda: clock[0]))
+    client = FakeRedis()
+    publisher = ReachabilityCache(client)  # type: ignore[arg-type]
+    reader = ReachabilityCache(client, ttl=5)  # type: ignore[arg-type]
+
+    assert await reader.online_status("TESM1233", default=True)
+    await publisher.publish({"TESM1233": Reachability(online=False, answered=False, checked=0, last_seen=0)})
+    # the absence of a state is cached as well
+    assert await reader.online_status("TESM1233", default=True)
+    assert client.reads == 1
+
+    clock[0] = 6
+    assert not await reader.online_status("TESM1233", default=True)
+    assert not await reader.online_status("TESM1233", default=True)
+    assert client.reads == 2
+
+    reader.invalidate("TESM1233")
+    await reader.get("TESM1233")
+    assert client.reads == 3
+
+
+async def test_publish_prunes_the_cache(monkeypatch: "MonkeyPatch") -> None:
+    clock = [0.0]
+    monkeypatch.setattr(reachability, "time", SimpleNamespace(monotonic=lambda: clock[0]))
+    monkeypatch.setattr(reachability.settings.ping, "REACHABILITY_CACHE_SIZE", 10)
+    publisher = ReachabilityCache(FakeRedis(), ttl=5)  # type: ignore[arg-type]
+
+    for sweep in range(3):
+        clock[0] = sweep * 60
+        await publisher.publish(
+            {
+                f"TESM{sweep}{n:02}": Reachability(online=True, answered=True, checked=clock[0], last_seen=clock[0])
+                for n in range(8)
+            },
+        )
+
+    # the states of the earlier sweeps expired and were dropped
+    assert len(publisher._entries) == 8
+
+
+async def test_prune_deleted_cpes() -> None:
+    client = FakeRedis()
+    cache = ReachabilityCache(client)  # type: ignore[arg-type]
+    await cache.publish(
+        {
+            device_id: Reachability(online=True, answered=True, checked=0, last_seen=0)
+            for device_id in ("TESM1233", "TESM1234")
+        },
+    )
+
+    assert await cache.prune({"TESM1233"}) == 1
+    assert list(client.hash) == ["TESM1233"]
+    assert await cache.get("TESM1234") is None
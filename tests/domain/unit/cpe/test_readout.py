@@ -0,0 +1,109 @@
+from collections.abc import Callable, Iterable
+from typing import Any
+
+import anyio
+import pytest
+from saq.job import TERMINAL_STATUSES, Job, Status
+from saq.utils import now
+
+from app.domain import plugins
+from app.domain.cpe import business_logic
+from app.domain.cpe.business_logic import readout_cpe, readout_job
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeQueue:
+    """Keeps the jobs by key, like SAQ a key is only enqueued again once its job finished."""
+
+    def __init__(self) -> None:
+        self.jobs: dict[str, Job] = {}
+        self.enqueued: list[str] = []
+
+    async def job(self, key: str) -> Job | None:
+        await anyio.sleep(0)
+        return self.jobs.get(key)
+
+    async def enqueue(self, function: str, **kwargs: Any) -> Job | None:
+        await anyio.sleep(0)
+        key = kwargs.pop("key")
+        if key in self.jobs and self.jobs[key].status not in TERMINAL_STATUSES:
+            return None
+        self.jobs[key] = Job(function=function, key=key, status=Status.QUEUED, queued=now(), kwargs=kwargs)
+        self.enqueued.append(function)
+        return self.jobs[key]
+
+    async def listen(self, job_keys: Iterable[str], callback: Callable[[str, Status], bool], timeout: float) -> None:
+        """Never sends an update, like SAQ it raises a TimeoutError when the timeout runs out."""
+        await anyio.sleep(timeout)
+        raise TimeoutError
+
+
+@pytest.fixture()
+def queue(monkeypatch: pytest.MonkeyPatch) -> FakeQueue:
+    queue = FakeQueue()
+    monkeypatch.setattr(plugins.saq, "get_queue", lambda _: queue)
+    monkeypatch.setattr(business_logic.settings.readout, "COALESCE_WINDOW", 60)
+    return queue
+
+
+async def test_coalesces_burst_of_readouts(queue: FakeQueue) -> None:
+    jobs = []
+
+    async def readout() -> None:
+        jobs.append(await readout_cpe("10.0.0.1", "iosxe", "TESM1233"))
+
+    async with anyio.create_task_group() as task_group:
+        for _ in range(10):
+            task_group.start_soon(readout)
+
+    assert queue.enqueued == ["communicate_with_cpe", "send_email"]
+    assert {job.key for job in jobs} == {"readout-TESM1233"}
+    assert sum(not job.coalesced for job in jobs) == 1
+
+
+async def test_attaches_to_completed_readout_within_window(queue: FakeQueue) -> None:
+    await readout_cpe("10.0.0.1", "iosxe", "TESM1233")
+    job = queue.jobs["readout-TESM1233"]
+    job.status, job.completed, job.result = Status.COMPLETE, now(), {"show clock": {"clock": "12:00:00"}}
+
+    attached = await readout_cpe("10.0.0.1", "iosxe", "TESM1233")
+    assert attached.coalesced
+    assert attached.result == {"show clock": {"clock": "12:00:00"}}
+
+    # after the window, or after a failure, the device is read out again
+    job.completed = now() - 61_000
+    assert not (await readout_cpe("10.0.0.1", "iosxe", "TESM1233")).coalesced
+    queue.jobs["readout-TESM1233"].status = Status.FAILED
+    assert not (await readout_cpe("10.0.0.1", "iosxe", "TESM1233")).coalesced
+    assert queue.enqueued.count("communicate_with_cpe") == 3
+
+
+async def test_readout_job_wait_runs_out(queue: FakeQueue, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(business_logic.settings.readout, "JOB_POLL_INTERVAL", 0.05)
+    await readout_cpe("10.0.0.1", "iosxe", "TESM1233")
+
+    # a job that never finishes is returned as it is when the wait runs out
+    with anyio.fail_after(1):
+        job = await readout_job("10.0.0.1", "TESM1233", wait=0.2)
+    assert job is not None
+    assert job.status == Status.QUEUED.value
+
+
+async def test_readout_job_wait_sees_missed_completion(queue: FakeQueue, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(business_logic.settings.readout, "JOB_POLL_INTERVAL", 0.05)
+    await readout_cpe("10.0.0.1", "iosxe", "TESM1233")
+
+    async def complete() -> None:
+        await anyio.sleep(0.1)
+        job = queue.jobs["readout-TESM1233"]
+        job.status, job.completed, job.result = Status.COMPLETE, now(), {"show clock": {"clock": "12:00:00"}}
+
+    # the fake queue sends no update, the job is read again
+    with anyio.fail_after(1):
+        async with anyio.create_task_group() as task_group:
+            task_group.start_soon(complete)
+            job = await readout_job("10.0.0.1", "TESM1233", wait=60)
+    assert job is not None
+    assert job.status == Status.COMPLETE.value
+    assert job.result == {"show clock": {"clock": "12:00:00"}}
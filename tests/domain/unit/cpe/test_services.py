@@ -14,3 +14,72 @@ async def test_get_cpes_to_ping() -> None:
         cpes_to_ping = await cpe_service.get_cpes_to_ping()
         assert len(cpes_to_ping) > 0
         assert "mgmt_ip" in cpes_to_ping["10.1.1.142"]
+
+
+async def test_iter_ping_targets() -> None:
+    db = session()
+    async with db as db_session:
+        cpe_service = await anext(provides_cpe_service(db_session=db_session))
+        cpes_to_ping = await cpe_service.get_cpes_to_ping()
+        batches = [batch async for batch in cpe_service.iter_ping_targets(batch_size=1)]
+        assert all(len(batch) == 1 for batch in batches)
+        targets = [target for batch in batches for target in batch]
+        assert [target["device_id"] for target in targets] == sorted(cpe["device_id"] for cpe in cpes_to_ping.values())
+        assert {target["mgmt_ip"] for target in targets} == set(cpes_to_ping)
+
+
+async def test_update_online_status() -> None:
+    db = session()
+    async with db as db_session:
+        cpe_service = await anext(provides_cpe_service(db_session=db_session))
+        cpes_to_ping = await cpe_service.get_cpes_to_ping()
+        device_id = cpes_to_ping["10.1.1.142"]["device_id"]
+        online_status = (await cpe_service.get(device_id)).online_status
+
+        assert await cpe_service.update_online_status({}) == 0
+        try:
+            assert await cpe_service.update_online_status({device_id: not online_status}, auto_commit=True) == 1
+
+            db_session.expire_all()
+            assert (await cpe_service.get(device_id)).online_status is not online_status
+        finally:
+            # the test database is shared, put the status back
+            await cpe_service.update_online_status({device_id: online_status}, auto_commit=True)
+
+
+async def test_update_reachable_ip() -> None:
+    db = session()
+    async with db as db_session:
+        cpe_service = await anext(provides_cpe_service(db_session=db_session))
+        cpes_to_ping = await cpe_service.get_cpes_to_ping()
+        device_id = cpes_to_ping["10.1.1.142"]["device_id"]
+        reachable_ip = (await cpe_service.get(device_id)).reachable_ip
+
+        try:
+            assert await cpe_service.update_reachable_ip({device_id: "10.1.1.142"}, auto_commit=True) == 1
+
+            db_session.expire_all()
+            cpe = await cpe_service.get(device_id)
+            assert cpe.reachable_ip == "10.1.1.142"
+            assert cpe.management_ip == "10.1.1.142"
+        finally:
+            await cpe_service.update_reachable_ip({device_id: reachable_ip}, auto_commit=True)
+
+
+async def test_update_open_ports() -> None:
+    db = session()
+    async with db as db_session:
+        cpe_service = await anext(provides_cpe_service(db_session=db_session))
+        cpes_to_ping = await cpe_service.get_cpes_to_ping()
+        device_id = cpes_to_ping["10.1.1.142"]["device_id"]
+        open_ports = (await cpe_service.get(device_id)).open_ports
+
+        try:
+            assert await cpe_service.update_open_ports({device_id: [443]}, auto_commit=True) == 1
+
+            db_session.expire_all()
+            cpe = await cpe_service.get(device_id)
+            assert cpe.open_ports == [443]
+            assert cpe.management_port_closed
+        finally:
+            await cpe_service.update_open_ports({device_id: open_ports}, auto_commit=True)
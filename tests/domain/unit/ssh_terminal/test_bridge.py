@@ -0,0 +1,103 @@
+import anyio
+import pytest
+from litestar.exceptions import WebSocketDisconnect
+
+from app.domain.ssh_terminal.bridge import TerminalBridge
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeSocket:
+    def __init__(self, messages: list[str] | None = None, disconnect: bool = False) -> None:
+        self.messages = messages or []
+        self.disconnect = disconnect
+        self.sent: list[str] = []
+
+    async def receive_text(self) -> str:
+        if self.messages:
+            return self.messages.pop(0)
+        if self.disconnect:
+            raise WebSocketDisconnect(detail="closed")
+        await anyio.sleep_forever()
+        return ""
+
+    async def send_text(self, data: str) -> None:
+        self.sent.append(data)
+
+
+class FakeSession:
+    """Stdin and stdout of an SSH session, the output is a list of (delay, chunk)."""
+
+    def __init__(self, output: list[tuple[float, str]]) -> None:
+        self.output = output
+        self.input: list[str] = []
+
+    def write(self, data: str) -> None:
+        self.input.append(data)
+
+    async def drain(self) -> None:
+        pass
+
+    async def read(self, n: int) -> str:
+        # like asyncssh, a read that is cancelled while waiting does not lose output
+        if not self.output:
+            return ""
+        delay, chunk = self.output[0]
+        await anyio.sleep(delay)
+        self.output.pop(0)
+        return chunk[:n]
+
+
+async def test_coalesces_output() -> None:
+    socket = FakeSocket()
+    session = FakeSession([(0, "x" * 10)] * 1000)
+    bridge = TerminalBridge(socket, session, session, flush_size=4096, flush_interval=1)  # type: ignore[arg-type]
+
+    await bridge.run()
+
+    assert "".join(socket.sent) == "x" * 10000
+    assert len(socket.sent) == 3
+
+
+async def test_flushes_after_interval() -> None:
+    socket = FakeSocket()
+    session = FakeSession([(0, "Router#"), (0.2, "show run\r\n"), (0, "hostname x\r\n")])
+    bridge = TerminalBridge(socket, session, session, flush_interval=0.05)  # type: ignore[arg-type]
+
+    await bridge.run()
+
+    assert socket.sent == ["Router#", "show run\r\nhostname x\r\n"]
+
+
+async def test_writes_input_until_disconnect() -> None:
+    socket = FakeSocket(["show run", "x03"], disconnect=True)
+    session = FakeSession([(10, "never sent")])
+    bridge = TerminalBridge(socket, session, session)  # type: ignore[arg-type]
+
+    with anyio.fail_after(1):
+        await bridge.run()
+
+    assert session.input == ["show run\r", "\x03"]
+    assert socket.sent == []
+
+
+class Listener:
+    def __init__(self) -> None:
+        self.events: list[tuple[str, str]] = []
+
+    async def input(self, data: str) -> None:
+        self.events.append(("i", data))
+
+    async def output(self, data: str) -> None:
+        self.events.append(("o", data))
+
+
+async def test_notifies_listeners() -> None:
+    socket = FakeSocket(["show run"])
+    session = FakeSession([(0.05, "hostname x\r\n")])
+    listener = Listener()
+    bridge = TerminalBridge(socket, session, session, flush_interval=0, listeners=[listener])  # type: ignore[arg-type]
+
+    await bridge.run()
+
+    assert listener.events == [("i", "show run\r"), ("o", "hostname x\r\n")]
@@ -0,0 +1,103 @@
+import json
+import os
+import time
+from pathlib import Path
+
+import anyio
+import pytest
+
+from app.domain.ssh_terminal import recording
+from app.domain.ssh_terminal.recording import SessionRecorder, recording_path, replay_recording
+
+pytestmark = pytest.mark.anyio
+
+SESSION_ID = "0123456789abcdef0123456789abcdef"
+
+
+@pytest.fixture(autouse=True)
+def recording_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr(recording.settings.readout, "TERMINAL_RECORDING_DIR", tmp_path)
+    return tmp_path
+
+
+def test_recording_path(recording_dir: Path) -> None:
+    assert recording_path(SESSION_ID) == recording_dir / f"{SESSION_ID}.cast.zst"
+    assert recording_path("../../etc/passwd") is None
+
+
+async def test_records_and_replays() -> None:
+    async with SessionRecorder(SESSION_ID, title="10.0.0.1") as recorder:
+        await recorder.input("show run\r")
+        for n in range(1000):
+            await recorder.output(f"line {n}\r\n")
+
+    path = recording_path(SESSION_ID)
+    assert path is not None
+    replay = b"".join([chunk async for chunk in replay_recording(path, chunk_size=1024)])
+    header, *events = (json.loads(line) for line in replay.splitlines())
+
+    assert header["version"] == 2
+    assert header["title"] == "10.0.0.1"
+    # the input is only recorded when enabled
+    assert [event[1] for event in events] == ["o"] * 1000
+    assert "".join(event[2] for event in events) == "".join(f"line {n}\r\n" for n in range(1000))
+    assert [event[0] for event in events] == sorted(event[0] for event in events)
+    assert path.stat().st_size < len(replay)
+
+
+async def test_replays_running_session() -> None:
+    async with SessionRecorder(SESSION_ID) as recorder:
+        await recorder.output("Router#")
+        # every batch is flushed, so the recording is readable before the session ends
+        path = recording_path(SESSION_ID)
+        assert path is not None
+        for _ in range(100):
+            replay = b"".join([chunk async for chunk in replay_recording(path)])
+            if b"Router#" in replay:
+                break
+            await anyio.sleep(0.01)
+        assert json.loads(replay.splitlines()[-1])[2] == "Router#"
+
+
+async def test_records_session_that_failed() -> None:
+    with pytest.raises(ConnectionResetError):
+        async with SessionRecorder(SESSION_ID) as recorder:
+            for n in range(1000):
+                await recorder.output(f"line {n}\r\n")
+            raise ConnectionResetError
+
+    path = recording_path(SESSION_ID)
+    assert path is not None
+    replay = b"".join([chunk async for chunk in replay_recording(path)])
+    _, *events = (json.loads(line) for line in replay.splitlines())
+
+    # the queued events were written and the recording was closed
+    assert len(events) == 1000
+
+
+async def test_prune_recordings(recording_dir: Path) -> None:
+    expired = recording_dir / f"{'0' * 32}.cast.zst"
+    expired.write_bytes(b"")
+    days = recording.settings.readout.TERMINAL_RECORDING_RETENTION_DAYS + 1
+    os.utime(expired, (time.time() - days * 86400,) * 2)
+    kept = recording_dir / f"{SESSION_ID}.cast.zst"
+    kept.write_bytes(b"")
+
+    await recording.prune_recordings({})
+
+    assert not expired.exists()
+    assert kept.exists()
+
+
+async def test_records_session_that_was_cancelled() -> None:
+    with anyio.move_on_after(0.1):
+        async with SessionRecorder(SESSION_ID) as recorder:
+            await recorder.output("Router#")
+            await anyio.sleep(1)
+            await recorder.output("never")
+
+    path = recording_path(SESSION_ID)
+    assert path is not None
+    replay = b"".join([chunk async for chunk in replay_recording(path)])
+
+    assert [json.loads(line)[2] for line in replay.splitlines()[1:]] == ["Router#"]
@@ -11,3 +11,16 @@ async def test_tscm_check_results_date_compliancy() -> None:
     async with db as db_session:
         tscm_check_result_service = await anext(provides_tscm_check_results_service(db_session=db_session))
         await tscm_check_result_service.compliant_since("TESM1234")
+
+
+async def test_tscm_check_results_compliancy_of_many_devices() -> None:
+    db = session()
+    async with db as db_session:
+        tscm_check_result_service = await anext(provides_tscm_check_results_service(db_session=db_session))
+        device_ids = ["TESM1233", "TESM1234", "UNKNOWN"]
+
+        compliancy = await tscm_check_result_service.compliant_since_many(device_ids)
+
+        assert compliancy == {
+            device_id: await tscm_check_result_service.compliant_since(device_id) for device_id in device_ids
+        }
@@ -0,0 +1,26 @@
+import os
+from typing import TYPE_CHECKING
+
+from app.domain.tscm.configstore import ConfigStore
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def test_write_deduplicates(tmp_path: "Path") -> None:
+    store = ConfigStore(tmp_path / "configs")
+
+    assert store.write("TESM1233", "hostname tes-gv-1111xx-11\n")
+    os.utime(store.path_for("TESM1233"), (0, 0))
+    versions = dict(store.versions())
+    assert store.age_days("TESM1233") > 0
+
+    # the same config only refreshes the age, its version stays the same
+    assert not store.write("TESM1233", "hostname tes-gv-1111xx-11\n")
+    assert store.age_days("TESM1233") == 0
+    assert dict(store.versions()) == versions
+    assert store.write("TESM1233", "hostname tes-gv-1111xx-11\nip http server\n")
+    assert store.read("TESM1233") == "hostname tes-gv-1111xx-11\nip http server\n"
+    assert dict(store.versions()).keys() == versions.keys() == {"TESM1233"}
+    assert dict(store.versions()) != versions
+    assert sorted(path.name for path in store.config_dir.iterdir()) == [".TESM1233.confirmed", "TESM1233"]
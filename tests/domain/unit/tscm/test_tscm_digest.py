@@ -0,0 +1,23 @@
+from typing import TYPE_CHECKING
+
+from app.domain.tscm.digest import build_digests
+from app.lib import settings
+
+if TYPE_CHECKING:
+    import pytest
+
+
+def test_build_digests(monkeypatch: "pytest.MonkeyPatch") -> None:
+    monkeypatch.setattr(settings.tscm, "DIGEST_RECIPIENTS", {"VPN": ["vpn@test.nl"]})
+    monkeypatch.setattr(settings.tscm, "DIGEST_DEFAULT_RECIPIENTS", ["noc@test.nl"])
+    docs = [
+        {"device_id": "TESM1234", "service": "VPN", "is_compliant": False, "checks": {}},
+        {"device_id": "TESM1233", "service": "VPN", "is_compliant": False, "checks": {}},
+        {"device_id": "TESM1235", "service": "INTERNET", "is_compliant": False, "checks": {}},
+        {"device_id": "TESM1236", "service": None, "is_compliant": False, "checks": {}},
+    ]
+
+    digests = build_digests(docs)
+
+    assert [doc["device_id"] for doc in digests[("vpn@test.nl",)]] == ["TESM1233", "TESM1234"]
+    assert [doc["device_id"] for doc in digests[("noc@test.nl",)]] == ["TESM1235", "TESM1236"]
@@ -0,0 +1,74 @@
+from typing import TYPE_CHECKING
+from unittest.mock import AsyncMock
+
+import anyio
+import pytest
+
+from app.domain.tscm.dry_run import dry_run_check, stratified_sample
+from app.lib import settings
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+pytestmark = pytest.mark.anyio
+
+PYTHON_CODE = 'validated = "ip http server" not in config\nif not validated:\n    print("http server enabled")'
+
+
+def test_stratified_sample() -> None:
+    device_models = {f"TESM{n:04}": "C1111" for n in range(90)} | {f"TESM{n:04}": "C1161" for n in range(90, 100)}
+
+    sample = stratified_sample(device_models, 10, seed=1)
+
+    assert len(sample) == 10
+    assert sum(device_models[device_id] == "C1161" for device_id in sample) == 1
+    assert stratified_sample(device_models, 10, seed=1) == sample
+    assert stratified_sample(device_models, 200) == sorted(device_models)
+
+
+async def test_dry_run_check(tmp_path: "Path", monkeypatch: "pytest.MonkeyPatch") -> None:
+    monkeypatch.setattr(settings.tscm, "CONFIG_DIR", tmp_path)
+    (tmp_path / "TESM1233").write_text("hostname tes-gv-1111xx-11\nip http server\n")
+    (tmp_path / "TESM1234").write_text("hostname tes-gv-2222xx-22\n")
+    cpe_service = AsyncMock()
+    cpe_service.get_device_models.return_value = {"TESM1233": "C1111", "TESM1234": "C1111", "TESM1235": "C1161"}
+
+    report = await dry_run_check(cpe_service, "HTTP", PYTHON_CODE)
+
+    assert report.accepted
+    assert (report.sampled, report.passed, report.failed, report.missing_config) == (3, 1, 1, 1)
+    assert report.p99_runtime_ms >= report.mean_runtime_ms > 0
+
+    report = await dry_run_check(cpe_service, "BROKEN", "validated = config[10000]")
+    assert report.exceptions["TESM1233"].startswith("IndexError")
+
+
+async def test_dry_run_check_rejected(tmp_path: "Path", monkeypatch: "pytest.MonkeyPatch") -> None:
+    monkeypatch.setattr(settings.tscm, "CONFIG_DIR", tmp_path)
+    monkeypatch.setattr(settings.tscm, "MAX_CHECK_FLEET_RUNTIME", 0.0)
+    (tmp_path / "TESM1233").write_text("hostname tes-gv-1111xx-11\n")
+    cpe_service = AsyncMock()
+    cpe_service.get_device_models.return_value = {"TESM1233": "C1111"}
+
+    report = await dry_run_check(cpe_service, "SYNTAX", "validated = (")
+    assert not report.compiles
+    assert not report.accepted
+    cpe_service.get_device_models.assert_not_called()
+
+    report = await dry_run_check(cpe_service, "HTTP", PYTHON_CODE)
+    assert not report.accepted
+    assert "estimated runtime" in report.rejection_reason
+
+
+async def test_dry_run_check_never_finishes(tmp_path: "Path", monkeypatch: "pytest.MonkeyPatch") -> None:
+    monkeypatch.setattr(settings.tscm, "CONFIG_DIR", tmp_path)
+    monkeypatch.setattr(settings.tscm, "MAX_CHECK_FLEET_RUNTIME", 0.5)
+    (tmp_path / "TESM1233").write_text("hostname tes-gv-1111xx-11\n")
+    cpe_service = AsyncMock()
+    cpe_service.get_device_models.return_value = {"TESM1233": "C1111"}
+
+    with anyio.fail_after(30):
+        report = await dry_run_check(cpe_service, "LOOP", "while True:\n    pass\nvalidated = True")
+
+    assert not report.accepted
+    assert "did not finish" in report.rejection_reason
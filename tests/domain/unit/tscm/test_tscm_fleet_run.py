@@ -0,0 +1,109 @@
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any
+
+import pytest
+from saq.job import Job, Status
+
+from app.domain import plugins
+from app.domain.tscm import fleet_run
+from app.domain.tscm.fleet_run import FleetRun, _check_devices, get_fleet_run, shard_devices, tscm_fleet_run
+from app.domain.tscm.tscm import TscmExportReport
+from app.lib import serialization, settings
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from redis.asyncio import Redis
+
+
+def _cpe(device_id: str, online_status: bool = True) -> SimpleNamespace:
+    return SimpleNamespace(
+        device_id=device_id,
+        online_status=online_status,
+        vendor=SimpleNamespace(name="CISCO"),
+        service=SimpleNamespace(name="VPN"),
+    )
+
+
+def test_check_devices(tmp_path: "Path", monkeypatch: "pytest.MonkeyPatch") -> None:
+    monkeypatch.setattr(settings.tscm, "CONFIG_DIR", tmp_path)
+    (tmp_path / "TESM1233").write_text("hostname tes-gv-1111xx-11\nip http server\n")
+    (tmp_path / "TESM1234").write_text("hostname tes-gv-2222xx-22\n")
+    (tmp_path / "TESM1235").write_text("hostname tes-gv-3333xx-33\nip http server\n")
+    checks = [SimpleNamespace(key="HTTP", python_code='validated = "ip http server" not in config')]
+    report = TscmExportReport()
+    email_results: list = []
+
+    summary = _check_devices(
+        [
+            (_cpe("TESM1233"), checks, True),
+            (_cpe("TESM1234"), checks, True),
+            (_cpe("TESM1235", online_status=False), checks, True),
+            (_cpe("TESM1236"), checks, True),
+        ],
+        report,
+        email_results,
+    )
+
+    assert summary == {"compliant": 2, "not_compliant": 1, "no_config": 1, "errors": 0}
+    assert {doc.device_id: doc.compliancy_reason for doc in report.tscm_doc} == {
+        "TESM1233": "NOT_ALL_CHECKS_HAVE_PASSED",
+        "TESM1234": "ALL_CHECKS_PASSED",
+        "TESM1235": "OFFLINE_COMPLIANT",
+    }
+    assert [doc.device_id for doc in email_results] == ["TESM1233"]
+
+
+def test_shard_devices() -> None:
+    device_ids = [f"TESM{n:04}" for n in range(1000)]
+
+    plan = shard_devices(device_ids, 8)
+
+    assert set(plan) == set(range(8))
+    assert sorted(device_id for shard in plan.values() for device_id in shard) == device_ids
+    assert shard_devices(list(reversed(device_ids)), 8).keys() == plan.keys()
+    reordered = shard_devices(list(reversed(device_ids)), 8)
+    assert all(set(reordered[shard]) == set(plan[shard]) for shard in plan)
+    # an extra shard only takes devices away, the others stay in their shard
+    grown = shard_devices(device_ids, 9)
+    assert 0 < len(grown[8]) < len(device_ids)
+    assert all(set(grown[shard]) <= set(plan[shard]) for shard in plan)
+
+
+class FakeQueue:
+    """Enqueues every job, the jobs of the shards fail right away."""
+
+    def __init__(self) -> None:
+        self.jobs: dict[str, Job] = {}
+        self.enqueued: list[str] = []
+
+    async def job(self, key: str) -> Job | None:
+        return self.jobs.get(key)
+
+    async def enqueue(self, function: str, **kwargs: Any) -> Job:
+        key = kwargs.pop("key")
+        self.jobs[key] = Job(function=function, key=key, status=Status.FAILED, kwargs=kwargs)
+        self.enqueued.append(key)
+        return self.jobs[key]
+
+
+@pytest.mark.anyio()
+async def test_gives_up_failing_shard(redis: "Redis", monkeypatch: pytest.MonkeyPatch) -> None:
+    queue = FakeQueue()
+    monkeypatch.setattr(fleet_run, "redis", redis)
+    monkeypatch.setattr(plugins.saq, "get_queue", lambda _: queue)
+    monkeypatch.setattr(settings.tscm, "RUN_SHARD_MAX_ATTEMPTS", 2)
+    run = FleetRun(run_id="failing-shard", status="running", test_run=True, devices=2, shards=1)
+    await fleet_run._save_run(run)
+    await redis.hset(fleet_run._plan_key(run.run_id), "0", serialization.to_json(["TESM1233", "TESM1234"]))
+
+    # the shard is enqueued by the start and the first resume, the second resume gives it up
+    for _ in range(3):
+        await tscm_fleet_run({}, run_id=run.run_id)
+
+    assert queue.enqueued == ["tscm-run-failing-shard-0", "tscm-run-failing-shard-0", "tscm-run-failing-shard-fan-in"]
+    await fleet_run.tscm_fleet_run_fan_in({}, run_id=run.run_id)
+    completed = await get_fleet_run(run.run_id)
+    assert completed is not None
+    assert completed.status == "completed"
+    assert completed.totals["errors"] == 2
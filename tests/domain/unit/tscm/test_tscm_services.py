@@ -1,3 +1,4 @@
+from types import SimpleNamespace
 from typing import TYPE_CHECKING
 
 import pytest
@@ -65,3 +66,19 @@ async def test_tscm_offline_compliant_not_compliant__offline_compliant(tscm_obj:
 
     assert tscm_obj.is_compliant is True
     assert tscm_obj.export_report.tscm_doc[0].compliancy_reason == "OFFLINE_COMPLIANT"
+
+
+async def test_tscm_online_compliant_not_compliant_keeps_check_output(tscm_obj: "CpeTscmCheck") -> None:
+    tscm_obj.provided_config = "hostname tes-gv-1111xx-11\nip http server\n"
+    tscm_obj.tscm_checks = [
+        SimpleNamespace(
+            key="HTTP",
+            python_code='validated = "ip http server" not in config\nif not validated:\n    print("http server enabled")',
+        ),
+    ]
+
+    tscm_obj.online_compliant_not_compliant()
+
+    assert tscm_obj.is_compliant is False
+    assert tscm_obj.tscm_email_doc.checks["HTTP"] == {"output": "http server enabled\n", "is_compliant": False}
+    assert tscm_obj.export_report.tscm_doc[0].compliancy_reason == "NOT_ALL_CHECKS_HAVE_PASSED"
@@ -0,0 +1,107 @@
+from typing import TYPE_CHECKING
+
+import pytest
+
+from app.domain.tscm import sweep
+from app.domain.tscm.sweep import _sweep_chunk, publish_sweep_event, sweep_events, tscm_check_sweep_chunk
+from app.lib import serialization, settings
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from redis.asyncio import Redis
+
+pytestmark = pytest.mark.anyio
+
+PYTHON_CODE = 'validated = "ip http server" not in config\nif not validated:\n    print("http server enabled")'
+
+
+def test_sweep_chunk(tmp_path: "Path", monkeypatch: "pytest.MonkeyPatch") -> None:
+    monkeypatch.setattr(settings.tscm, "CONFIG_DIR", tmp_path)
+    (tmp_path / "TESM1233").write_text("hostname tes-gv-1111xx-11\nip http server\n")
+    (tmp_path / "TESM1234").write_text("hostname tes-gv-2222xx-22\n")
+
+    results = {
+        result["device_id"]: result
+        for result in _sweep_chunk("HTTP", PYTHON_CODE, ["TESM1233", "TESM1234", "TESM1235"])
+    }
+
+    assert results["TESM1233"]["is_compliant"] is False
+    assert results["TESM1233"]["output"] == "http server enabled\n"
+    assert results["TESM1234"]["is_compliant"] is True
+    assert results["TESM1235"]["error"] == "no config available"
+
+
+def test_sweep_chunk_check_exception(tmp_path: "Path", monkeypatch: "pytest.MonkeyPatch") -> None:
+    monkeypatch.setattr(settings.tscm, "CONFIG_DIR", tmp_path)
+    (tmp_path / "TESM1233").write_text("hostname tes-gv-1111xx-11\n")
+
+    results = _sweep_chunk("BROKEN", "validated = config[10000]", ["TESM1233"])
+
+    assert results[0]["is_compliant"] is None
+    assert results[0]["error"].startswith("IndexError")
+
+
+async def test_sweep_events_of_unknown_sweep(redis: "Redis", monkeypatch: "pytest.MonkeyPatch") -> None:
+    monkeypatch.setattr(sweep, "redis", redis)
+
+    events = [event async for event in sweep_events("unknown")]
+
+    assert [event["type"] for event in events] == ["error"]
+
+
+async def test_sweep_events_idle_timeout(redis: "Redis", monkeypatch: "pytest.MonkeyPatch") -> None:
+    monkeypatch.setattr(sweep, "redis", redis)
+    monkeypatch.setattr(settings.tscm, "SWEEP_IDLE_TIMEOUT", 1)
+    # a sweep whose coordinator died after it started
+    await publish_sweep_event("stalled", {"type": "started", "devices": 10, "chunks": 1})
+
+    events = [event async for event in sweep_events("stalled")]
+
+    assert [event["type"] for event in events] == ["started", "error"]
+
+
+async def test_last_chunk_ends_the_sweep(
+    redis: "Redis",
+    tmp_path: "Path",
+    monkeypatch: "pytest.MonkeyPatch",
+) -> None:
+    monkeypatch.setattr(sweep, "redis", redis)
+    monkeypatch.setattr(settings.tscm, "CONFIG_DIR", tmp_path)
+    (tmp_path / "TESM1233").write_text("hostname tes-gv-1111xx-11\nip http server\n")
+    (tmp_path / "TESM1234").write_text("hostname tes-gv-2222xx-22\n")
+
+    def broken(*_: object) -> None:
+        raise OSError
+
+    await redis.hset(sweep._progress_key("chunked"), mapping={"chunks": 3, "started": 0})
+    for n, device_ids in enumerate([["TESM1233"], ["TESM1234"]]):
+        await tscm_check_sweep_chunk(
+            {},
+            sweep_id="chunked",
+            chunk=n,
+            check_key="HTTP",
+            python_code=PYTHON_CODE,
+            device_ids=device_ids,
+        )
+    # a chunk that fails still completes the sweep
+    monkeypatch.setattr(sweep, "_sweep_chunk", broken)
+    with pytest.raises(OSError):
+        await tscm_check_sweep_chunk(
+            {},
+            sweep_id="chunked",
+            chunk=2,
+            check_key="HTTP",
+            python_code=PYTHON_CODE,
+            device_ids=["TESM1235"],
+        )
+
+    events = [serialization.from_json(payload) for payload in await redis.lrange(sweep._results_key("chunked"), 0, -1)]
+
+    assert [event["type"] for event in events] == ["chunk", "chunk", "done"]
+    assert {key: events[-1][key] for key in ("passed", "failed", "errors", "failed_chunks")} == {
+        "passed": 1,
+        "failed": 1,
+        "errors": 0,
+        "failed_chunks": 1,
+    }
@@ -1,8 +1,13 @@
 from pathlib import Path
+from typing import Any
 
+import aiosmtplib
+import anyio
 import pytest
+from aiosmtpd.controller import Controller
+from fastapi_mail import MessageSchema, MessageType
 
-from app.lib.email import mail_system, send_email
+from app.lib.email import MailSender, mail_system, send_email
 
 pytestmark = pytest.mark.anyio
 
@@ -39,3 +44,107 @@ async def test_send_email_with_file() -> None:
         await send_email("ctx", subject=subject, to=to, html=html, attachments=attachment)
 
     assert outbox[0]._payload[1].__dict__.get("_headers")[3][1] == "attachment; filename*=UTF8''plain.txt"
+
+
+async def test_send_email_with_template() -> None:
+    subject = "test-mail"
+    to = ["lala@lala.nl"]
+    body = [{"device_id": "TESM1233", "checks": {"HTTP": {"output": "http server enabled", "is_compliant": False}}}]
+
+    # Enable Suppress send to mock the sending.
+    mail_system.config.SUPPRESS_SEND = 1
+    with mail_system.record_messages() as outbox:
+        # the ctx is a fake argument. normally needed for SAQ background worker
+        await send_email(
+            "ctx",
+            subject=subject,
+            to=to,
+            html="",
+            template_body=body,
+            template_name="tscm_email_template.html",
+        )
+
+    assert len(outbox) == 1
+    assert "http server enabled" in outbox[0].get_payload()[0].get_payload(decode=True).decode()
+
+
+async def test_mail_sender_reuses_connections() -> None:
+    sessions: set[int] = set()
+
+    class Sink:
+        async def handle_DATA(self, server: Any, session: Any, envelope: Any) -> str:  # noqa: N802
+            sessions.add(id(session))
+            return "250 OK"
+
+    controller = Controller(Sink(), hostname="127.0.0.1", port=8026)
+    controller.start()
+    try:
+        config = mail_system.config.model_copy(
+            update={"MAIL_SERVER": "127.0.0.1", "MAIL_PORT": 8026, "USE_CREDENTIALS": False, "SUPPRESS_SEND": 0},
+        )
+        sender = MailSender(config, pool_size=2)
+        messages = [
+            MessageSchema(subject=f"test-mail {n}", recipients=["lala@lala.nl"], body="hi", subtype=MessageType.html)
+            for n in range(10)
+        ]
+        with mail_system.record_messages() as outbox:
+            await sender.send_many(messages)
+        await sender.close()
+    finally:
+        controller.stop()
+
+    assert len(outbox) == 10
+    assert len(sessions) == 2
+
+
+async def test_mail_sender_closes_failed_connection() -> None:
+    sessions: set[int] = set()
+
+    class Sink:
+        async def handle_DATA(self, server: Any, session: Any, envelope: Any) -> str:  # noqa: N802
+            sessions.add(id(session))
+            return "554 rejected" if len(sessions) == 1 else "250 OK"
+
+    controller = Controller(Sink(), hostname="127.0.0.1", port=8027)
+    controller.start()
+    try:
+        config = mail_system.config.model_copy(
+            update={"MAIL_SERVER": "127.0.0.1", "MAIL_PORT": 8027, "USE_CREDENTIALS": False, "SUPPRESS_SEND": 0},
+        )
+        sender = MailSender(config, pool_size=1)
+        message = MessageSchema(subject="test-mail", recipients=["lala@lala.nl"], body="hi", subtype=MessageType.html)
+        with pytest.raises(aiosmtplib.SMTPException):
+            await sender.send_message(message)
+        await sender.send_message(message)
+        await sender.close()
+    finally:
+        controller.stop()
+
+    # the rejected transaction was not continued on the same connection
+    assert len(sessions) == 2
+
+
+async def test_mail_sender_closes_cancelled_connection() -> None:
+    class Sink:
+        async def handle_DATA(self, server: Any, session: Any, envelope: Any) -> str:  # noqa: N802
+            return "250 OK"
+
+    controller = Controller(Sink(), hostname="127.0.0.1", port=8028)
+    controller.start()
+    try:
+        config = mail_system.config.model_copy(
+            update={"MAIL_SERVER": "127.0.0.1", "MAIL_PORT": 8028, "USE_CREDENTIALS": False, "SUPPRESS_SEND": 0},
+        )
+        sender = MailSender(config, pool_size=1)
+        with anyio.move_on_after(0.1):
+            async with sender.connection() as smtp:
+                await anyio.sleep(1)
+        async with sender.connection() as next_smtp:
+            pass
+        await sender.close()
+    finally:
+        controller.stop()
+
+    # the cancelled connection was closed instead of handed out again
+    assert not smtp.is_connected
+    assert next_smtp is not smtp
@@ -0,0 +1,41 @@
+import pytest
+
+from app.lib.hashring import HashRing
+
+
+def test_node_for_is_stable() -> None:
+    ring = HashRing(["a", "b", "c"])
+
+    assert len(ring) == 3
+    assert all(ring.node_for(f"TESM{n}") == HashRing(["c", "b", "a"]).node_for(f"TESM{n}") for n in range(100))
+
+
+def test_spread() -> None:
+    ring = HashRing(str(node) for node in range(4))
+    counts: dict[str, int] = {}
+    for n in range(4000):
+        node = ring.node_for(f"TESM{n}")
+        counts[node] = counts.get(node, 0) + 1
+
+    assert len(counts) == 4
+    assert min(counts.values()) > 600
+
+
+def test_adding_a_node_only_moves_its_keys() -> None:
+    keys = [f"TESM{n}" for n in range(2000)]
+    ring = HashRing(["a", "b", "c"])
+    before = {key: ring.node_for(key) for key in keys}
+
+    ring.add("d")
+    moved = [key for key in keys if ring.node_for(key) != before[key]]
+
+    assert moved
+    assert all(ring.node_for(key) == "d" for key in moved)
+
+    ring.remove("d")
+    assert {key: ring.node_for(key) for key in keys} == before
+
+
+def test_empty_ring() -> None:
+    with pytest.raises(LookupError):
+        HashRing().node_for("TESM1233")
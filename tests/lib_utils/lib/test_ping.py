@@ -0,0 +1,49 @@
+from typing import TYPE_CHECKING
+
+import pytest
+
+from app.lib import ping, settings
+
+if TYPE_CHECKING:
+    from pytest import MonkeyPatch
+
+pytestmark = pytest.mark.anyio
+
+
+def test_simulated_network_is_seeded() -> None:
+    addresses = [f"10.{n // 65536}.{n // 256 % 256}.{n % 256}" for n in range(10_000)]
+    network = ping.SimulatedNetwork(seed=42, down=0.1, loss=0.05)
+
+    assert [network.base_latency(address) for address in addresses] == [
+        ping.SimulatedNetwork(seed=42, down=0.1, loss=0.05).base_latency(address) for address in addresses
+    ]
+    assert [network.base_latency(address) for address in addresses] != [
+        ping.SimulatedNetwork(seed=43, down=0.1, loss=0.05).base_latency(address) for address in addresses
+    ]
+
+    down = [address for address in addresses if network.base_latency(address) is None]
+    assert 0.08 < len(down) / len(addresses) < 0.12
+    assert all(network.probe(address) is None for address in down)
+
+    up = [address for address in addresses if network.base_latency(address) is not None]
+    lost = sum(network.probe(address) is None for address in up)
+    assert 0.03 < lost / len(up) < 0.07
+
+
+async def test_simulated_ping_times_out() -> None:
+    network = ping.SimulatedNetwork(down=0, loss=0, latency=0.01, jitter=0)
+
+    assert await ping.SimulatedPing(network, timeout=1.0).ping("10.0.0.1") == network.base_latency("10.0.0.1")
+    assert await ping.SimulatedPing(network, timeout=0.0001).ping("10.0.0.1") is None
+
+
+async def test_create_backend(monkeypatch: "MonkeyPatch") -> None:
+    monkeypatch.setattr(settings.ping, "BACKEND", "simulated")
+    monkeypatch.setattr(settings.ping, "SIMULATED_DOWN", 0.0)
+    monkeypatch.setattr(settings.ping, "SIMULATED_LOSS", 0.0)
+    monkeypatch.setattr(ping, "_network", None)
+
+    backend = ping.create_backend(timeout=2.0)
+
+    assert isinstance(backend, ping.SimulatedPing)
+    assert await ping.ping("10.0.0.1") is True
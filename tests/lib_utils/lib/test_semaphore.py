@@ -0,0 +1,43 @@
+from typing import TYPE_CHECKING
+from uuid import uuid4
+
+import pytest
+from anyio import sleep
+
+from app.lib.semaphore import RedisSemaphore
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_redis_semaphore_acquires_all_or_none(redis: "Redis") -> None:
+    prefix = uuid4().hex
+    cisco = RedisSemaphore({f"{prefix}:all": 2, f"{prefix}:cisco": 1}, lease=60, client=redis)
+    juniper = RedisSemaphore({f"{prefix}:all": 2, f"{prefix}:juniper": 1}, lease=60, client=redis)
+
+    token = await cisco.try_acquire()
+    assert token is not None
+    # the vendor is full, the global slot is not taken either
+    assert await cisco.try_acquire() is None
+    assert await cisco.holders() == {f"{prefix}:all": 1, f"{prefix}:cisco": 1}
+    assert await juniper.try_acquire() is not None
+    assert await juniper.try_acquire() is None
+    with pytest.raises(TimeoutError):
+        await cisco.acquire(timeout=0.2)
+
+    await cisco.release(token)
+    async with cisco.hold(timeout=1):
+        assert await cisco.holders() == {f"{prefix}:all": 2, f"{prefix}:cisco": 1}
+    assert await cisco.holders() == {f"{prefix}:all": 1, f"{prefix}:cisco": 0}
+
+
+async def test_redis_semaphore_lease_expires(redis: "Redis") -> None:
+    prefix = uuid4().hex
+    semaphore = RedisSemaphore({f"{prefix}:all": 1}, lease=0.2, client=redis, poll=0.05)
+
+    assert await semaphore.try_acquire() is not None
+    # the holder never releases, its slot frees up when the lease runs out
+    await sleep(0.3)
+    assert await semaphore.acquire(timeout=1)
@@ -0,0 +1,132 @@
+import anyio
+import pytest
+
+from app.lib import settings
+from app.lib.exceptions import ApplicationError
+from app.lib.ssh import SSHPool, ssh_connection
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeConnection:
+    def __init__(self, host: str) -> None:
+        self.host = host
+        self.closed = False
+
+
+class FakeConnect:
+    """Counts the connections it opened, like ``asyncssh.connect`` it is entered to open one."""
+
+    def __init__(self, host: str) -> None:
+        self.host = host
+        self.connections: list[FakeConnection] = []
+
+    def __call__(self) -> "FakeConnect":
+        return self
+
+    async def __aenter__(self) -> FakeConnection:
+        self.connections.append(FakeConnection(self.host))
+        return self.connections[-1]
+
+    async def __aexit__(self, *_: object) -> None:
+        self.connections[-1].closed = True
+
+
+async def test_reuses_connections_per_key() -> None:
+    pool = SSHPool(max_per_host=2, idle_timeout=60, keepalive=60)
+    connect = {host: FakeConnect(host) for host in ("10.0.0.1", "10.0.0.2")}
+
+    for _ in range(3):
+        for host in connect:
+            async with pool.connection(host, connect[host]) as connection:
+                assert connection.host == host
+
+    assert (pool.opened, pool.reused) == (2, 4)
+    await pool.close()
+    assert all(connection.closed for host in connect for connection in connect[host].connections)
+
+
+async def test_limits_connections_per_host() -> None:
+    pool = SSHPool(max_per_host=2, idle_timeout=60, keepalive=60)
+    connect = FakeConnect("10.0.0.1")
+    in_use = peak = 0
+
+    async def session() -> None:
+        nonlocal in_use, peak
+        async with pool.connection("10.0.0.1", connect):
+            in_use += 1
+            peak = max(peak, in_use)
+            await anyio.sleep(0.01)
+            in_use -= 1
+
+    async with anyio.create_task_group() as task_group:
+        for _ in range(6):
+            task_group.start_soon(session)
+
+    assert peak == 2
+    assert pool.opened == 2
+
+
+async def test_drops_broken_and_idle_connections() -> None:
+    pool = SSHPool(max_per_host=1, idle_timeout=0.05, keepalive=0)
+    connect = FakeConnect("10.0.0.1")
+
+    # a connection whose user raised is closed instead of pooled
+    with pytest.raises(ConnectionResetError):
+        async with pool.connection("10.0.0.1", connect):
+            raise ConnectionResetError
+    assert connect.connections[-1].closed
+
+    # without a health check an idle connection is replaced, with one it is reused while alive
+    async with pool.connection("10.0.0.1", connect):
+        pass
+    async with pool.connection("10.0.0.1", connect):
+        pass
+    assert pool.opened == 3
+    async with pool.connection("10.0.0.1", connect, alive=lambda connection: not connection.closed):
+        pass
+    assert pool.opened == 3
+
+    await anyio.sleep(0.1)
+    async with pool.connection("10.0.0.2", FakeConnect("10.0.0.2")):
+        pass
+    # the idle connection of the other host timed out
+    assert connect.connections[-1].closed
+
+
+async def test_expires_while_other_hosts_connect() -> None:
+    pool = SSHPool(max_per_host=2, idle_timeout=0.05, keepalive=60)
+
+    class SlowClose(FakeConnect):
+        async def __aexit__(self, *_: object) -> None:
+            await anyio.sleep(0.05)
+            await super().__aexit__()
+
+    async with pool.connection("10.0.0.1", SlowClose("10.0.0.1")):
+        pass
+    await anyio.sleep(0.1)
+
+    # new hosts are added while the expired connection is being closed
+    async def borrow(host: str) -> None:
+        async with pool.connection(host, FakeConnect(host)):
+            await anyio.sleep(0.01)
+
+    async with anyio.create_task_group() as task_group:
+        for host in ("10.0.0.2", "10.0.0.3", "10.0.0.4"):
+            task_group.start_soon(borrow, host)
+
+    # the host of the expired connection is dropped, the others keep their idle connection
+    assert set(pool._hosts) == {"10.0.0.2", "10.0.0.3", "10.0.0.4"}
+    await anyio.sleep(0.1)
+    async with pool.connection("10.0.0.5", FakeConnect("10.0.0.5")):
+        assert set(pool._hosts) == {"10.0.0.5"}
+    await pool.close()
+
+
+def test_ssh_connection_needs_credentials(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings.readout, "SSH_USERNAME", None)
+    monkeypatch.setattr(settings.readout, "SSH_PASSWORD", None)
+
+    with pytest.raises(ApplicationError):
+        ssh_connection("10.0.0.1")
+    assert ssh_connection("10.0.0.1", username="admin", password="secret") is not None  # noqa: S106
@@ -0,0 +1,96 @@
+import re
+import time
+from typing import TYPE_CHECKING
+
+import pytest
+
+from app.lib.trigram import TrigramIndex, required_literals
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+CONFIGS = {
+    "TESM1233": "hostname tes-gv-1111xx-11\nip http server\nline vty 0 4\n",
+    "TESM1234": "hostname tes-gv-2222xx-22\nno ip http server\nip http secure-server\n",
+    "TESM1235": "hostname tes-gv-3333xx-33\n",
+}
+
+
+def _index() -> TrigramIndex:
+    index = TrigramIndex()
+    for device_id, config in CONFIGS.items():
+        index.add(device_id, config, "1")
+    return index
+
+
+def test_required_literals() -> None:
+    assert required_literals("ip http server") == ["ip http server"]
+    assert required_literals("^ip http(s)? server$") == ["ip http", " server"]
+    assert required_literals("(ip http) server") == ["ip http server"]
+    assert required_literals("http|https") == []
+
+
+def test_candidates_are_pruned() -> None:
+    index = _index()
+    assert index.candidates(["ip http server"]) == {"TESM1233", "TESM1234"}
+    assert index.candidates(["line vty"]) == {"TESM1233"}
+    assert index.candidates([]) == set(CONFIGS)
+
+
+def test_substring_search() -> None:
+    matches = _index().search("ip http server", CONFIGS.get)
+    assert [(match.document_id, match.line_numbers) for match in matches] == [("TESM1233", [2]), ("TESM1234", [2])]
+
+
+def test_regex_search() -> None:
+    matches = _index().search(r"^ip http (secure-)?server$", CONFIGS.get, regex=True)
+    assert [(match.document_id, match.line_numbers) for match in matches] == [("TESM1233", [2]), ("TESM1234", [3])]
+
+
+def test_search_ignore_case_and_limit() -> None:
+    matches = _index().search("HOSTNAME", CONFIGS.get, ignore_case=True, limit=2)
+    assert len(matches) == 2
+
+
+def test_remove_document() -> None:
+    index = _index()
+    index.remove("TESM1233")
+    assert "TESM1233" not in index
+    assert index.candidates(["line vty"]) == set()
+
+
+def test_dump_and_load(tmp_path: "Path") -> None:
+    index = _index()
+    index.dump(tmp_path / "index")
+    loaded = TrigramIndex.load(tmp_path / "index")
+    assert loaded.versions == index.versions
+    assert loaded.candidates(["ip http server"]) == {"TESM1233", "TESM1234"}
+
+
+def test_prepare_then_match() -> None:
+    index = _index()
+
+    compiled, candidates = index.prepare("IP HTTP SERVER", ignore_case=True)
+
+    assert candidates == ["TESM1233", "TESM1234"]
+    # matching only reads the documents, the index is not needed anymore
+    matches = TrigramIndex.match(compiled, candidates, CONFIGS.get)
+    assert [(match.document_id, match.line_numbers) for match in matches] == [("TESM1233", [2]), ("TESM1234", [2])]
+
+
+def test_regex_search_is_linear() -> None:
+    configs = {"TESM1233": "a" * 27 + "!"}
+    index = TrigramIndex()
+    index.add("TESM1233", configs["TESM1233"], "1")
+
+    start = time.perf_counter()
+    matches = index.search(r"(a+)+$", configs.get, regex=True)
+
+    # the pattern backtracks exponentially in the re module, seconds for these 27 characters
+    assert matches == []
+    assert time.perf_counter() - start < 1
+
+
+def test_regex_search_rejects_backreferences() -> None:
+    with pytest.raises(re.error):
+        _index().search(r"(ip) \1", CONFIGS.get, regex=True)